@@ -77,7 +77,7 @@ class DARTSArchitect():
         hessian = (dalpha { L_trn(w+, alpha) } - dalpha { L_trn(w-, alpha) }) / (2*eps)
         eps = 0.01 / ||dw||
         """
-        norm = torch.cat([w.view(-1) for w in dw]).norm()
+        norm = torch.cat([w.reshape(-1) for w in dw]).norm()
         eps = 0.01 / norm
         # w+ = w + eps*dw`
         with torch.no_grad():
@@ -8,6 +8,7 @@ import torch.nn as nn
 from queue import Queue
 from ...utils import param_count
 from ...arch_space.constructor import Slot
+from ...core.ops import keep_memory_format, memory_format_of
 
 def cuda_available():
     return torch.cuda.is_available()
@@ -948,7 +949,7 @@ class TreeNode(nn.Module):
                                               feature_map_size[0] // stride, feature_map_size[1] // stride)
                         if x.is_cuda:
                             padding = padding.cuda()
-                        path_out = torch.autograd.Variable(padding)
+                        path_out = torch.autograd.Variable(keep_memory_format(padding, x))
                     else:
                         path_out = self.path_normal_forward(x, edge, child, branch_bn, use_avg=self.use_avg)
                         path_out = path_out / (1 - self.path_drop_rate)
@@ -978,7 +979,7 @@ class TreeNode(nn.Module):
                                               feature_map_size[0] // stride, feature_map_size[1] // stride)
                         if x.is_cuda:
                             padding = padding.cuda()
-                        return torch.autograd.Variable(padding)
+                        return torch.autograd.Variable(keep_memory_format(padding, x))
                     else:
                         # not drop
                         backup = self.cell_drop_rate
@@ -1000,7 +1001,7 @@ class TreeNode(nn.Module):
         elif self.split_type == 'split':
             child_inputs, _pt = [], 0
             for seg_size in self.in_dim_list:
-                seg_x = x[:, _pt:_pt+seg_size, :, :].contiguous()
+                seg_x = x[:, _pt:_pt+seg_size, :, :].contiguous(memory_format=memory_format_of(x))
                 child_inputs.append(seg_x)
                 _pt += seg_size
         else:
@@ -1038,7 +1039,7 @@ class TreeNode(nn.Module):
             child_outputs.append(path_out)
 
         if self.merge_type == 'concat':
-            output = torch.cat(child_outputs, dim=1)
+            output = keep_memory_format(torch.cat(child_outputs, dim=1), x)
         elif self.merge_type == 'add':
             output = list_sum(child_outputs)
             if self.use_avg:
@@ -1238,7 +1239,7 @@ class ResidualBlock(nn.Module):
             if x.is_cuda:
                 padding = padding.cuda()
             padding = torch.autograd.Variable(padding)
-            _x = torch.cat((_x, padding), 1)
+            _x = keep_memory_format(torch.cat((_x, padding), 1), x)
         
         return _x + x
     
@@ -1291,7 +1292,7 @@ class ResidualBlock(nn.Module):
             if x.is_cuda:
                 padding = padding.cuda()
             padding = torch.autograd.Variable(padding)
-            _x = torch.cat((_x, padding), 1)
+            _x = keep_memory_format(torch.cat((_x, padding), 1), x)
         
         return _x + x
     
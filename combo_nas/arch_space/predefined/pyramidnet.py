@@ -2,6 +2,7 @@ import torch
 import torch.nn as nn
 import math
 from ...arch_space.constructor import Slot
+from ...core.ops import keep_memory_format
 
 class GroupConv(nn.Module):
     def __init__(self, chn_in, chn_out, kernel_size, stride=1, padding=0, groups=1, relu=True, affine=True):
@@ -61,7 +62,7 @@ class BottleneckBlock(nn.Module):
         if residual_channel != shortcut_channel:
             padding = torch.zeros(batch_size, residual_channel - shortcut_channel,
                                  featuremap_size[0], featuremap_size[1]).to(device=x.device)
-            out += torch.cat((shortcut, padding), 1)
+            out += keep_memory_format(torch.cat((shortcut, padding), 1), out)
         else:
             out += shortcut 
         return out
@@ -3,6 +3,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import itertools
+from .ops import keep_memory_format
 
 
 class MergerBase():
@@ -27,7 +28,7 @@ class ConcatMerger(MergerBase):
         return sum(chn_states[self.start:])
     
     def merge(self, states):
-        return torch.cat(states[self.start:], dim=1)
+        return keep_memory_format(torch.cat(states[self.start:], dim=1), states[self.start])
 
     def merge_range(self, num_states):
         return range(self.start, num_states)
@@ -158,6 +159,10 @@ class AllocatorBase():
     def chn_in(self, chn_states, sidx, cur_state):
         pass
 
+    def slices(self, sidx, cur_state):
+        """ channel slices of alloc as a static plan, None if not expressible """
+        return None
+
 
 class EvenSplitAllocator(AllocatorBase):
     def __init__(self, n_inputs, n_states):
@@ -171,9 +176,12 @@ class EvenSplitAllocator(AllocatorBase):
         ret = []
         for s, si in zip(states, sidx):
             s_slice = self.slice_map[(si, cur_state)]
-            s_in = s[:, s_slice]
+            s_in = keep_memory_format(s[:, s_slice], s)
             ret.append(s_in)
         return ret
+
+    def slices(self, sidx, cur_state):
+        return [self.slice_map[(si, cur_state)] for si in sidx]
     
     def chn_in(self, chn_states, sidx, cur_state):
         chn_list = []
@@ -195,6 +203,9 @@ class FracSplitAllocator(AllocatorBase):
     
     def alloc(self, states, sidx, cur_state):
         return states
+
+    def slices(self, sidx, cur_state):
+        return [None for si in sidx]
     
     def chn_in(self, chn_states, sidx, cur_state):
         return chn_states
@@ -206,6 +217,9 @@ class ReplicateAllocator(AllocatorBase):
     
     def alloc(self, states, sidx, cur_state):
         return states
+
+    def slices(self, sidx, cur_state):
+        return [None for si in sidx]
     
     def chn_in(self, chn_states, sidx, cur_state):
         return chn_states
@@ -5,6 +5,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 from ..utils import param_count
 from ..arch_space.constructor import Slot
+from .ops import keep_memory_format
 
 class PreprocLayer(nn.Module):
     """ Standard conv
@@ -57,6 +58,7 @@ class DAGLayer(nn.Module):
                 chn_states.append(chn_cur)
 
         self.fixed = False
+        self.plan = None
         self.dag = nn.ModuleList()
         self.edges = []
         self.num_edges = 0
@@ -87,6 +89,9 @@ class DAGLayer(nn.Module):
         return self.edge_pids
 
     def forward(self, x):
+        if not self.plan is None:
+            return self.forward_plan(x)
+
         if self.preprocs is None:
             states = [st for st in x]
         else:
@@ -105,6 +110,49 @@ class DAGLayer(nn.Module):
         
         out = self.merger_out.merge(states)
         return out
+
+    def forward_plan(self, x):
+        states = [None] * self.n_states
+        for i in self.plan_inputs:
+            states[i] = x[i] if self.preprocs is None else self.preprocs[i](x[i])
+
+        for nidx, instrs in self.plan:
+            res = []
+            for eidx, sidx, slices in instrs:
+                e_in = [states[s] if sl is None else keep_memory_format(states[s][:, sl], states[s])
+                        for s, sl in zip(sidx, slices)]
+                res.append(self.dag[nidx][eidx](e_in))
+            states[self.n_input + nidx] = self.merger_state.merge(res)
+
+        out = self.merger_out.merge(states)
+        return out
+
+    def compile_plan(self):
+        """ compile fixed topology into a flat list of (node, [(edge, inputs, slices)]) instructions """
+        if not self.fixed: raise ValueError('DAGLayer: cannot compile plan of non-fixed layer')
+        plan = []
+        for nidx in range(self.n_nodes):
+            n_states = self.n_input + nidx
+            topo = self.topology[nidx]
+            instrs = []
+            for eidx, sidx in enumerate(self.enumerator.enum(n_states, self.n_input_e)):
+                if not eidx in topo: continue
+                slices = self.allocator.slices(sidx, n_states)
+                if slices is None:
+                    logging.debug('DAGLayer: allocator not plannable, plan not compiled')
+                    self.plan = None
+                    return
+                instrs.append((eidx, tuple(sidx), tuple(slices)))
+            plan.append((nidx, tuple(instrs)))
+        # drop nodes not reachable from the output states
+        needed = set(self.merger_out.merge_range(self.n_states))
+        for nidx, instrs in reversed(plan):
+            if not self.n_input + nidx in needed: continue
+            for eidx, sidx, slices in instrs:
+                needed.update(sidx)
+        self.plan = tuple((nidx, instrs) for nidx, instrs in plan if self.n_input + nidx in needed)
+        self.plan_inputs = tuple(i for i in range(self.n_input) if i in needed)
+        logging.debug('DAGLayer: compiled plan: #n:{} #in:{}'.format(len(self.plan), len(self.plan_inputs)))
     
     def apply_edge(self, func, kwargs):
         return [func(**kwargs) for e in self.edges]
@@ -154,6 +202,7 @@ class DAGLayer(nn.Module):
         self.chn_states = chn_states
         self.chn_out = self.merger_out.chn_out(chn_states)
         self.fixed = True
+        self.compile_plan()
         # logging.debug('DAGLayer: etype:{} chn_in:{} #n:{} #e:{}'.format(str(edge_cls), self.chn_in, self.n_nodes, self.num_edges))
         # logging.debug('DAGLayer param count: {:.6f}'.format(param_count(self)))
 
@@ -52,11 +52,26 @@ def configure_ops(config):
     AFFINE = config.affine
     logging.info('configure ops: affine: {}'.format(AFFINE))
 
+def memory_format_of(x):
+    if x.dim() != 4 or x.is_contiguous(): return torch.contiguous_format
+    if x.is_contiguous(memory_format=torch.channels_last): return torch.channels_last
+    return torch.contiguous_format
+
+def keep_memory_format(out, x):
+    """ restore channels_last layout of x on out if lost """
+    if out.dim() != 4 or memory_format_of(x) != torch.channels_last: return out
+    if out.is_contiguous(memory_format=torch.channels_last): return out
+    return out.contiguous(memory_format=torch.channels_last)
+
+def is_compiling():
+    compiler = getattr(torch, 'compiler', None)
+    return hasattr(compiler, 'is_compiling') and compiler.is_compiling()
+
 def drop_path_(x, drop_prob, training):
-    if training and drop_prob > 0.:
+    if training and (torch.is_tensor(drop_prob) or drop_prob > 0.):
         keep_prob = 1. - drop_prob
-        # per data point mask; assuming x in cuda.
-        mask = torch.cuda.FloatTensor(x.size(0), 1, 1, 1).bernoulli_(keep_prob)
+        # per data point mask
+        mask = torch.empty((x.size(0), 1, 1, 1), dtype=x.dtype, device=x.device).bernoulli_(keep_prob)
         x.div_(keep_prob).mul_(mask)
 
     return x
@@ -69,13 +84,24 @@ class DropPath_(nn.Module):
             p: probability of an path to be zeroed.
         """
         super().__init__()
+        # read by compiled nets, updated in-place so that changing p does not recompile
+        self.register_buffer('p_tensor', torch.tensor(float(p)), persistent=False)
         self.p = p
 
+    @property
+    def p(self):
+        return self._p
+
+    @p.setter
+    def p(self, p):
+        self._p = float(p)
+        self.p_tensor.fill_(self._p)
+
     def extra_repr(self):
         return 'p={}, inplace'.format(self.p)
 
     def forward(self, x):
-        drop_path_(x, self.p, self.training)
+        drop_path_(x, self.p_tensor if is_compiling() else self.p, self.training)
 
         return x
 
@@ -257,7 +283,7 @@ class Zero(nn.Module):
             return x * 0.
 
         # re-sizing by stride
-        return x[:, :, ::self.stride, ::self.stride] * 0.
+        return keep_memory_format(x[:, :, ::self.stride, ::self.stride] * 0., x)
 
 
 class FactorizedReduce(nn.Module):
@@ -274,6 +300,7 @@ class FactorizedReduce(nn.Module):
     def forward(self, x):
         x = self.relu(x)
         out = torch.cat([self.conv1(x), self.conv2(x[:, :, 1:, 1:])], dim=1)
+        out = keep_memory_format(out, x)
         out = self.bn(out)
         return out
 
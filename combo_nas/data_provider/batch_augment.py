@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+import torch
+import torch.nn.functional as F
+from torchvision import transforms
+
+SUPPORTED = (
+    transforms.RandomCrop,
+    transforms.RandomHorizontalFlip,
+    transforms.RandomVerticalFlip,
+    transforms.ColorJitter,
+)
+
+def split_transforms(transf):
+    """ split transforms into per-image prefix and batch-level suffix """
+    n_img = len(transf)
+    while n_img > 0 and type(transf[n_img-1]) in SUPPORTED:
+        n_img -= 1
+    return transf[:n_img], transf[n_img:]
+
+
+def rgb_to_grayscale(x):
+    if x.size(1) == 1: return x
+    return (0.2989 * x[:, 0] + 0.587 * x[:, 1] + 0.114 * x[:, 2]).unsqueeze(1)
+
+
+def rgb_to_hsv(x):
+    r, g, b = x.unbind(1)
+    maxc = x.max(1)[0]
+    minc = x.min(1)[0]
+    eqc = maxc == minc
+    cr = maxc - minc
+    ones = torch.ones_like(maxc)
+    s = cr / torch.where(eqc, ones, maxc)
+    cr_div = torch.where(eqc, ones, cr)
+    rc = (maxc - r) / cr_div
+    gc = (maxc - g) / cr_div
+    bc = (maxc - b) / cr_div
+    hr = (maxc == r) * (bc - gc)
+    hg = ((maxc == g) & (maxc != r)) * (2.0 + rc - bc)
+    hb = ((maxc != g) & (maxc != r)) * (4.0 + gc - rc)
+    h = ((hr + hg + hb) / 6.0 + 1.0) % 1.0
+    return torch.stack((h, s, maxc), 1)
+
+
+def hsv_to_rgb(x):
+    h, s, v = x.unbind(1)
+    i = torch.floor(h * 6.0)
+    f = h * 6.0 - i
+    i = i.to(torch.int64).remainder(6).unsqueeze(1)
+    p = (v * (1.0 - s)).clamp(0.0, 1.0)
+    q = (v * (1.0 - s * f)).clamp(0.0, 1.0)
+    t = (v * (1.0 - s * (1.0 - f))).clamp(0.0, 1.0)
+    r = torch.stack((v, q, p, p, t, v), 1).gather(1, i)
+    g = torch.stack((t, v, v, q, p, p), 1).gather(1, i)
+    b = torch.stack((p, p, t, v, v, q), 1).gather(1, i)
+    return torch.cat((r, g, b), 1)
+
+
+def blend(x1, x2, ratio):
+    return (ratio * x1 + (1.0 - ratio) * x2).clamp(0.0, 1.0)
+
+
+class BatchAugment():
+    """ Augment whole image batches on device with per-sample random parameters """
+    def __init__(self, ops, mean, std, cutout=0, seed=None):
+        for op in ops:
+            if type(op) not in SUPPORTED:
+                raise ValueError('unsupported batch transform: {}'.format(op))
+        self.ops = ops
+        self.mean = torch.tensor(mean, dtype=torch.float).view(1, -1, 1, 1)
+        self.std = torch.tensor(std, dtype=torch.float).view(1, -1, 1, 1)
+        self.cutout = cutout
+        # dedicated generator, independent of the global RNG used by samplers and workers
+        if seed is None:
+            seed = int(torch.randint(2**62, (1, )).item())
+        self.gen = torch.Generator()
+        self.gen.manual_seed(seed)
+
+    def state_dict(self):
+        return {'gen': self.gen.get_state()}
+
+    def load_state_dict(self, state_dict):
+        self.gen.set_state(state_dict['gen'])
+
+    def rand(self, n, device):
+        return torch.rand(n, generator=self.gen).to(device, non_blocking=True)
+
+    def randint(self, high, n, device):
+        return torch.randint(high, (n, ), generator=self.gen).to(device, non_blocking=True)
+
+    def uniform(self, bounds, n, device):
+        return torch.empty(n).uniform_(bounds[0], bounds[1], generator=self.gen).to(device, non_blocking=True)
+
+    def __call__(self, x):
+        if x.dtype == torch.uint8:
+            x = x.float().div_(255)
+        for op in self.ops:
+            if isinstance(op, transforms.RandomCrop):
+                x = self.random_crop(op, x)
+            elif isinstance(op, transforms.RandomHorizontalFlip):
+                x = self.random_flip(op.p, x, 3)
+            elif isinstance(op, transforms.RandomVerticalFlip):
+                x = self.random_flip(op.p, x, 2)
+            elif isinstance(op, transforms.ColorJitter):
+                x = self.color_jitter(op, x)
+        x = (x - self.mean.to(x.device)) / self.std.to(x.device)
+        if self.cutout > 0:
+            x = self.random_cutout(self.cutout, x)
+        return x
+
+    def random_crop(self, op, x):
+        pad = op.padding
+        if not pad is None and pad != 0:
+            if isinstance(pad, int): pad = [pad] * 4
+            elif len(pad) == 1: pad = list(pad) * 4
+            elif len(pad) == 2: pad = [pad[0], pad[1], pad[0], pad[1]]
+            mode = op.padding_mode
+            fill = op.fill / 255. if isinstance(op.fill, (int, float)) else 0.
+            kwargs = {'value': fill} if mode == 'constant' else {}
+            # (left, top, right, bottom) -> F.pad order
+            x = F.pad(x, (pad[0], pad[2], pad[1], pad[3]), mode=mode, **kwargs)
+        N, _, H, W = x.shape
+        th, tw = op.size
+        if H == th and W == tw: return x
+        i = self.randint(H - th + 1, N, x.device)
+        j = self.randint(W - tw + 1, N, x.device)
+        rows = i.view(-1, 1, 1) + torch.arange(th, device=x.device).view(1, -1, 1)
+        cols = j.view(-1, 1, 1) + torch.arange(tw, device=x.device).view(1, 1, -1)
+        n = torch.arange(N, device=x.device).view(-1, 1, 1)
+        return x.permute(0, 2, 3, 1)[n, rows, cols].permute(0, 3, 1, 2)
+
+    def random_flip(self, p, x, dim):
+        mask = self.rand(x.size(0), x.device) < p
+        return torch.where(mask.view(-1, 1, 1, 1), x.flip(dim), x)
+
+    def color_jitter(self, op, x):
+        # per-sample factors, the order of the adjustments is drawn per batch
+        N = x.size(0)
+        for fn_id in torch.randperm(4, generator=self.gen).tolist():
+            if fn_id == 0 and not op.brightness is None:
+                f = self.uniform(op.brightness, N, x.device).view(-1, 1, 1, 1)
+                x = blend(x, torch.zeros_like(x), f)
+            elif fn_id == 1 and not op.contrast is None:
+                f = self.uniform(op.contrast, N, x.device).view(-1, 1, 1, 1)
+                mean = rgb_to_grayscale(x).mean(dim=(1, 2, 3), keepdim=True)
+                x = blend(x, mean, f)
+            elif fn_id == 2 and not op.saturation is None and x.size(1) == 3:
+                f = self.uniform(op.saturation, N, x.device).view(-1, 1, 1, 1)
+                x = blend(x, rgb_to_grayscale(x), f)
+            elif fn_id == 3 and not op.hue is None and x.size(1) == 3:
+                f = self.uniform(op.hue, N, x.device).view(-1, 1, 1)
+                hsv = rgb_to_hsv(x)
+                h = (hsv[:, 0] + f) % 1.0
+                x = hsv_to_rgb(torch.stack((h, hsv[:, 1], hsv[:, 2]), 1))
+        return x
+
+    def random_cutout(self, length, x):
+        N, _, H, W = x.shape
+        y = self.randint(H, N, x.device).view(-1, 1)
+        z = self.randint(W, N, x.device).view(-1, 1)
+        rows = torch.arange(H, device=x.device).view(1, -1)
+        cols = torch.arange(W, device=x.device).view(1, -1)
+        my = (rows >= y - length // 2) & (rows < y + length // 2)
+        mx = (cols >= z - length // 2) & (cols < z + length // 2)
+        mask = (my.unsqueeze(2) & mx.unsqueeze(1)).unsqueeze(1)
+        return x.masked_fill(mask, 0.)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import os
+import copy
+import json
+import hashlib
+import logging
+import collections
+import numpy as np
+import torch
+from torch.utils.data import Subset
+from .torch_dataloader import ResumableSampler
+
+# least recently used first
+_registry = collections.OrderedDict()
+_stale_iters = []
+_owner_pid = os.getpid()
+
+def data_key(config, validation):
+    """ hash of the data config subtree """
+    conf = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.md5('{}:{}'.format(conf, validation).encode()).hexdigest()
+
+
+def to_shared(arr):
+    """ copy array into shared memory, return array of the same type """
+    if isinstance(arr, torch.Tensor):
+        return arr.share_memory_()
+    if isinstance(arr, np.ndarray) and not isinstance(arr, np.memmap) and arr.dtype != object:
+        # the numpy view keeps the shared tensor alive
+        return torch.from_numpy(np.ascontiguousarray(arr)).share_memory_().numpy()
+    return arr
+
+
+def share_memory(data, memo=None):
+    """ move in-memory samples and labels of dataset to shared memory """
+    memo = {} if memo is None else memo
+    if isinstance(data, Subset):
+        return share_memory(data.dataset, memo)
+    for attr in ['data', '_data', 'blob', 'targets', 'labels']:
+        val = data.__dict__.get(attr, None)
+        if val is None: continue
+        # aliased arrays stay aliased
+        if not id(val) in memo:
+            memo[id(val)] = to_shared(val)
+        setattr(data, attr, memo[id(val)])
+
+
+def iter_loaders(loaders):
+    return loaders if isinstance(loaders, tuple) else (loaders, )
+
+
+def reset_loader(loader, reset_workers):
+    """ clear the sampler and augmentation state left by the previous trial """
+    samplers = [getattr(loader, 'sampler', None), getattr(loader, 'val_sampler', None)]
+    for sampler in samplers:
+        if isinstance(sampler, ResumableSampler):
+            sampler.resume = False
+    batch_sampler = getattr(loader, 'batch_sampler', None)
+    if hasattr(batch_sampler, 'val_states'):
+        batch_sampler.val_states.clear()
+    batch_aug = getattr(loader, 'batch_aug', None)
+    if not batch_aug is None:
+        batch_aug.gen.manual_seed(int(torch.randint(2**62, (1, )).item()))
+    if reset_workers:
+        # worker processes of the parent do not exist in a forked process
+        # and must not be shut down from here
+        loader = getattr(loader, 'loader', loader)
+        if not loader._iterator is None:
+            _stale_iters.append(loader._iterator)
+        loader._iterator = None
+
+
+def shutdown_loader(loader):
+    """ shut down the worker pool of loader started by this process """
+    loader = getattr(loader, 'loader', loader)
+    it = loader._iterator
+    loader._iterator = None
+    if hasattr(it, '_shutdown_workers'):
+        it._shutdown_workers()
+
+
+def get_shared_data(config, validation, load_fn):
+    """ return loaders of data config, reused while the data config is unchanged
+
+    At most config.shared_size data configs are kept, the least recently
+    used is released with its worker pools.
+    """
+    global _owner_pid
+    if os.getpid() != _owner_pid:
+        for loaders in _registry.values():
+            for loader in iter_loaders(loaders):
+                reset_loader(loader, True)
+        _owner_pid = os.getpid()
+    key = data_key(config, validation)
+    if key in _registry:
+        _registry.move_to_end(key)
+        loaders = _registry[key]
+        for loader in iter_loaders(loaders):
+            reset_loader(loader, False)
+        logging.info('data_registry: reuse data {}'.format(key[:8]))
+        return loaders
+    while len(_registry) >= max(1, config.get('shared_size', 2)):
+        old_key, old_loaders = _registry.popitem(last=False)
+        for loader in iter_loaders(old_loaders):
+            shutdown_loader(loader)
+        logging.info('data_registry: release data {}'.format(old_key[:8]))
+    config = copy.deepcopy(config)
+    # workers are kept alive between trials
+    config.dloader.persistent_workers = True
+    loaders = load_fn(config, validation)
+    memo = {}
+    for loader in iter_loaders(loaders):
+        share_memory(loader.dataset, memo)
+    _registry[key] = loaders
+    logging.info('data_registry: new data {} ({} in registry)'.format(key[:8], len(_registry)))
+    return loaders
+
+
+def clear_shared_data():
+    """ release all registered datasets and worker pools """
+    for loaders in _registry.values():
+        for loader in iter_loaders(loaders):
+            shutdown_loader(loader)
+    _registry.clear()
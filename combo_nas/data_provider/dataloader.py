@@ -9,10 +9,19 @@ def get_dataloader(config, metadata):
     if config.type == 'pytorch':
         from .torch_dataloader import get_torch_dataloader
         return get_torch_dataloader(config, metadata)
+    elif config.type == 'shard':
+        from .shard_dataloader import get_shard_dataloader
+        return get_shard_dataloader(config, metadata)
     else:
         raise ValueError('unsupported dataloader: {}'.format(config.type))
 
 def load_data(config, validation):
+    if config.get('shared', False):
+        from .data_registry import get_shared_data
+        return get_shared_data(config, validation, build_data)
+    return build_data(config, validation)
+
+def build_data(config, validation):
     dataset = config.type.lower()
 
     root = config.valid_root if validation else config.train_root
@@ -34,12 +43,22 @@ def load_data(config, validation):
         MEAN = [0.485, 0.456, 0.406]
         STD = [0.229, 0.224, 0.225]
     elif dataset == 'image':
-        MEAN = [0.5, 0.5, 0.5]
-        STD = [0, 0, 0]
+        # computed from the training data
+        MEAN = STD = None
     else:
         raise ValueError('unsupported dataset: {}'.format(dataset))
+
+    if config.get('stats', False) or MEAN is None:
+        from .dataset_stats import get_dataset_stats
+        MEAN, STD = get_dataset_stats(config, dataset)
     
     metadata = (dataset, root, MEAN, STD, validation)
 
+    if config.get('proxy', None):
+        if config.dloader.type != 'pytorch':
+            raise ValueError('proxy dataset requires pytorch dataloader')
+        from .proxy_dataset import get_proxy_dataloader
+        return get_proxy_dataloader(config.dloader, config.proxy, metadata)
+
     return get_dataloader(config.dloader, metadata)
 
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+from torch.utils.data import Dataset, DataLoader, Subset
+
+class ToArray():
+    def __call__(self, img):
+        arr = np.asarray(img, dtype=np.uint8)
+        return arr[:, :, None] if arr.ndim == 2 else arr
+
+
+def collate_arrays(batch):
+    return np.stack([x for x, _ in batch]), np.array([y for _, y in batch], dtype=np.int64)
+
+
+def collate_batch(batch):
+    """ collate_fn of loaders over a dataset serving whole batches """
+    return batch
+
+
+def cache_key(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def temp_path(path):
+    """ temporary file next to path, private to this process """
+    return '{}.{}.tmp'.format(path, os.getpid())
+
+
+def replace_file(path, write):
+    """ write path through a temporary file, concurrent builders never see partial files """
+    tmp = temp_path(path)
+    try:
+        with open(tmp, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+
+def build_cache(build_dset, path, size=0, workers=0, batch_size=256, indices=None, label_map=None, meta=None):
+    """ decode dataset (or a subset of indices) once into a uint8 NHWC memmap and a label array """
+    transf = [] if not size else [transforms.Resize(size), transforms.CenterCrop(size)]
+    data = build_dset(transforms.Compose(transf + [ToArray()]))
+    if not indices is None:
+        data = Subset(data, indices)
+    n_data = len(data)
+    shape = (n_data, ) + data[0][0].shape
+    logging.info('dataset_cache: building {} {}'.format(path, shape))
+    loader = DataLoader(data, batch_size=batch_size, num_workers=workers, collate_fn=collate_arrays)
+    tmp_path = temp_path(path + '.u8')
+    try:
+        arr = np.memmap(tmp_path, dtype=np.uint8, mode='w+', shape=shape)
+        labels = np.empty(n_data, dtype=np.int64)
+        pt = 0
+        for X, y in loader:
+            arr[pt:pt+len(X)] = X
+            labels[pt:pt+len(X)] = y
+            pt += len(X)
+        arr.flush()
+        del arr
+        os.replace(tmp_path, path + '.u8')
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+    if not label_map is None:
+        labels = label_map[labels]
+    replace_file(path + '.labels.npy', lambda f: np.save(f, labels))
+    meta = dict(meta or {}, shape=shape)
+    # meta is written last and marks the cache as complete
+    replace_file(path + '.json', lambda f: f.write(json.dumps(meta).encode()))
+    logging.info('dataset_cache: built {}'.format(path))
+
+
+class CachedDataset(Dataset):
+    """ Pre-decoded uint8 images in a numpy memmap with a label array """
+    def __init__(self, path, transform=None, in_memory=False):
+        with open(path + '.json', 'r') as f:
+            meta = json.load(f)
+        self.path = path
+        self.meta = meta
+        self.shape = tuple(meta['shape'])
+        self.mode = 'L' if self.shape[-1] == 1 else 'RGB'
+        self.labels = np.load(path + '.labels.npy')
+        self.targets = self.labels
+        self.transform = transform
+        self.in_memory = in_memory
+        self._data = np.array(self.open_memmap()) if in_memory else None
+
+    def open_memmap(self):
+        # copy-on-write: pages are shared between processes and tensors can be built without copy
+        return np.memmap(self.path + '.u8', dtype=np.uint8, mode='c', shape=self.shape)
+
+    @property
+    def data(self):
+        # opened lazily so that each worker maps the file instead of receiving a copy
+        if self._data is None:
+            self._data = self.open_memmap()
+        return self._data
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if not self.in_memory: state['_data'] = None
+        return state
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        img = self.data[index]
+        if self.transform is None:
+            # uint8 CHW tensor for batch-level augmentation
+            return torch.from_numpy(np.ascontiguousarray(img.transpose(2, 0, 1))), int(self.labels[index])
+        img = Image.fromarray(img[:, :, 0] if self.mode == 'L' else img, mode=self.mode)
+        return self.transform(img), int(self.labels[index])
+
+    def get_batch(self, index):
+        """ uint8 NHWC batch and labels, zero-copy for slice index """
+        return torch.from_numpy(np.asarray(self.data[index])), torch.from_numpy(np.asarray(self.labels[index]))
+
+    @property
+    def batched(self):
+        """ whether batches are served whole by get_batch, loaders then use collate_batch """
+        return self.transform is None
+
+    def __getitems__(self, indices):
+        """ samples of a batch of indices, or a whole uint8 NCHW batch and labels if batched """
+        if not self.batched:
+            return [self[i] for i in indices]
+        idx = np.asarray(indices)
+        if len(idx) > 0 and (np.diff(idx) == 1).all():
+            idx = slice(int(idx[0]), int(idx[-1]) + 1)
+        X, y = self.get_batch(idx)
+        # channels_last view of the NHWC images
+        return X.permute(0, 3, 1, 2), y
+
+
+def get_cached_dataset(build_dset, cache_dir, params, transform, size=0, in_memory=False, workers=0):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, '{}-{}'.format(params['dataset'], cache_key(params)))
+    if not os.path.exists(path + '.json'):
+        build_cache(build_dset, path, size, workers)
+    else:
+        logging.info('dataset_cache: loading {}'.format(path))
+    return CachedDataset(path, transform, in_memory)
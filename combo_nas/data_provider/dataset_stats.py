@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from torchvision import transforms
+from torch.utils.data import DataLoader, Subset
+from .torch_dataloader import get_dataset_class, get_cache_dir, build_dataset
+
+class WelfordStats():
+    """ Streaming per-channel mean and variance, mergeable across partitions """
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self.m2 = None
+
+    def merge(self, n, mean, m2):
+        if n == 0: return
+        if self.n == 0:
+            self.n, self.mean, self.m2 = n, mean.clone(), m2.clone()
+            return
+        tot = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / tot
+        self.m2 += m2 + delta * delta * self.n * n / tot
+        self.n = tot
+
+    def update(self, x):
+        """ merge pixels of a (C, ...) tensor """
+        x = x.reshape(x.size(0), -1).double()
+        mean = x.mean(1)
+        self.merge(x.size(1), mean, ((x - mean.unsqueeze(1)) ** 2).sum(1))
+
+    def std(self):
+        return (self.m2 / self.n).sqrt()
+
+
+def collate_stats(batch):
+    """ reduce a batch to partial statistics in the worker process """
+    stats = WelfordStats()
+    for x, _ in batch:
+        stats.update(x)
+    return stats.n, stats.mean, stats.m2
+
+
+def dataset_hash(data):
+    """ hash of the sample list or raw data of a dataset """
+    h = hashlib.md5(type(data).__name__.encode())
+    h.update(str(len(data)).encode())
+    if hasattr(data, 'blob'):
+        h.update(data.blob.tobytes())
+        h.update(np.asarray(data.targets).tobytes())
+    elif hasattr(data, 'samples'):
+        for path, target in data.samples:
+            h.update('{}:{}'.format(os.path.relpath(path, data.root), target).encode())
+    elif hasattr(data, 'data'):
+        h.update(np.ascontiguousarray(np.asarray(data.data)).tobytes())
+    return h.hexdigest()
+
+
+def compute_stats(data, max_samples=0, workers=0, batch_size=64, seed=0):
+    """ per-channel mean and std of data in one streaming pass """
+    if max_samples > 0 and max_samples < len(data):
+        rng = np.random.RandomState(seed)
+        data = Subset(data, np.sort(rng.choice(len(data), max_samples, replace=False)).tolist())
+    loader = DataLoader(data, batch_size=batch_size, num_workers=workers, collate_fn=collate_stats)
+    stats = WelfordStats()
+    for n, mean, m2 in loader:
+        stats.merge(n, mean, m2)
+    return stats.mean.tolist(), stats.std().tolist()
+
+
+def get_dataset_stats(config, dataset):
+    """ return cached or computed MEAN and STD of the training data of data config """
+    root = config.train_root
+    dset = get_dataset_class(dataset)
+    data = build_dataset(config.dloader, dset, root, False, transforms.ToTensor())
+    max_samples = config.stats_samples
+    key = hashlib.md5('{}:{}'.format(dataset_hash(data), max_samples).encode()).hexdigest()[:16]
+    cache_dir = get_cache_dir(config.dloader, root)
+    path = os.path.join(cache_dir, 'stats-{}-{}.json'.format(dataset, key))
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            stats = json.load(f)
+        logging.info('dataset_stats: loaded {}'.format(path))
+        return stats['mean'], stats['std']
+    logging.info('dataset_stats: computing statistics of {} ({} samples)'.format(
+        root, max_samples if max_samples > 0 else len(data)))
+    mean, std = compute_stats(data, max_samples, config.dloader.workers)
+    logging.info('dataset_stats: mean: {} std: {}'.format(mean, std))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'mean': mean, 'std': std}, f)
+        os.replace(path + '.tmp', path)
+    except OSError as e:
+        logging.warning('dataset_stats: failed to save statistics: {}'.format(e))
+    return mean, std
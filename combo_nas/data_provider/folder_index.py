@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import hashlib
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from torchvision.datasets import VisionDataset
+from torchvision.datasets.folder import IMG_EXTENSIONS, default_loader
+
+def find_classes(root):
+    classes = sorted(entry.name for entry in os.scandir(root) if entry.is_dir())
+    if not classes:
+        raise FileNotFoundError('no class folder found in {}'.format(root))
+    return classes
+
+
+def scan_class_dir(class_dir):
+    """ valid image paths under class_dir in ImageFolder order, and the directories walked """
+    paths = []
+    dirs = []
+    for root, _, fnames in sorted(os.walk(class_dir, followlinks=True)):
+        dirs.append(root)
+        for fname in sorted(fnames):
+            if fname.lower().endswith(IMG_EXTENSIONS):
+                paths.append(os.path.join(root, fname))
+    return paths, dirs
+
+
+def index_signature(root, dirs):
+    """ hash of root and the mtimes of the directories under it, changes when files are added or removed """
+    h = hashlib.md5(os.path.realpath(root).encode())
+    for d in dirs:
+        h.update(d.encode())
+        h.update(str(os.stat(os.path.join(root, d)).st_mtime_ns).encode())
+    return h.hexdigest()
+
+
+def build_index(root, classes, workers=16):
+    """ scan class directories in parallel, return path blob, offsets, labels and the directories walked """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        scans = list(pool.map(scan_class_dir, [os.path.join(root, c) for c in classes]))
+    class_paths = [p for p, _ in scans]
+    empty = [c for c, p in zip(classes, class_paths) if len(p) == 0]
+    if empty:
+        raise FileNotFoundError('no valid file found for classes: {}'.format(', '.join(empty)))
+    rel_paths = [os.path.relpath(p, root).encode() for paths in class_paths for p in paths]
+    labels = np.concatenate([np.full(len(p), i, dtype=np.int64) for i, p in enumerate(class_paths)])
+    offsets = np.zeros(len(rel_paths)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in rel_paths])
+    blob = np.frombuffer(b''.join(rel_paths), dtype=np.uint8)
+    dirs = ['.'] + [os.path.relpath(d, root) for _, class_dirs in scans for d in class_dirs]
+    return blob, offsets, labels, dirs
+
+
+def load_index(root, index_path, workers=16):
+    """ load the file index of root from index_path, rebuilding it when stale
+
+    Staleness is checked by a stat of each directory recorded in the index, without listing files.
+    """
+    if os.path.exists(index_path):
+        try:
+            index = np.load(index_path)
+            if str(index['sig']) == index_signature(root, [str(d) for d in index['dirs']]):
+                return list(index['classes']), index['blob'], index['offsets'], index['labels']
+            logging.info('folder_index: stale index: {}'.format(index_path))
+        except Exception as e:
+            logging.warning('folder_index: failed to load index: {}'.format(e))
+    classes = find_classes(root)
+    t0 = time.time()
+    blob, offsets, labels, dirs = build_index(root, classes, workers)
+    sig = index_signature(root, dirs)
+    logging.info('folder_index: indexed {} files in {} classes ({:.1f} sec)'.format(
+        len(labels), len(classes), time.time() - t0))
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(index_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, sig=np.array(sig), classes=np.array(classes), blob=blob, offsets=offsets, labels=labels,
+                     dirs=np.array(dirs))
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        logging.warning('folder_index: failed to save index: {}'.format(e))
+    return classes, blob, offsets, labels
+
+
+class IndexedImageFolder(VisionDataset):
+    """ ImageFolder backed by a persisted file index stored as offsets into a path blob """
+    def __init__(self, root, index_path, transform=None, target_transform=None, loader=default_loader, workers=16):
+        super().__init__(root, transform=transform, target_transform=target_transform)
+        self.loader = loader
+        self.classes, self.blob, self.offsets, self.targets = load_index(root, index_path, workers)
+        self.class_to_idx = {c: i for i, c in enumerate(self.classes)}
+
+    def get_path(self, index):
+        rel_path = self.blob[self.offsets[index]:self.offsets[index+1]].tobytes().decode()
+        return os.path.join(self.root, rel_path)
+
+    @property
+    def samples(self):
+        return [(self.get_path(i), int(t)) for i, t in enumerate(self.targets)]
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, index):
+        sample = self.loader(self.get_path(index))
+        target = int(self.targets[index])
+        if not self.transform is None:
+            sample = self.transform(sample)
+        if not self.target_transform is None:
+            target = self.target_transform(target)
+        return sample, target
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import os
+import copy
+import time
+import random
+import logging
+import itertools
+import yaml
+import torch
+from torch.utils.data import IterableDataset
+from torch.utils.data.dataloader import default_collate
+from .prefetcher import Prefetcher
+from .dataloader import load_data
+
+def identity(x):
+    return x
+
+
+def sync(device):
+    if torch.device(device).type == 'cuda': torch.cuda.synchronize()
+
+
+def cpu_time():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def profile_stages(loader, device, n_batches=4):
+    """ average per-batch time (sec) of decode, transform, collate and transfer in the main process """
+    data = loader.dataset
+    if isinstance(data, IterableDataset) or not hasattr(data, 'transform'):
+        return None
+    indices = random.sample(range(len(data)), min(len(data), n_batches * loader.batch_size))
+    stat = {'decode': 0., 'transform': 0., 'collate': 0., 'transfer': 0.}
+    transform = data.transform
+    # decode only, transforms are timed separately
+    if not transform is None: data.transform = identity
+    try:
+        for b in range(0, len(indices), loader.batch_size):
+            t0 = time.perf_counter()
+            raw = [data[i] for i in indices[b:b+loader.batch_size]]
+            t1 = time.perf_counter()
+            samples = raw if transform is None else [(transform(x), y) for x, y in raw]
+            t2 = time.perf_counter()
+            X, y = default_collate(samples)
+            t3 = time.perf_counter()
+            X = X.to(device, non_blocking=True)
+            sync(device)
+            t4 = time.perf_counter()
+            stat['decode'] += t1 - t0
+            stat['transform'] += t2 - t1
+            stat['collate'] += t3 - t2
+            stat['transfer'] += t4 - t3
+            batch_aug = getattr(loader, 'batch_aug', None)
+            if not batch_aug is None:
+                batch_aug(X)
+                sync(device)
+                stat['batch_aug'] = stat.get('batch_aug', 0.) + time.perf_counter() - t4
+    finally:
+        data.transform = transform
+    n = (len(indices) + loader.batch_size - 1) // loader.batch_size
+    return {k: v / n for k, v in stat.items()}
+
+
+def benchmark_loader(loader, device, steps=50, warmup=5, prefetch=0, memory_format=torch.preserve_format):
+    """ run loader without a model, return throughput, data wait, transfer time and cpu utilisation """
+    def new_iter():
+        it = iter(loader)
+        return Prefetcher(it, device, prefetch, memory_format) if prefetch > 0 else it
+
+    it = new_iter()
+    n_samples = 0
+    t_wait = t_xfer = 0.
+    t_start = time.perf_counter()
+    c_start = cpu_time()
+    for step in range(warmup + steps):
+        if step == warmup:
+            t0 = time.perf_counter()
+            n_samples = 0
+            t_wait = t_xfer = 0.
+        tw = time.perf_counter()
+        batch = next(it, None)
+        if batch is None:
+            if prefetch > 0: it.close()
+            it = new_iter()
+            batch = next(it)
+        tx = time.perf_counter()
+        X, y = batch[0], batch[1]
+        X = X.to(device, non_blocking=True, memory_format=memory_format)
+        y = y.to(device, non_blocking=True)
+        sync(device)
+        t_wait += tx - tw
+        t_xfer += time.perf_counter() - tx
+        n_samples += X.size(0)
+    t_run = time.perf_counter() - t0
+    if prefetch > 0: it.close()
+    # shut down workers so that their cpu time is accounted
+    del it
+    t_total = time.perf_counter() - t_start
+    cpu_util = (cpu_time() - c_start) / t_total / (os.cpu_count() or 1)
+    return {
+        'samples_per_sec': n_samples / t_run,
+        'wait_per_batch': t_wait / steps,
+        'transfer_per_batch': t_xfer / steps,
+        'cpu_util': cpu_util,
+    }
+
+
+def autotune_loader(config, device, workers=(0, 2, 4), prefetch=(0, 2), pin_memory=(True, False),
+                    batch_size=(None, ), steps=50, warmup=5, validation=False):
+    """ sweep loader settings of data config, return results sorted by throughput """
+    bs_key = 'val_batch_size' if validation else 'trn_batch_size'
+    results = []
+    for w, p, pin, bs in itertools.product(workers, prefetch, pin_memory, batch_size):
+        cfg = copy.deepcopy(config)
+        cfg.dloader.workers = w
+        cfg.dloader.prefetch = p
+        cfg.dloader.pin_memory = pin
+        if not bs is None:
+            cfg.dloader[bs_key] = bs
+        loader = load_data(cfg, validation)
+        loader = loader[0] if isinstance(loader, tuple) else loader
+        setting = {'workers': w, 'prefetch': p, 'pin_memory': pin, bs_key: loader.batch_size}
+        res = benchmark_loader(loader, device, steps, warmup, p)
+        res.update(setting)
+        logging.info('loader_bench: {} {:.1f} samples/sec'.format(setting, res['samples_per_sec']))
+        results.append(res)
+    return sorted(results, key=lambda r: -r['samples_per_sec'])
+
+
+def write_config_snippet(path, section, result):
+    """ write best loader settings as yaml snippet to be merged into the config """
+    keys = [k for k in ['workers', 'prefetch', 'pin_memory', 'trn_batch_size', 'val_batch_size'] if k in result]
+    snippet = {section: {'data': {'dloader': {k: result[k] for k in keys}}}}
+    with open(path, 'w') as f:
+        yaml.dump(snippet, f, default_flow_style=False)
+    return snippet
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+import collections
+from torch.utils.data import DataLoader
+from torch.utils.data.sampler import Sampler
+
+def n_batches(n, batch_size, drop_last=False):
+    return n // batch_size if drop_last else (n + batch_size - 1) // batch_size
+
+
+def get_tr_ratio(n_trn_batches, n_val_batches):
+    """ train batches per valid batch, at least one """
+    if n_val_batches == 0:
+        raise ValueError('paired_loader: empty valid loader')
+    return max(1, n_trn_batches // n_val_batches)
+
+
+def iter_batches(sampler, batch_size):
+    batch = []
+    for idx in sampler:
+        batch.append(idx)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+class PairedBatchSampler(Sampler):
+    """ Interleave train batches with a valid batch after every tr_ratio-th train batch """
+    def __init__(self, trn_sampler, val_sampler, trn_batch_size, val_batch_size, tr_ratio):
+        self.trn_sampler = trn_sampler
+        self.val_sampler = val_sampler
+        self.trn_batch_size = trn_batch_size
+        self.val_batch_size = val_batch_size
+        self.tr_ratio = tr_ratio
+        self.with_valid = False
+        self.start_step = 0
+        self.val_states = collections.deque()
+
+    def __iter__(self):
+        # schedule is bound when the loader iterator is created
+        return self.generate(self.with_valid, self.start_step)
+
+    def generate(self, with_valid, start_step):
+        val_batches = self.cycle_valid() if with_valid else None
+        for step, batch in enumerate(iter_batches(self.trn_sampler, self.trn_batch_size), start_step):
+            yield batch
+            if with_valid and step % self.tr_ratio == 0:
+                yield next(val_batches)
+
+    def cycle_valid(self):
+        while True:
+            batches = iter_batches(self.val_sampler, self.val_batch_size)
+            first = next(batches, None)
+            if first is None:
+                raise ValueError('paired_loader: empty valid sampler')
+            # sampler state of each pass, taken before the loader reads ahead into the next one
+            self.val_states.append(self.val_sampler.state_dict())
+            yield first
+            yield from batches
+
+    def __len__(self):
+        return n_batches(len(self.trn_sampler), self.trn_batch_size)
+
+
+class PairedLoader():
+    """ Single loader over train and valid samplers sharing one worker pool
+
+    Iterating yields train batches only, iter_paired yields
+    (train batch, (val_step, valid batch, valid sampler state) or None).
+    """
+    def __init__(self, data, trn_sampler, val_sampler, trn_batch_size, val_batch_size, workers=0, pin_memory=True,
+                 persistent_workers=False, collate_fn=None):
+        self.sampler = trn_sampler
+        self.val_sampler = val_sampler
+        self.batch_size = trn_batch_size
+        self.val_batch_size = val_batch_size
+        self.n_val_batches = n_batches(len(val_sampler), val_batch_size)
+        self.tr_ratio = get_tr_ratio(n_batches(len(trn_sampler), trn_batch_size), self.n_val_batches)
+        self.batch_sampler = PairedBatchSampler(trn_sampler, val_sampler, trn_batch_size, val_batch_size, self.tr_ratio)
+        self.loader = DataLoader(data, batch_sampler=self.batch_sampler, num_workers=workers, pin_memory=pin_memory,
+                                 persistent_workers=persistent_workers, collate_fn=collate_fn)
+        self.dataset = data
+        self.batch_aug = None
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+    def __iter__(self):
+        self.batch_sampler.with_valid = False
+        self.batch_sampler.start_step = 0
+        return iter(self.loader)
+
+    def iter_paired(self, start_step=0, val_step=0):
+        """ iterate from train step start_step, val_step valid batches consumed in current pass """
+        self.batch_sampler.with_valid = True
+        self.batch_sampler.start_step = start_step
+        self.batch_sampler.val_states.clear()
+        # create the loader iterator now, it draws from the global RNG
+        return self.pair_batches(iter(self.loader), start_step, val_step)
+
+    def pair_batches(self, it, start_step, val_step):
+        val_state = None
+        for step, trn_batch in enumerate(it, start_step):
+            if step % self.tr_ratio != 0:
+                yield trn_batch, None
+                continue
+            val_batch = next(it)
+            val_step = val_step % self.n_val_batches + 1
+            if val_state is None or val_step == 1:
+                val_state = self.batch_sampler.val_states.popleft()
+            yield trn_batch, (val_step, val_batch, val_state)
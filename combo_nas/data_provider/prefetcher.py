@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import time
+import queue
+import threading
+import torch
+
+class Prefetcher():
+    """ Iterator that stages batches on the target device in a background thread """
+    def __init__(self, it, device, depth=2, memory_format=torch.preserve_format):
+        self.it = it
+        self.device = torch.device(device)
+        self.memory_format = memory_format
+        self.queue = queue.Queue(maxsize=depth)
+        if self.device.type == 'cuda':
+            self.dev_idx = torch.cuda.current_device() if self.device.index is None else self.device.index
+            self.stream = torch.cuda.Stream(device=self.dev_idx)
+        else:
+            self.stream = None
+        self.n_fetch = 0
+        self.n_stall = 0
+        self.t_stall = 0.
+        self.done = False
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+
+    def _stage(self, obj):
+        if isinstance(obj, torch.Tensor):
+            mem_fmt = self.memory_format if obj.dim() == 4 else torch.preserve_format
+            if not self.stream is None and not obj.is_pinned():
+                obj = obj.pin_memory()
+            return obj.to(self.device, non_blocking=True, memory_format=mem_fmt)
+        if isinstance(obj, (tuple, list)):
+            return type(obj)(self._stage(o) for o in obj)
+        return obj
+
+    def _put(self, item):
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker(self):
+        if not self.stream is None:
+            torch.cuda.set_device(self.dev_idx)
+        try:
+            for batch in self.it:
+                event = None
+                if self.stream is None:
+                    batch = self._stage(batch)
+                else:
+                    with torch.cuda.stream(self.stream):
+                        batch = self._stage(batch)
+                        event = torch.cuda.Event()
+                        event.record(self.stream)
+                if not self._put((batch, event)): return
+        except Exception as e:
+            self._put((e, None))
+            return
+        self._put((StopIteration(), None))
+
+    def _record_stream(self, obj):
+        if isinstance(obj, torch.Tensor) and obj.is_cuda:
+            obj.record_stream(torch.cuda.current_stream())
+        elif isinstance(obj, (tuple, list)):
+            for o in obj:
+                self._record_stream(o)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.done: raise StopIteration
+        if self.queue.empty():
+            self.n_stall += 1
+            t0 = time.perf_counter()
+            batch, event = self.queue.get()
+            self.t_stall += time.perf_counter() - t0
+        else:
+            batch, event = self.queue.get()
+        if isinstance(batch, StopIteration):
+            self.done = True
+            raise StopIteration
+        if isinstance(batch, Exception):
+            self.done = True
+            raise batch
+        self.n_fetch += 1
+        if not event is None:
+            torch.cuda.current_stream().wait_event(event)
+            self._record_stream(batch)
+        return batch
+
+    def stat(self):
+        return 'stalls: {}/{} wait: {:.3f} sec'.format(self.n_stall, self.n_fetch, self.t_stall)
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
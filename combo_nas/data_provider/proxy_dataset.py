@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+import os
+import logging
+import numpy as np
+from functools import partial
+from torchvision import transforms, datasets
+from .torch_dataloader import get_transforms, get_cache_dir, build_dataset, build_loaders
+from .dataset_cache import build_cache, cache_key, CachedDataset
+
+def select_proxy(labels, n_classes=0, per_class=0, split_ratio=0, seed=0):
+    """ select classes and samples per class with stratified splits
+
+    return train indices, valid indices and the selected class ids
+    """
+    rng = np.random.RandomState(seed)
+    labels = np.asarray(labels)
+    order = np.argsort(labels, kind='stable')
+    all_classes, starts = np.unique(labels[order], return_index=True)
+    bounds = np.append(starts, len(labels))
+    sel = np.arange(len(all_classes))
+    if n_classes > 0 and n_classes < len(all_classes):
+        sel = np.sort(rng.choice(len(all_classes), n_classes, replace=False))
+    trn_idx, val_idx = [], []
+    for c in sel:
+        idx = rng.permutation(order[bounds[c]:bounds[c+1]])
+        if per_class > 0: idx = idx[:per_class]
+        split = int(len(idx) * split_ratio) if split_ratio > 0 else len(idx)
+        trn_idx.append(np.sort(idx[:split]))
+        val_idx.append(np.sort(idx[split:]))
+    return np.concatenate(trn_idx), np.concatenate(val_idx), all_classes[sel]
+
+
+def get_proxy_dataset(config, proxy, dataset, dset, root, validation, transform, workers=0):
+    """ return cached proxy dataset, train samples are stored before valid samples """
+    size = proxy.get('size', 0)
+    n_classes = proxy.get('classes', 0)
+    per_class = proxy.get('per_class', 0)
+    seed = proxy.get('seed', 0)
+    split_ratio = 0 if validation else config.split_ratio
+    if dset == datasets.ImageFolder and not size:
+        raise ValueError('proxy dataset: size required for {}'.format(dataset))
+    if size and dset != datasets.ImageFolder:
+        logging.warning('proxy dataset: keeping native resolution of {}'.format(dataset))
+        size = 0
+    params = {
+        'dataset': dataset,
+        'root': os.path.realpath(root),
+        'validation': validation,
+        'size': size,
+        'classes': n_classes,
+        'per_class': per_class,
+        'split_ratio': split_ratio,
+        'seed': seed,
+    }
+    cache_dir = get_cache_dir(config, root)
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, '{}-proxy-{}'.format(dataset, cache_key(params)))
+    if not os.path.exists(path + '.json'):
+        build_dset = partial(build_dataset, config, dset, root, validation)
+        labels = np.asarray(build_dset(None).targets)
+        trn_idx, val_idx, classes = select_proxy(labels, n_classes, per_class, split_ratio, seed)
+        label_map = np.full(int(labels.max())+1, -1, dtype=np.int64)
+        label_map[classes] = np.arange(len(classes))
+        meta = {'n_trn': len(trn_idx), 'classes': classes.tolist()}
+        build_cache(build_dset, path, size, workers, indices=np.concatenate([trn_idx, val_idx]).tolist(),
+                    label_map=label_map, meta=meta)
+    data = CachedDataset(path, transform, in_memory=config.cache == 'memory')
+    logging.info('proxy dataset: {} classes, {} train / {} valid samples'.format(
+        len(data.meta['classes']), data.meta['n_trn'], len(data) - data.meta['n_trn']))
+    return data
+
+
+def get_proxy_dataloader(config, proxy, metadata):
+    dataset, root, MEAN, STD, validation = metadata
+    dset, img_transf, batch_aug = get_transforms(config, dataset, MEAN, STD, validation, proxy.get('size', 0))
+    transform = transforms.Compose(img_transf)
+    if config.batch_aug and len(img_transf) == 1: transform = None
+    data = get_proxy_dataset(config, proxy, dataset, dset, root, validation, transform, config.workers)
+    workers = 0 if config.cache == 'memory' and transform is None else config.workers
+    if config.split_ratio > 0 and not validation:
+        n_trn = data.meta['n_trn']
+        return build_loaders(config, data, validation, batch_aug, workers,
+                             list(range(n_trn)), list(range(n_trn, len(data))))
+    return build_loaders(config, data, validation, batch_aug, workers)
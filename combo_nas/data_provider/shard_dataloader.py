@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import math
+import json
+import random
+import logging
+import tarfile
+import torch
+import torch.distributed as dist
+from PIL import Image
+from torchvision import transforms, datasets
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info, default_collate
+from .torch_dataloader import get_transforms
+
+INDEX_FILE = 'index.json'
+
+def write_shards(samples, classes, out_dir, shard_size=1000):
+    """ write (path, label) samples as tar shards of encoded image files with an index """
+    os.makedirs(out_dir, exist_ok=True)
+    shards = []
+    for sidx, start in enumerate(range(0, len(samples), shard_size)):
+        name = 'shard-{:06d}.tar'.format(sidx)
+        tmp_path = os.path.join(out_dir, name + '.tmp')
+        chunk = samples[start:start+shard_size]
+        with tarfile.open(tmp_path, 'w') as tar:
+            for i, (path, label) in enumerate(chunk):
+                key = '{:09d}'.format(start + i)
+                ext = os.path.splitext(path)[1].lower() or '.jpg'
+                tar.add(path, arcname=key+ext)
+                data = str(label).encode()
+                info = tarfile.TarInfo(key+'.cls')
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        os.replace(tmp_path, os.path.join(out_dir, name))
+        shards.append({'name': name, 'size': len(chunk)})
+        logging.info('shard_dataloader: wrote {} ({})'.format(name, len(chunk)))
+    with open(os.path.join(out_dir, INDEX_FILE), 'w') as f:
+        json.dump({'classes': classes, 'shards': shards}, f)
+    return shards
+
+
+def convert_image_folder(root, out_dir, shard_size=1000, shuffle=True, seed=0):
+    """ convert an ImageFolder tree to tar shards, optionally shuffling samples across shards """
+    folder = datasets.ImageFolder(root)
+    samples = list(folder.samples)
+    if shuffle:
+        random.Random(seed).shuffle(samples)
+    return write_shards(samples, folder.classes, out_dir, shard_size)
+
+
+def read_index(root):
+    with open(os.path.join(root, INDEX_FILE), 'r') as f:
+        return json.load(f)
+
+
+def iter_tar(path):
+    """ stream (image bytes, label) pairs from a tar shard sequentially """
+    cur_key = None
+    sample = {}
+    with tarfile.open(path, 'r|') as tar:
+        for member in tar:
+            if not member.isfile(): continue
+            key, ext = os.path.splitext(member.name)
+            if key != cur_key:
+                if 'img' in sample and 'cls' in sample: yield sample['img'], sample['cls']
+                cur_key = key
+                sample = {}
+            data = tar.extractfile(member).read()
+            if ext == '.cls':
+                sample['cls'] = int(data.decode())
+            else:
+                sample['img'] = data
+    if 'img' in sample and 'cls' in sample: yield sample['img'], sample['cls']
+
+
+class ShardDataset(IterableDataset):
+    """ Stream batches of samples from tar shards with shard-level shuffling and a shuffle buffer
+
+    Shards are split across distributed ranks and then across DataLoader workers,
+    each worker batches its own samples so that the number of batches is exact.
+    """
+    def __init__(self, root, shards, transform=None, shuffle=True, shuffle_buffer=1000,
+                 batch_size=1, drop_last=False, workers=0):
+        self.root = root
+        self.shards = shards
+        self.transform = transform
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.batch_size = batch_size
+        self.drop_last = drop_last
+        self.n_workers = max(1, workers)
+        self.rank, self.world_size = 0, 1
+        if dist.is_available() and dist.is_initialized():
+            self.rank, self.world_size = dist.get_rank(), dist.get_world_size()
+
+    def worker_shards(self, wid):
+        return self.shards[self.rank::self.world_size][wid::self.n_workers]
+
+    def __len__(self):
+        n_batches = 0
+        for wid in range(self.n_workers):
+            n_samples = sum(s['size'] for s in self.worker_shards(wid))
+            if self.drop_last:
+                n_batches += n_samples // self.batch_size
+            else:
+                n_batches += math.ceil(n_samples / self.batch_size)
+        return n_batches
+
+    def get_shards(self):
+        info = get_worker_info()
+        if info is None:
+            seed, wid = int(torch.randint(2**62, (1, )).item()), 0
+        else:
+            seed, wid = info.seed, info.id
+        # shards are assigned to workers statically, only their order is shuffled
+        shards = list(self.worker_shards(wid))
+        rng = random.Random(seed)
+        if self.shuffle:
+            rng.shuffle(shards)
+        return shards, rng
+
+    def samples(self, shards):
+        for shard in shards:
+            for data, label in iter_tar(os.path.join(self.root, shard['name'])):
+                img = Image.open(io.BytesIO(data)).convert('RGB')
+                if not self.transform is None:
+                    img = self.transform(img)
+                yield img, label
+
+    def shuffled(self, shards, rng):
+        if not self.shuffle or self.shuffle_buffer <= 1:
+            yield from self.samples(shards)
+            return
+        buf = []
+        for sample in self.samples(shards):
+            if len(buf) < self.shuffle_buffer:
+                buf.append(sample)
+                continue
+            idx = rng.randrange(len(buf))
+            yield buf[idx]
+            buf[idx] = sample
+        rng.shuffle(buf)
+        yield from buf
+
+    def __iter__(self):
+        shards, rng = self.get_shards()
+        batch = []
+        for sample in self.shuffled(shards, rng):
+            batch.append(sample)
+            if len(batch) == self.batch_size:
+                yield default_collate(batch)
+                batch = []
+        if len(batch) > 0 and not self.drop_last:
+            yield default_collate(batch)
+
+
+def get_shard_dataloader(config, metadata):
+    dataset, root, MEAN, STD, validation = metadata
+    if not dataset in ['imagenet', 'image']:
+        raise ValueError('shard dataloader: unsupported dataset = {}'.format(dataset))
+
+    _, img_transf, batch_aug = get_transforms(config, dataset, MEAN, STD, validation)
+    transform = transforms.Compose(img_transf)
+    shards = read_index(root)['shards']
+
+    def build_loader(shards, batch_size, shuffle, drop_last):
+        data = ShardDataset(root, shards, transform, shuffle, config.shuffle_buffer,
+                            batch_size, drop_last, config.workers)
+        # batched by the dataset
+        loader = DataLoader(data, batch_size=None, num_workers=config.workers, pin_memory=config.pin_memory,
+                            persistent_workers=config.workers > 0 and config.persistent_workers)
+        loader.batch_aug = batch_aug
+        return loader
+
+    if config.split_ratio > 0:
+        if len(shards) < 2:
+            raise ValueError('shard_dataloader: split requires at least 2 shards, got {}'.format(len(shards)))
+        # at least one shard on each side
+        split = min(len(shards) - 1, max(1, int(len(shards) * config.split_ratio)))
+        logging.info('shard_dataloader: split shards: {}/{}'.format(split, len(shards)-split))
+        trn_loader = build_loader(shards[:split], config.trn_batch_size, True, False)
+        val_loader = build_loader(shards[split:], config.val_batch_size, False, False)
+        return trn_loader, val_loader
+    elif validation:
+        return build_loader(shards, config.val_batch_size, False, False)
+    else:
+        return build_loader(shards, config.trn_batch_size, True, True)
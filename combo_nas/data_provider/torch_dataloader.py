@@ -1,11 +1,45 @@
 import logging
 import os
+import hashlib
+from functools import partial
 import torch
 from torchvision import transforms, datasets
 from torch.utils.data import DataLoader
-from torch.utils.data.sampler import SubsetRandomSampler
+from torch.utils.data.sampler import Sampler
 import numpy as np
 
+class ResumableSampler(Sampler):
+    """ Samples elements from given indices, resumable at any position of an epoch """
+    def __init__(self, indices, shuffle=True):
+        self.indices = indices
+        self.shuffle = shuffle
+        self.perm = None
+        self.start = 0
+        self.resume = False
+
+    def __iter__(self):
+        if self.resume:
+            self.resume = False
+        else:
+            n = len(self.indices)
+            self.perm = torch.randperm(n) if self.shuffle else torch.arange(n)
+            self.start = 0
+        for i in self.perm[self.start:].tolist():
+            yield self.indices[i]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def state_dict(self):
+        return {'perm': self.perm}
+
+    def load_state_dict(self, state_dict, start=0):
+        """ resume the next iteration from sample 'start' of the saved permutation """
+        self.perm = state_dict['perm']
+        self.start = start
+        self.resume = not self.perm is None
+
+
 class Cutout(object):
     def __init__(self, length):
         self.length = length
@@ -29,38 +63,48 @@ class Cutout(object):
         return img
 
 
-def get_torch_dataloader(config, metadata):
-    dataset, root, MEAN, STD, validation = metadata
+DATASETS = {
+    'cifar10': datasets.CIFAR10,
+    'cifar100': datasets.CIFAR100,
+    'mnist': datasets.MNIST,
+    'fashionmnist': datasets.FashionMNIST,
+    'imagenet': datasets.ImageFolder,
+    'image': datasets.ImageFolder,
+}
+
+def get_dataset_class(dataset):
+    if not dataset in DATASETS:
+        raise ValueError('not expected dataset = {}'.format(dataset))
+    return DATASETS[dataset]
+
 
+def get_transforms(config, dataset, MEAN, STD, validation, img_size=0):
+    """ return dataset class, per-image transforms and batch augmentation """
+    dset = get_dataset_class(dataset)
     if dataset == 'cifar10':
-        dset = datasets.CIFAR10
         trn_transf = [
             transforms.RandomCrop(32, padding=4),
             transforms.RandomHorizontalFlip()
         ]
         val_transf = []
     elif dataset == 'cifar100':
-        dset = datasets.CIFAR100
         trn_transf = [
             transforms.RandomCrop(32, padding=4),
             transforms.RandomHorizontalFlip()
         ]
         val_transf = []
     elif dataset == 'mnist':
-        dset = datasets.MNIST
         trn_transf = [
             transforms.RandomAffine(degrees=15, translate=(0.1, 0.1), scale=(0.9, 1.1), shear=0.1)
         ]
         val_transf = []
     elif dataset == 'fashionmnist':
-        dset = datasets.FashionMNIST
         trn_transf = [
             transforms.RandomAffine(degrees=15, translate=(0.1, 0.1), scale=(0.9, 1.1), shear=0.1),
             transforms.RandomVerticalFlip()
         ]
         val_transf = []
     elif dataset == 'imagenet':
-        dset = datasets.ImageFolder
         trn_transf = [
             transforms.RandomResizedCrop(224),
             transforms.RandomHorizontalFlip(),
@@ -70,7 +114,6 @@ def get_torch_dataloader(config, metadata):
             transforms.CenterCrop(224),
         ]
     elif dataset == 'image':
-        dset = datasets.ImageFolder
         trn_transf = [
             transforms.RandomResizedCrop(224),
             transforms.RandomHorizontalFlip(),
@@ -82,55 +125,131 @@ def get_torch_dataloader(config, metadata):
     else:
         raise ValueError('not expected dataset = {}'.format(dataset))
 
+    if img_size and dset == datasets.ImageFolder:
+        # images pre-resized to img_size
+        trn_transf = [
+            transforms.RandomCrop(img_size, padding=img_size//8),
+            transforms.RandomHorizontalFlip(),
+        ]
+        val_transf = []
+
     if config.jitter:
         trn_transf.append(transforms.ColorJitter(brightness=0.4, contrast=0.4, saturation=0.4, hue=0.1))
     
-    normalize = [transforms.ToTensor(), transforms.Normalize(MEAN, STD)]
-    trn_transf.extend(normalize)
-    val_transf.extend(normalize)
+    img_transf = val_transf if validation else trn_transf
+    batch_aug = None
+    if config.batch_aug:
+        from .batch_augment import BatchAugment, split_transforms
+        img_transf, batch_transf = split_transforms(img_transf)
+        batch_aug = BatchAugment(batch_transf, MEAN, STD, 0 if validation else config.cutout)
+        img_transf.append(transforms.PILToTensor())
+    else:
+        img_transf.extend([transforms.ToTensor(), transforms.Normalize(MEAN, STD)])
+        if config.cutout > 0 and not validation:
+            img_transf.append(Cutout(config.cutout))
+    return dset, img_transf, batch_aug
 
-    if config.cutout > 0:
-        trn_transf.append(Cutout(config.cutout))
-    
+
+def get_cache_dir(config, root):
+    return config.cache_dir or os.path.realpath(root) + '_cache'
+
+
+def build_dataset(config, dset, root, validation, transform):
+    if dset == datasets.ImageFolder and config.folder_index:
+        from .folder_index import IndexedImageFolder
+        root_key = hashlib.sha1(os.path.realpath(root).encode()).hexdigest()[:16]
+        index_path = os.path.join(get_cache_dir(config, root), 'folder_index-{}.npz'.format(root_key))
+        return IndexedImageFolder(root, index_path, transform=transform)
     if dset == datasets.ImageFolder:
-        if validation:
-            data = dset(root, transform=transforms.Compose(val_transf))
-        else:
-            data = dset(root, transform=transforms.Compose(trn_transf))
-    elif validation:
-        data = dset(root, train = False, 
-                transform=transforms.Compose(val_transf), download = True)
-    else:
-        data = dset(root, train = True,
-                transform=transforms.Compose(trn_transf), download = True)
-    
-    if config.split_ratio > 0:
-        n_data = len(data)
-        split = int(n_data * config.split_ratio)
-        logging.info('data_provider: split data: {}/{}'.format(split, n_data-split))
-        indices = list(range(n_data))
-        trn_sampler = SubsetRandomSampler(indices[:split])
-        val_sampler = SubsetRandomSampler(indices[split:])
-        trn_loader = DataLoader(data,
-                        batch_size=config.trn_batch_size,
-                        sampler=trn_sampler,
-                        num_workers=config.workers,
-                        pin_memory=True)
+        return dset(root, transform=transform)
+    return dset(root, train=not validation, transform=transform, download=True)
+
+
+def build_loaders(config, data, validation, batch_aug, workers, trn_indices=None, val_indices=None):
+    """ return train and valid loaders over split indices, or a single loader """
+    persistent = workers > 0 and config.persistent_workers
+    # cached uint8 datasets serve whole batches through the batch of sampler indices
+    collate_fn = None
+    if getattr(data, 'batched', False):
+        from .dataset_cache import collate_batch
+        collate_fn = collate_batch
+    if not trn_indices is None:
         val_loader = DataLoader(data,
                         batch_size=config.val_batch_size,
-                        sampler=val_sampler,
-                        num_workers=config.workers,
-                        pin_memory=True)
+                        sampler=ResumableSampler(val_indices),
+                        num_workers=workers,
+                        pin_memory=config.pin_memory,
+                        persistent_workers=persistent,
+                        collate_fn=collate_fn)
+        if config.paired:
+            # one worker pool for bilevel steps, sharing the valid sampler state
+            from .paired_loader import PairedLoader
+            trn_loader = PairedLoader(data, ResumableSampler(trn_indices), val_loader.sampler,
+                                      config.trn_batch_size, config.val_batch_size, workers, config.pin_memory, persistent,
+                                      collate_fn)
+        else:
+            trn_loader = DataLoader(data,
+                            batch_size=config.trn_batch_size,
+                            sampler=ResumableSampler(trn_indices),
+                            num_workers=workers,
+                            pin_memory=config.pin_memory,
+                            persistent_workers=persistent,
+                            collate_fn=collate_fn)
+        trn_loader.batch_aug = val_loader.batch_aug = batch_aug
         return trn_loader, val_loader
     elif validation:
         val_loader = DataLoader(data,
             batch_size=config.val_batch_size,
-            num_workers=config.workers,
-            shuffle=False, pin_memory=True, drop_last=False)
+            num_workers=workers,
+            shuffle=False, pin_memory=config.pin_memory, drop_last=False,
+            persistent_workers=persistent, collate_fn=collate_fn)
+        val_loader.batch_aug = batch_aug
         return val_loader
     else:
         trn_loader = DataLoader(data,
             batch_size=config.trn_batch_size,
-            num_workers=config.workers,
-            shuffle=True, pin_memory=True, drop_last=True)
-        return trn_loader
\ No newline at end of file
+            sampler=ResumableSampler(list(range(len(data)))),
+            num_workers=workers,
+            pin_memory=config.pin_memory, drop_last=True,
+            persistent_workers=persistent, collate_fn=collate_fn)
+        trn_loader.batch_aug = batch_aug
+        return trn_loader
+
+
+def get_torch_dataloader(config, metadata):
+    dataset, root, MEAN, STD, validation = metadata
+
+    dset, img_transf, batch_aug = get_transforms(config, dataset, MEAN, STD, validation)
+    build_dset = partial(build_dataset, config, dset, root, validation)
+
+    transform = transforms.Compose(img_transf)
+    workers = config.workers
+    if config.cache:
+        if config.cache not in ['memmap', 'memory']:
+            raise ValueError('unsupported dataset cache: {}'.format(config.cache))
+        if dset == datasets.ImageFolder and not config.cache_size:
+            raise ValueError('dataset_cache: cache_size required for {}'.format(dataset))
+        from .dataset_cache import get_cached_dataset
+        params = {
+            'dataset': dataset,
+            'root': os.path.realpath(root),
+            'validation': validation,
+            'size': config.cache_size,
+        }
+        in_memory = config.cache == 'memory'
+        # cached images are served as uint8 tensors without PIL when nothing is left per image
+        if config.batch_aug and len(img_transf) == 1: transform = None
+        data = get_cached_dataset(build_dset, get_cache_dir(config, root), params, transform,
+                                  config.cache_size, in_memory, workers)
+        # decoded images are served from RAM in the main process unless transforms run per image
+        if in_memory and transform is None: workers = 0
+    else:
+        data = build_dset(transform)
+    
+    if config.split_ratio > 0:
+        n_data = len(data)
+        split = int(n_data * config.split_ratio)
+        logging.info('data_provider: split data: {}/{}'.format(split, n_data-split))
+        indices = list(range(n_data))
+        return build_loaders(config, data, validation, batch_aug, workers, indices[:split], indices[split:])
+    return build_loaders(config, data, validation, batch_aug, workers)
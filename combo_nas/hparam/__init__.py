@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 from .gridsearch_tuner import GridSearchTuner, RandomTuner
 from .xgb_tuner import XGBoostTuner
+from .tpe_tuner import TPETuner
 from .space import build_hparam_space
+from .scheduler import SuccessiveHalving, Hyperband, PBT
 from ..utils.registration import Registry, build, get_builder, register, register_wrapper
 from functools import partial
 
@@ -9,8 +11,18 @@ hparam_tuner_registry = Registry('hparam_tuner')
 register_hparam_tuner = partial(register, hparam_tuner_registry)
 get_hparam_tuner_builder = partial(get_builder, hparam_tuner_registry)
 build_hparam_tuner = partial(build, hparam_tuner_registry)
+
+hparam_scheduler_registry = Registry('hparam_scheduler')
+register_hparam_scheduler = partial(register, hparam_scheduler_registry)
+build_hparam_scheduler = partial(build, hparam_scheduler_registry)
+
 register = partial(register_wrapper, hparam_tuner_registry)
 
 register_hparam_tuner(GridSearchTuner, 'GridSearch')
 register_hparam_tuner(RandomTuner, 'Random')
-register_hparam_tuner(XGBoostTuner, 'XGBoost')
\ No newline at end of file
+register_hparam_tuner(XGBoostTuner, 'XGBoost')
+register_hparam_tuner(TPETuner, 'TPE')
+
+register_hparam_scheduler(SuccessiveHalving, 'SuccessiveHalving')
+register_hparam_scheduler(Hyperband, 'Hyperband')
+register_hparam_scheduler(PBT, 'PBT')
@@ -1,6 +1,6 @@
 import time
-import numpy as np
 from .tuner import Tuner
+from .permutation import FeistelPermutation
 
 class GridSearchTuner(Tuner):
     """Enumerate the search space in a grid search order"""
@@ -20,9 +20,6 @@ class GridSearchTuner(Tuner):
     def update(self, inputs, result):
         pass
 
-    def load_history(self, data_set):
-        pass
-
     def __getstate__(self):
         return {"counter": self.counter}
 
@@ -34,34 +31,24 @@ class RandomTuner(Tuner):
     """Enumerate the search space in a random order"""
     def __init__(self, space, seed=None):
         super(RandomTuner, self).__init__(space)
-        self.visited = set()
         seed = int(time.time()) if seed is None else seed
-        rng = np.random.RandomState()
-        rng.seed(seed)
-        self.np_random = rng
+        # visits every index once without tracking visited indices
+        self.perm = FeistelPermutation(len(self.space), seed)
 
     def next(self):
-        ret = []
-        counter = 0
-        if len(self.visited) >= len(self.space): return None
-        index = self.np_random.randint(len(self.space))
-        while index in self.visited:
-            index = self.np_random.randint(len(self.space))
-        self.visited.add(index)
-        counter += 1
+        index = self.perm.next()
+        if index is None: return None
         return self.space.get(index)
     
     def update(self, inputs, result):
         pass
 
     def has_next(self):
-        return len(self.visited) < len(self.space)
-
-    def load_history(self, data_set):
-        pass
+        return self.perm.has_next()
 
     def __getstate__(self):
-        return {"visited": self.counter}
+        return {"perm": self.perm.state_dict()}
 
     def __setstate__(self, state):
-        self.counter = state['visited']
+        self.perm = FeistelPermutation(1)
+        self.perm.load_state_dict(state['perm'])
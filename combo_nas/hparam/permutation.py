@@ -0,0 +1,59 @@
+import random
+
+MASK64 = (1 << 64) - 1
+
+def mix(x, key):
+    """ 64-bit integer hash of x under key """
+    x = ((x ^ key) * 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 29)) * 0xBF58476D1CE4E5B9) & MASK64
+    return x ^ (x >> 32)
+
+
+class FeistelPermutation():
+    """Seeded pseudo-random permutation of range(n) in O(1) memory
+
+    A balanced Feistel network permutes the smallest even-bit domain
+    containing n, indices outside range(n) are cycle-walked back into it.
+    The permutation is resumable from its position.
+    """
+    def __init__(self, n, seed=0, rounds=4):
+        self.n = n
+        self.seed = seed
+        bits = max(2, (n - 1).bit_length())
+        bits += bits % 2
+        self.half = bits // 2
+        self.mask = (1 << self.half) - 1
+        rng = random.Random(seed)
+        self.keys = [rng.getrandbits(64) for _ in range(rounds)]
+        self.pos = 0
+
+    def encrypt(self, x):
+        left, right = x >> self.half, x & self.mask
+        for key in self.keys:
+            left, right = right, left ^ (mix(right, key) & self.mask)
+        return (left << self.half) | right
+
+    def get(self, index):
+        """ element at position index of the permutation """
+        if not 0 <= index < self.n:
+            raise IndexError('permutation index out of range: {}'.format(index))
+        x = self.encrypt(index)
+        while x >= self.n:
+            x = self.encrypt(x)
+        return x
+
+    def has_next(self):
+        return self.pos < self.n
+
+    def next(self):
+        if not self.has_next(): return None
+        x = self.get(self.pos)
+        self.pos += 1
+        return x
+
+    def state_dict(self):
+        return {'n': self.n, 'seed': self.seed, 'rounds': len(self.keys), 'pos': self.pos}
+
+    def load_state_dict(self, state_dict):
+        self.__init__(state_dict['n'], state_dict['seed'], state_dict['rounds'])
+        self.pos = state_dict['pos']
@@ -0,0 +1,137 @@
+import math
+import random
+import logging
+import numpy as np
+
+def extrapolate_curve(scores, n_epochs):
+    """ predict the score after n_epochs from a log-linear fit of the learning curve """
+    if len(scores) < 3: return scores[-1]
+    x = np.log(np.arange(1, len(scores)+1))
+    a, b = np.polyfit(x, np.asarray(scores, dtype=np.float64), 1)
+    return float(a * math.log(n_epochs) + b)
+
+
+class TrialScheduler(object):
+    """Base class for multi-fidelity trial schedulers
+    """
+    def on_start(self, trial, inputs):
+        pass
+
+    def report(self, trial, epoch, score):
+        """ record score of trial after epoch, return True if the trial should stop """
+        return False
+
+    def on_result(self, trial, result):
+        pass
+
+
+class SuccessiveHalving(TrialScheduler):
+    """Asynchronous successive halving
+
+    Rungs are at min_epochs * eta^k epochs. A trial reaching a rung continues
+    only if its score is in the top 1/eta of the scores recorded at the rung.
+    """
+    def __init__(self, max_epochs, min_epochs=1, eta=3, extrapolate=False):
+        self.max_epochs = max_epochs
+        self.eta = eta
+        self.extrapolate = extrapolate
+        self.rungs = []
+        r = min_epochs
+        while r < max_epochs:
+            self.rungs.append(r)
+            r *= eta
+        self.rung_scores = [[] for _ in self.rungs]
+        self.curves = {}
+
+    def report(self, trial, epoch, score):
+        curve = self.curves.setdefault(trial, [])
+        curve.append(score)
+        if not epoch+1 in self.rungs: return False
+        k = self.rungs.index(epoch+1)
+        value = extrapolate_curve(curve, self.max_epochs) if self.extrapolate else score
+        scores = self.rung_scores[k]
+        scores.append(value)
+        if len(scores) < self.eta: return False
+        cutoff = np.quantile(scores, 1. - 1. / self.eta)
+        stop = bool(value < cutoff)
+        logging.info('scheduler: trial {} rung {} epoch {} score: {:.4f} cutoff: {:.4f} {}'.format(
+            trial, k, epoch+1, value, cutoff, 'stop' if stop else 'promote'))
+        return stop
+
+    def on_result(self, trial, result):
+        self.curves.pop(trial, None)
+
+
+class Hyperband(TrialScheduler):
+    """Hyperband: successive halving brackets with decreasing early-stopping rate
+
+    Trials are assigned to brackets in round robin order.
+    """
+    def __init__(self, max_epochs, min_epochs=1, eta=3, extrapolate=False):
+        s_max = int(math.log(max_epochs / min_epochs) / math.log(eta) + 1e-9)
+        self.brackets = [SuccessiveHalving(max_epochs, min_epochs * eta ** s, eta, extrapolate)
+                         for s in range(s_max+1)]
+
+    def report(self, trial, epoch, score):
+        return self.brackets[trial % len(self.brackets)].report(trial, epoch, score)
+
+    def on_result(self, trial, result):
+        self.brackets[trial % len(self.brackets)].on_result(trial, result)
+
+
+class PBT(TrialScheduler):
+    """Population based training of concurrent trials
+
+    Every interval epochs a trial in the bottom quantile of the scores
+    reported at that epoch exploits a trial of the top quantile: it is
+    answered with {'exploit': donor, 'epoch': epoch, 'hparams': hparams},
+    continues from the checkpoint of the donor at that epoch and explores
+    the donor hparams with the perturb keys scaled by a random factor.
+    Perturb keys missing from the hparams are taken from base.
+    """
+    def __init__(self, population=8, interval=4, quantile=0.25, max_epochs=None,
+                 perturb=('search.w_optim.lr', 'search.a_optim.lr', 'search.aux_weight'),
+                 factors=(0.8, 1.2), seed=None):
+        self.population = population
+        self.interval = interval
+        self.quantile = quantile
+        self.max_epochs = max_epochs
+        self.perturb = perturb
+        self.factors = factors
+        self.random = random.Random(seed)
+        self.base = {}
+        self.scores = {}
+        self.hparams = {}
+        self.schedules = {}
+
+    def on_start(self, trial, inputs):
+        self.hparams[trial] = dict(inputs)
+        self.schedules[trial] = [(0, dict(inputs))]
+
+    def explore(self, hparams):
+        hparams = dict(hparams)
+        for k in self.perturb:
+            value = hparams.get(k, self.base.get(k, None))
+            if not value is None:
+                hparams[k] = value * self.random.choice(self.factors)
+        return hparams
+
+    def report(self, trial, epoch, score):
+        if epoch == 0 or epoch % self.interval != 0: return False
+        if not self.max_epochs is None and epoch+1 >= self.max_epochs: return False
+        scores = self.scores.setdefault(epoch, {})
+        scores[trial] = score
+        ranked = sorted(scores, key=scores.get)
+        n = int(len(ranked) * self.quantile)
+        if n == 0 or not trial in ranked[:n]: return False
+        donor = self.random.choice(ranked[-n:])
+        hparams = self.explore(self.hparams[donor])
+        self.hparams[trial] = hparams
+        self.schedules[trial] = self.schedules[donor] + [(epoch+1, hparams)]
+        logging.info('scheduler: trial {} epoch {} score: {:.4f} exploits trial {} score: {:.4f} hparams: {}'.format(
+            trial, epoch+1, score, donor, scores[donor], hparams))
+        return {'exploit': donor, 'epoch': epoch, 'hparams': hparams}
+
+    def on_result(self, trial, result):
+        logging.info('scheduler: trial {} score: {} schedule: {}'.format(
+            trial, result['score'], self.schedules.get(trial, None)))
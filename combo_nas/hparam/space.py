@@ -24,7 +24,10 @@ class HParamSpace():
 
     def __len__(self):
         if self._length is None:
-            self._length = int(np.prod([len(x) for x in self.hp_map.values()]))
+            # python ints, the size may exceed int64
+            self._length = 1
+            for hp in self.hp_map.values():
+                self._length *= len(hp)
         return self._length
 
     def get(self, index):
@@ -36,7 +39,7 @@ class HParamSpace():
         return hparams
 
     def sample(self):
-        return self.get(np.random.randint(len(self.space)))
+        return {name: hp.sample() for name, hp in self.hp_map.items()}
     
     @staticmethod
     def build_from_config(config):
@@ -0,0 +1,149 @@
+import time
+import json
+import math
+import logging
+import numpy as np
+from .tuner import Tuner
+
+class TPETuner(Tuner):
+    """Tree-structured Parzen Estimator tuner
+
+    Splits measured trials into the top gamma fraction and the rest, fits
+    per-hparam Parzen estimators l(x) and g(x) over value indices and
+    proposes the sampled candidate maximizing l(x)/g(x). Numeric hparams
+    are smoothed over neighbouring values. Trials in flight count with
+    a constant liar score so parallel proposals spread out. Trials stopped
+    early by a scheduler only count in g(x), their scores are truncated.
+    """
+    def __init__(self, space, n_startup=10, gamma=0.25, n_candidates=24, prior_weight=1.,
+                 liar='min', history=None, seed=None):
+        super(TPETuner, self).__init__(space)
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+        self.prior_weight = prior_weight
+        self.liar = liar
+        seed = int(time.time()) if seed is None else seed
+        self.np_random = np.random.RandomState(seed)
+        self.hps = list(space.hp_map.items())
+        self.dims = [len(hp) for _, hp in self.hps]
+        self.kernels = [self.get_kernel(hp) for _, hp in self.hps]
+        self.xs = []
+        self.ys = []
+        self.stopped = []
+        self.pending = {}
+        self.visited = set()
+        if not history is None:
+            self.load_history(self.read_history(history))
+
+    def get_kernel(self, hp):
+        """ smoothing matrix over value indices, identity for categorical hparams """
+        n = len(hp)
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in hp.val_range):
+            return np.eye(n)
+        idx = np.arange(n)
+        k = np.exp(-0.5 * (idx[:, None] - idx[None, :]) ** 2)
+        return k / k.sum(axis=1, keepdims=True)
+
+    @staticmethod
+    def read_history(path):
+        """ (hparams, result) pairs from a trial store database or a json file """
+        if path.endswith('.db'):
+            from .trial_store import read_history
+            return read_history(path)
+        with open(path, 'r') as f:
+            return [(h, r) for h, r in json.load(f)]
+
+    def get_point(self, hparams):
+        return tuple(hp.get_index(hparams[name]) for name, hp in self.hps)
+
+    def get_hparams(self, point):
+        return {name: hp.get(int(i)) for (name, hp), i in zip(self.hps, point)}
+
+    def estimators(self, points, weights=None):
+        """ per-hparam probabilities of value indices under the Parzen estimator of points """
+        probs = []
+        for d, (n, kernel) in enumerate(zip(self.dims, self.kernels)):
+            counts = np.bincount([p[d] for p in points], minlength=n).astype(np.float64)
+            dens = counts @ kernel + self.prior_weight / n
+            probs.append(dens / dens.sum())
+        return probs
+
+    def propose(self):
+        """ next unvisited point from random startup or the TPE criterion """
+        xs = self.xs + list(self.pending.keys())
+        n_obs = len(self.xs) + len(self.stopped)
+        if n_obs < self.n_startup:
+            return self.random_point()
+        ys = self.ys + [self.lie()] * len(self.pending)
+        order = np.argsort(ys)[::-1]
+        n_good = max(1, int(math.ceil(self.gamma * len(xs))))
+        good = [xs[i] for i in order[:n_good]]
+        bad = [xs[i] for i in order[n_good:]] + self.stopped
+        l_probs = self.estimators(good)
+        g_probs = self.estimators(bad)
+        cands = np.stack([self.np_random.choice(n, size=self.n_candidates, p=p)
+                          for n, p in zip(self.dims, l_probs)], axis=1)
+        score = np.zeros(len(cands))
+        for d in range(len(self.dims)):
+            score += np.log(l_probs[d][cands[:, d]]) - np.log(g_probs[d][cands[:, d]])
+        for i in np.argsort(-score):
+            point = tuple(int(v) for v in cands[i])
+            if not point in self.visited:
+                return point
+        return self.random_point()
+
+    def lie(self):
+        if len(self.ys) == 0: return 0.
+        if self.liar == 'max': return max(self.ys)
+        if self.liar == 'mean': return float(np.mean(self.ys))
+        return min(self.ys)
+
+    def random_point(self):
+        for _ in range(1000):
+            point = tuple(int(self.np_random.randint(n)) for n in self.dims)
+            if not point in self.visited:
+                return point
+        # nearly exhausted, enumerate
+        for index in range(len(self.space)):
+            point = self.get_point(self.space.get(index))
+            if not point in self.visited:
+                return point
+        return None
+
+    def next(self):
+        if not self.has_next(): return None
+        point = self.propose()
+        if point is None: return None
+        self.visited.add(point)
+        # constant liar until the result arrives
+        self.pending[point] = None
+        return self.get_hparams(point)
+
+    def has_next(self):
+        return len(self.visited) < len(self.space)
+
+    def update(self, inputs, result):
+        point = self.get_point(inputs)
+        self.pending.pop(point, None)
+        self.visited.add(point)
+        if result.get('stopped', False):
+            self.stopped.append(point)
+            return
+        self.xs.append(point)
+        self.ys.append(result['score'] if result['error_no'] == 0 else 0.)
+        logging.debug('tpe_tuner: {} observations'.format(len(self.ys)))
+
+    def __getstate__(self):
+        return {
+            'xs': self.xs,
+            'ys': self.ys,
+            'stopped': self.stopped,
+            'visited': self.visited,
+        }
+
+    def __setstate__(self, state):
+        self.xs = state['xs']
+        self.ys = state['ys']
+        self.stopped = state.get('stopped', [])
+        self.visited = state['visited']
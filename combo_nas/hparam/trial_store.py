@@ -0,0 +1,159 @@
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from ..utils.config import Config
+from ..utils.feasibility import INFEASIBLE
+
+# error_no of stored results that are not retried: success and configs over the budgets
+FINAL_ERRORS = (0, INFEASIBLE)
+
+# config subtrees that determine the result of a trial
+RESULT_KEYS = [
+    'search',
+    'model',
+    'ops',
+    'mixed_op',
+    'primitives',
+    'arch_optim',
+    'criterion',
+]
+
+# keys within RESULT_KEYS that do not change the result
+IGNORED_KEYS = [
+    'search.path',
+    'search.plot_path',
+    'search.plot',
+    'search.print_freq',
+    'search.save_freq',
+    'search.chkpt_steps',
+    'search.data.shared',
+    'search.data.shared_size',
+    'search.data.dloader.cache_dir',
+    'search.data.dloader.pin_memory',
+    'search.data.dloader.persistent_workers',
+]
+
+def result_config(config):
+    """ the subtrees of config that determine the result of a trial """
+    sub = {}
+    for k in RESULT_KEYS:
+        sub[k] = copy.deepcopy(config.get(k, None))
+    for k in IGNORED_KEYS:
+        keywords = k.split('.')
+        dct = sub
+        for kw in keywords[:-1]:
+            dct = dct.get(kw, None) if isinstance(dct, dict) else None
+        if isinstance(dct, dict):
+            dct.pop(keywords[-1], None)
+    return sub
+
+
+def config_hash(config):
+    """ hash of the canonical json form of the result subtrees of config """
+    conf = json.dumps(result_config(config), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(conf.encode()).hexdigest()
+
+
+def get_result(row):
+    """ result dict of a (score, error_no, wall_time, peak_mem, genotype, overrides, stopped) row """
+    keys = ['score', 'error_no', 'wall_time', 'peak_mem', 'genotype']
+    result = dict(zip(keys, row))
+    result['overrides'] = json.loads(row[5]) if row[5] else {}
+    result['stopped'] = bool(row[6])
+    return result
+
+
+def get_history(conn):
+    """ list of (hparams, result) of all trials in the database of conn """
+    rows = conn.execute('SELECT hparams, score, error_no, wall_time, peak_mem, genotype, overrides, stopped '
+                        'FROM trials ORDER BY id').fetchall()
+    return [(json.loads(r[0]), get_result(r[1:])) for r in rows]
+
+
+def read_history(path):
+    """ list of (hparams, result) of all trials in the database at path, opened read-only """
+    conn = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True, timeout=60)
+    try:
+        return get_history(conn)
+    finally:
+        conn.close()
+
+
+class TrialStore():
+    """SQLite database of tuning trials, keyed by the hash of the trial config"""
+    def __init__(self, path, config):
+        self.path = path
+        self.config = copy.deepcopy(config)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS trials (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trial_index INTEGER,
+            config_hash TEXT,
+            hparams TEXT,
+            score REAL,
+            error_no INTEGER,
+            wall_time REAL,
+            peak_mem REAL,
+            genotype TEXT,
+            created REAL,
+            overrides TEXT,
+            stopped INTEGER)''')
+        columns = [r[1] for r in self.conn.execute('PRAGMA table_info(trials)')]
+        if not 'overrides' in columns:
+            self.conn.execute('ALTER TABLE trials ADD COLUMN overrides TEXT')
+        if not 'stopped' in columns:
+            self.conn.execute('ALTER TABLE trials ADD COLUMN stopped INTEGER')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS trials_hash ON trials (config_hash)')
+        self.conn.commit()
+
+    def config_hash(self, hparams):
+        """ hash of the base config with hparams applied """
+        config = copy.deepcopy(self.config)
+        Config.apply(config, hparams)
+        return config_hash(config)
+
+    def get(self, hparams, error_nos=FINAL_ERRORS):
+        """ latest stored result of the trial config with error_no in error_nos, None if there is none """
+        row = self.conn.execute('SELECT score, error_no, wall_time, peak_mem, genotype, overrides, stopped FROM trials '
+                                'WHERE config_hash = ? AND error_no IN ({}) ORDER BY id DESC LIMIT 1'.format(
+                                    ', '.join('?' * len(error_nos))),
+                                (self.config_hash(hparams), ) + tuple(error_nos)).fetchone()
+        if row is None: return None
+        return get_result(row)
+
+    def add(self, trial_index, hparams, result):
+        """ record the result of a trial, 'overrides' are config values changed by the trial itself,
+            'stopped' is set for trials stopped early by a scheduler """
+        genotype = result.get('genotype', None)
+        overrides = result.get('overrides', None)
+        self.conn.execute('INSERT INTO trials (trial_index, config_hash, hparams, score, error_no, wall_time, '
+                          'peak_mem, genotype, created, overrides, stopped) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                              trial_index, self.config_hash(hparams), json.dumps(hparams, sort_keys=True),
+                              result['score'], result['error_no'], result.get('wall_time', None),
+                              result.get('peak_mem', None), None if genotype is None else str(genotype),
+                              time.time(), json.dumps(overrides, sort_keys=True) if overrides else None,
+                              int(result.get('stopped', False))))
+        self.conn.commit()
+
+    def best(self):
+        """ (trial index, hparams, score) of the best successful trial, None if there is none """
+        row = self.conn.execute('SELECT trial_index, hparams, score FROM trials WHERE error_no = 0 '
+                                'ORDER BY score DESC, id LIMIT 1').fetchone()
+        if row is None: return None
+        return row[0], json.loads(row[1]), row[2]
+
+    def next_trial_index(self):
+        row = self.conn.execute('SELECT MAX(trial_index) FROM trials').fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def history(self):
+        """ list of (hparams, result) of all stored trials """
+        history = get_history(self.conn)
+        logging.info('trial_store: {} trials in {}'.format(len(history), self.path))
+        return history
+
+    def close(self):
+        self.conn.close()
@@ -1,4 +1,77 @@
+import os
+import time
 import logging
+import resource
+import traceback
+import torch
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from .work_queue import worker_name
+
+def get_trial_slots(n_parallel, devices=None):
+    """ devices and cpu core set of each parallel trial slot """
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+    slots = []
+    for i in range(n_parallel):
+        slots.append({
+            'device': None if not devices else str(devices[i % len(devices)]),
+            'cpus': cores[i * len(cores) // n_parallel: (i+1) * len(cores) // n_parallel],
+        })
+    return slots
+
+
+def peak_memory():
+    """ peak memory (MB) of the process, or of the cuda device if used """
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        return torch.cuda.max_memory_allocated() / 1024. / 1024.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def measure_trial(measure, inputs):
+    """ return result of measure with wall time and peak memory """
+    if torch.cuda.is_available() and torch.cuda.is_initialized():
+        torch.cuda.reset_peak_memory_stats()
+    t0 = time.time()
+    try:
+        result = measure(inputs)
+    except Exception:
+        traceback.print_exc()
+        result = {'score': 0, 'error_no': 1}
+    result.setdefault('wall_time', time.time() - t0)
+    result.setdefault('peak_mem', peak_memory())
+    return result
+
+
+def run_trial(tuner, measure, inputs, slot, conn):
+    """ run measure in a trial process pinned to the slot resources, send result to conn """
+    # intermediate reports of the trial go through conn
+    tuner.trial_conn = conn
+    if len(slot['cpus']) > 0:
+        os.sched_setaffinity(0, slot['cpus'])
+        torch.set_num_threads(len(slot['cpus']))
+    conn.send(('result', measure_trial(measure, inputs)))
+    conn.close()
+
+
+def recv_message(conn):
+    try:
+        return conn.recv()
+    except EOFError:
+        return ('result', {'score': 0, 'error_no': 1})
+
+
+def finish_trial(conn, proc, idx):
+    conn.close()
+    proc.join()
+    if proc.exitcode != 0:
+        logging.warning('tuner: trial {} exited with code: {}'.format(idx, proc.exitcode))
+
+
+def kill_trial(proc):
+    """ stop a trial process at once, SIGTERM would wait for the preempt checkpoint of the trial """
+    proc.kill()
+    proc.join()
+
 
 class Tuner(object):
     """Base class for tuners
@@ -25,28 +98,238 @@ class Tuner(object):
         pass
     
     def reset(self):
+        self.trial_index = 0
+        self.trial_device = None
+        self.trial_conn = None
+        self.scheduler = None
+        self.store = None
         self.best_inputs = None
         self.best_score = 0
         self.best_iter = 0
 
     def load_history(self, data_set):
-        raise NotImplementedError()
+        """ learn from (inputs, result) pairs of previous trials """
+        for inputs, result in data_set:
+            try:
+                self.update(inputs, result)
+            except (KeyError, ValueError):
+                logging.debug('tuner: history config not in space: {}'.format(inputs))
+
+    def next_trial(self):
+        """ next inputs without a stored final result, failed trials are retried, None if exhausted """
+        while self.has_next():
+            inputs = self.next()
+            if inputs is None: return None
+            if self.store is None or self.store.get(inputs) is None:
+                return inputs
+            logging.info('tuner: skip measured config: {}'.format(inputs))
+        return None
 
-    def tune(self, measure, n_trial, early_stopping=None, callbacks=()):
+    def begin_trial(self, trial, inputs):
+        if not self.scheduler is None:
+            self.scheduler.on_start(trial, inputs)
+
+    def schedule(self, trial, epoch, score):
+        if self.scheduler is None: return False
+        return self.scheduler.report(trial, epoch, score)
+
+    def report(self, epoch, score):
+        """ report intermediate score of the current trial, return the decision of the scheduler """
+        if not self.trial_conn is None:
+            self.trial_conn.send(('report', epoch, score))
+            return self.trial_conn.recv()
+        return self.schedule(self.trial_index, epoch, score)
+
+    def run_serial(self, measure, n_trial, start=0):
+        """ yield (trial index, inputs, result) of trials run one after another """
+        for i in range(start, start + n_trial):
+            inputs = self.next_trial()
+            if inputs is None:
+                break
+            self.trial_index = i
+            self.trial_device = None
+            logging.info('tuner: trial {} config: {}'.format(i, inputs))
+            self.begin_trial(i, inputs)
+            yield i, inputs, measure_trial(measure, inputs)
+
+    def start_trial(self, ctx, measure, inputs, slot):
+        """ fork a trial process on slot, return its connection and process """
+        conn, child_conn = ctx.Pipe()
+        proc = ctx.Process(target=run_trial, args=(self, measure, inputs, slot, child_conn), daemon=True)
+        proc.start()
+        child_conn.close()
+        return conn, proc
+
+    def run_parallel(self, measure, n_trial, n_parallel, devices=None, start=0):
+        """ yield (trial index, inputs, result) of trials run asynchronously in isolated processes """
+        ctx = mp.get_context('fork')
+        free_slots = get_trial_slots(n_parallel, devices)
+        running = {}
+        i = start
+        try:
+            while True:
+                while len(free_slots) > 0 and i < start + n_trial:
+                    inputs = self.next_trial()
+                    if inputs is None: break
+                    slot = free_slots.pop(0)
+                    # read by measure in the forked trial process
+                    self.trial_index = i
+                    self.trial_device = slot['device']
+                    logging.info('tuner: trial {} config: {} device: {}'.format(i, inputs, slot['device']))
+                    self.begin_trial(i, inputs)
+                    conn, proc = self.start_trial(ctx, measure, inputs, slot)
+                    running[conn] = (proc, i, inputs, slot)
+                    i += 1
+                if len(running) == 0:
+                    break
+                for conn in wait(list(running.keys())):
+                    proc, idx, inputs, slot = running[conn]
+                    msg = recv_message(conn)
+                    if msg[0] == 'report':
+                        conn.send(self.schedule(idx, msg[1], msg[2]))
+                        continue
+                    del running[conn]
+                    finish_trial(conn, proc, idx)
+                    free_slots.append(slot)
+                    yield idx, inputs, msg[1]
+        finally:
+            for proc, _, _, _ in running.values():
+                kill_trial(proc)
+
+    def run_queue(self, queue, n_trial, n_pending, start=0, poll=5., idle_timeout=3600.):
+        """ yield (trial index, inputs, result) of trials run by workers of a WorkQueue
+
+        Expired leases are swept here as well, unfinished trials fail if no
+        worker was active for idle_timeout seconds.
+        """
+        queue.open()
+        outstanding = {}
+        i = start
+        try:
+            while True:
+                while len(outstanding) < n_pending and i < start + n_trial:
+                    inputs = self.next_trial()
+                    if inputs is None: break
+                    logging.info('tuner: queue trial {} config: {}'.format(i, inputs))
+                    self.begin_trial(i, inputs)
+                    queue.put(i, inputs)
+                    outstanding[i] = inputs
+                    i += 1
+                if len(outstanding) == 0:
+                    break
+                for idx, epoch, score in queue.pending_reports():
+                    queue.decide(idx, epoch, self.schedule(idx, epoch, score))
+                queue.sweep(idle_timeout)
+                results = queue.collect()
+                for idx, result in results:
+                    if idx in outstanding:
+                        yield idx, outstanding.pop(idx), result
+                if len(results) == 0:
+                    time.sleep(poll)
+        finally:
+            queue.close()
+
+    def work(self, queue, measure, n_parallel=1, devices=None, lease=300., poll=5., worker=None,
+             decision_timeout=60.):
+        """ run trials leased from a WorkQueue in forked processes until the queue is closed and drained """
+        worker = worker_name() if worker is None else worker
+        ctx = mp.get_context('fork')
+        free_slots = get_trial_slots(n_parallel, devices)
+        running = {}
+        # trials waiting for a decision on their report: conn -> (epoch, deadline)
+        waiting = {}
+        last_beat = time.time()
+        logging.info('tuner: worker {} started'.format(worker))
+        try:
+            while True:
+                while len(free_slots) > 0:
+                    item = queue.acquire(worker, lease)
+                    if item is None: break
+                    idx, inputs = item
+                    slot = free_slots.pop(0)
+                    self.trial_index = idx
+                    self.trial_device = slot['device']
+                    logging.info('tuner: worker trial {} config: {} device: {}'.format(idx, inputs, slot['device']))
+                    conn, proc = self.start_trial(ctx, measure, inputs, slot)
+                    running[conn] = (proc, idx, inputs, slot)
+                if len(running) == 0:
+                    if queue.closed(): break
+                    time.sleep(poll)
+                    continue
+                for conn, (epoch, deadline) in list(waiting.items()):
+                    idx = running[conn][1]
+                    decision = queue.decision(idx, epoch)
+                    if decision is None:
+                        if time.time() < deadline: continue
+                        logging.warning('tuner: no decision for trial {} epoch {}'.format(idx, epoch))
+                        decision = False
+                    conn.send(decision)
+                    del waiting[conn]
+                listening = [c for c in running if not c in waiting]
+                for conn in wait(listening, timeout=min(poll, 1.) if len(waiting) else poll):
+                    proc, idx, inputs, slot = running[conn]
+                    msg = recv_message(conn)
+                    if msg[0] == 'report':
+                        queue.post_report(idx, msg[1], msg[2])
+                        waiting[conn] = (msg[1], time.time() + decision_timeout)
+                        continue
+                    del running[conn]
+                    finish_trial(conn, proc, idx)
+                    queue.complete(idx, worker, msg[1])
+                    free_slots.append(slot)
+                if time.time() - last_beat > lease / 3:
+                    for conn, (proc, idx, _, slot) in list(running.items()):
+                        if queue.heartbeat(idx, worker, lease): continue
+                        logging.warning('tuner: worker lost the lease of trial {}'.format(idx))
+                        del running[conn]
+                        waiting.pop(conn, None)
+                        proc.kill()
+                        finish_trial(conn, proc, idx)
+                        free_slots.append(slot)
+                    last_beat = time.time()
+        finally:
+            for proc, _, _, _ in running.values():
+                kill_trial(proc)
+        logging.info('tuner: worker {} finished'.format(worker))
+
+    def tune(self, measure, n_trial, early_stopping=None, callbacks=(), n_parallel=1, devices=None,
+             scheduler=None, store=None, queue=None):
         """Begin tuning
+
+        With n_parallel > 1 trials run in forked processes, each pinned to
+        its own device and cpu core set, and results are handled as they arrive.
+        Trials report intermediate scores with report(), scheduler decides
+        whether to stop them early. With a TrialStore, previous trials are
+        loaded as history, measured configs are skipped and results are saved.
+        With a WorkQueue, up to n_parallel trials are handed to workers.
         """
         self.reset()
+        self.scheduler = scheduler
+        self.store = store
+        start = 0
+        if not store is None:
+            history = store.history()
+            self.load_history(history)
+            for inputs, result in history:
+                if result['error_no'] == 0 and result['score'] > self.best_score:
+                    self.best_score = result['score']
+                    self.best_inputs = inputs
+            start = store.next_trial_index()
         ttl = None
-        n_parallel = 1
         early_stopping = early_stopping or 1e9
-        i = error_ct = 0
-        logging.info('tuner: start: n_trial={} early_stopping={}'.format(n_trial, early_stopping))
-        for i in range(n_trial):
-            if not self.has_next():
-                break
-            inputs = self.next()
-            logging.info('tuner: trial {} config: {}'.format(i, inputs))
-            result = measure(inputs)
+        error_ct = 0
+        logging.info('tuner: start: n_trial={} early_stopping={} n_parallel={}'.format(
+            n_trial, early_stopping, n_parallel))
+        if not queue is None:
+            trials = self.run_queue(queue, n_trial, n_parallel, start)
+        elif n_parallel > 1:
+            trials = self.run_parallel(measure, n_trial, n_parallel, devices, start)
+        else:
+            trials = self.run_serial(measure, n_trial, start)
+        self.best_iter = start
+        for i, inputs, result in trials:
+            if not store is None:
+                store.add(i, inputs, result)
             # keep best config
             if result['error_no'] == 0:
                 score = result['score']
@@ -59,13 +342,16 @@ class Tuner(object):
                 self.best_inputs = inputs
                 self.best_iter = i
             logging.info('tuner: iter: {}\t score: {:.2f}/{:.2f}'.format(i+1, score, self.best_score))
-            ttl = min(early_stopping + self.best_iter, n_trial) - i
+            ttl = min(early_stopping + self.best_iter, start + n_trial) - i
+            if not scheduler is None:
+                scheduler.on_result(i, result)
             self.update(inputs, result)
             for callback in callbacks:
-                callback(tuner, inputs, result)
+                callback(self, inputs, result)
             if i >= self.best_iter + early_stopping:
                 logging.info('tuner: early stopped: best iter: {} score: {} config: {}'.format(self.best_iter, self.best_score, self.best_inputs))
                 break
             if error_ct > 150:
                 logging.warning('tuner: Too many errors in tuning: {}'.format(error_ct))
-        logging.info('tuner: finished: best iter: {} score: {} config: {}'.format(self.best_iter, self.best_score, self.best_inputs))
\ No newline at end of file
+        trials.close()
+        logging.info('tuner: finished: best iter: {} score: {} config: {}'.format(self.best_iter, self.best_score, self.best_inputs))
@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import logging
+
+class WorkQueue():
+    """SQLite lease table of trials shared by a tuner process and workers on several hosts
+
+    Workers acquire pending trials under a lease and renew it by heartbeat,
+    trials whose lease expired are handed out again up to max_attempts.
+    Intermediate scores are reported through the queue and answered by the
+    tuner process with a stop decision. The database must be on a
+    filesystem with working locks shared by all hosts.
+    """
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS queue (
+            trial_index INTEGER PRIMARY KEY,
+            hparams TEXT,
+            status TEXT,
+            worker TEXT,
+            lease_until REAL,
+            attempts INTEGER DEFAULT 0,
+            result TEXT)''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS reports (
+            trial_index INTEGER,
+            epoch INTEGER,
+            score REAL,
+            decision TEXT,
+            PRIMARY KEY (trial_index, epoch))''')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    def put(self, trial_index, hparams):
+        self.conn.execute('INSERT OR REPLACE INTO queue (trial_index, hparams, status, attempts) VALUES (?, ?, ?, 0)',
+                          (trial_index, json.dumps(hparams), 'pending'))
+
+    def open(self):
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('closed', '0')")
+        self.touch()
+
+    def close(self):
+        """ cancel pending trials, workers exit when drained """
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('closed', '1')")
+        self.conn.execute("UPDATE queue SET status = 'cancelled' WHERE status = 'pending'")
+
+    def closed(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'closed'").fetchone()
+        return not row is None and row[0] == '1'
+
+    def touch(self):
+        """ record worker activity """
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('active', ?)", (str(time.time()), ))
+
+    def fail(self, trial_index):
+        self.conn.execute("UPDATE queue SET status = 'done', result = ? WHERE trial_index = ?",
+                          (json.dumps({'score': 0, 'error_no': 1}), trial_index))
+
+    def expire(self, now):
+        """ requeue trials with expired leases, fail them after max_attempts """
+        expired = self.conn.execute("SELECT trial_index, attempts FROM queue WHERE status = 'running' "
+                                    "AND lease_until < ?", (now, )).fetchall()
+        for idx, attempts in expired:
+            if attempts >= self.max_attempts:
+                logging.warning('work_queue: trial {} failed after {} attempts'.format(idx, attempts))
+                self.fail(idx)
+            else:
+                logging.info('work_queue: requeue trial {} with expired lease'.format(idx))
+                self.conn.execute("UPDATE queue SET status = 'pending' WHERE trial_index = ?", (idx, ))
+
+    def sweep(self, idle_timeout=None):
+        """ expire leases, fail all unfinished trials if no worker was active for idle_timeout seconds """
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.expire(now)
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'active'").fetchone()
+            if not idle_timeout is None and not row is None and now - float(row[0]) > idle_timeout:
+                rows = self.conn.execute("SELECT trial_index FROM queue WHERE status IN ('pending', 'running')").fetchall()
+                for idx, in rows:
+                    logging.warning('work_queue: trial {} failed, no active workers'.format(idx))
+                    self.fail(idx)
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def acquire(self, worker, lease):
+        """ lease a pending or expired trial to worker, return (trial index, hparams) or None """
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            self.expire(now)
+            row = self.conn.execute("SELECT trial_index, hparams FROM queue WHERE status = 'pending' "
+                                    "ORDER BY trial_index LIMIT 1").fetchone()
+            if not row is None:
+                self.conn.execute("UPDATE queue SET status = 'running', worker = ?, lease_until = ?, "
+                                  "attempts = attempts + 1 WHERE trial_index = ?", (worker, now + lease, row[0]))
+            self.touch()
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return None if row is None else (row[0], json.loads(row[1]))
+
+    def heartbeat(self, trial_index, worker, lease):
+        """ renew the lease, return False if the trial is no longer leased to worker """
+        cur = self.conn.execute("UPDATE queue SET lease_until = ? WHERE trial_index = ? AND worker = ? "
+                                "AND status = 'running'", (time.time() + lease, trial_index, worker))
+        self.touch()
+        return cur.rowcount > 0
+
+    def complete(self, trial_index, worker, result):
+        self.conn.execute("UPDATE queue SET status = 'done', result = ? WHERE trial_index = ? AND worker = ? "
+                          "AND status = 'running'", (json.dumps(result, default=str), trial_index, worker))
+
+    def collect(self):
+        """ list of (trial index, result) of finished trials not collected yet """
+        self.conn.execute('BEGIN IMMEDIATE')
+        rows = self.conn.execute("SELECT trial_index, result FROM queue WHERE status = 'done'").fetchall()
+        self.conn.execute("UPDATE queue SET status = 'collected' WHERE status = 'done'")
+        self.conn.execute('COMMIT')
+        return [(idx, json.loads(res)) for idx, res in rows]
+
+    def post_report(self, trial_index, epoch, score):
+        """ report an intermediate score, the tuner process answers with a decision """
+        self.conn.execute('INSERT OR REPLACE INTO reports VALUES (?, ?, ?, NULL)', (trial_index, epoch, score))
+
+    def decision(self, trial_index, epoch):
+        """ scheduler decision of the report, None if not decided yet """
+        row = self.conn.execute('SELECT decision FROM reports WHERE trial_index = ? AND epoch = ?',
+                                (trial_index, epoch)).fetchone()
+        return None if row is None or row[0] is None else json.loads(row[0])
+
+    def pending_reports(self):
+        return self.conn.execute('SELECT trial_index, epoch, score FROM reports WHERE decision IS NULL').fetchall()
+
+    def decide(self, trial_index, epoch, decision):
+        self.conn.execute('UPDATE reports SET decision = ? WHERE trial_index = ? AND epoch = ?',
+                          (json.dumps(decision), trial_index, epoch))
+
+
+def worker_name():
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
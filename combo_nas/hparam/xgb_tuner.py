@@ -1,28 +1,231 @@
+import time
+import logging
+import numpy as np
 from .tuner import Tuner
+try:
+    import xgboost as xgb
+except ImportError:
+    xgb = None
+
+class NumpyGBM():
+    """Gradient boosted regression trees in numpy, fallback when xgboost is missing"""
+    def __init__(self, n_estimators=100, max_depth=3, learning_rate=0.1, min_samples=2):
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.learning_rate = learning_rate
+        self.min_samples = min_samples
+        self.trees = []
+        self.base = 0.
+
+    def best_split(self, X, r):
+        """ (feature, threshold, gain) of the split minimizing squared error of residuals r """
+        n = len(r)
+        best = (None, None, 0.)
+        tot = r.sum()
+        for f in range(X.shape[1]):
+            order = np.argsort(X[:, f], kind='stable')
+            xs, rs = X[order, f], r[order]
+            csum = np.cumsum(rs)[:-1]
+            nl = np.arange(1, n)
+            # gain of splitting between distinct values only
+            valid = (xs[1:] != xs[:-1]) & (nl >= self.min_samples) & (n - nl >= self.min_samples)
+            if not valid.any(): continue
+            gain = csum ** 2 / nl + (tot - csum) ** 2 / (n - nl) - tot ** 2 / n
+            gain[~valid] = -1.
+            i = int(np.argmax(gain))
+            if gain[i] > best[2]:
+                best = (f, (xs[i] + xs[i+1]) / 2., gain[i])
+        return best
+
+    def build_tree(self, X, r, depth):
+        f, thr, _ = (None, None, 0.) if depth == self.max_depth else self.best_split(X, r)
+        if f is None:
+            return float(r.mean())
+        mask = X[:, f] <= thr
+        return (f, thr, self.build_tree(X[mask], r[mask], depth+1), self.build_tree(X[~mask], r[~mask], depth+1))
+
+    def predict_tree(self, tree, X):
+        if not isinstance(tree, tuple):
+            return np.full(len(X), tree)
+        f, thr, left, right = tree
+        mask = X[:, f] <= thr
+        out = np.empty(len(X))
+        out[mask] = self.predict_tree(left, X[mask])
+        out[~mask] = self.predict_tree(right, X[~mask])
+        return out
+
+    def fit(self, X, y):
+        self.base = float(y.mean())
+        self.trees = []
+        pred = np.full(len(y), self.base)
+        for _ in range(self.n_estimators):
+            tree = self.build_tree(X, y - pred, 0)
+            self.trees.append(tree)
+            pred += self.learning_rate * self.predict_tree(tree, X)
+        return self
+
+    def predict(self, X):
+        pred = np.full(len(X), self.base)
+        for tree in self.trees:
+            pred += self.learning_rate * self.predict_tree(tree, X)
+        return pred
+
+
+class XGBCostModel():
+    """Gradient boosted cost model on xgboost, or NumpyGBM when xgboost is missing"""
+    def __init__(self, n_estimators=100, max_depth=3, learning_rate=0.1):
+        self.n_estimators = n_estimators
+        self.params = {
+            'max_depth': max_depth,
+            'eta': learning_rate,
+            'objective': 'reg:squarederror',
+            'verbosity': 0,
+        }
+        self.model = None
+
+    def fit(self, X, y):
+        if xgb is None:
+            self.model = NumpyGBM(self.n_estimators, self.params['max_depth'], self.params['eta']).fit(X, y)
+        else:
+            self.model = xgb.train(self.params, xgb.DMatrix(X, label=y), self.n_estimators)
+        return self
+
+    def predict(self, X):
+        if xgb is None:
+            return self.model.predict(X)
+        return self.model.predict(xgb.DMatrix(X))
+
 
 class XGBoostTuner(Tuner):
-    """XGBoost Tuner"""
-    def __init__(self, space):
+    """XGBoost Tuner
+
+    Fits a gradient boosted cost model on the measured trials and proposes
+    batches of plan_size candidates by simulated annealing over the space,
+    filtered for diversity. Points are per-hparam value indices, so the
+    space size is not bounded by the flat index range. Trials stopped early
+    by a scheduler are not fit, their scores are truncated.
+    """
+    def __init__(self, space, plan_size=16, n_sa_iter=200, n_sa_chains=128, diversity=None, seed=None):
         super(XGBoostTuner, self).__init__(space)
-        self.counter = 0
+        self.plan_size = plan_size
+        self.n_sa_iter = n_sa_iter
+        self.n_sa_chains = n_sa_chains
+        self.dims = np.array([len(hp) for hp in space.hp_map.values()], dtype=np.int64)
+        self.diversity = max(1, len(self.dims) // 4) if diversity is None else diversity
+        seed = int(time.time()) if seed is None else seed
+        self.np_random = np.random.RandomState(seed)
+        self.model = XGBCostModel()
+        self.xs = []
+        self.ys = []
+        self.visited = set()
+        self.plan = []
+
+    def point_key(self, point):
+        return tuple(int(i) for i in point)
+
+    def get_point(self, hparams):
+        return [hp.get_index(hparams[name]) for name, hp in self.space.hp_map.items()]
+
+    def get_hparams(self, point):
+        return {name: hp.get(int(i)) for (name, hp), i in zip(self.space.hp_map.items(), point)}
+
+    def featurize(self, points):
+        """ normalized value index, and the value itself for numeric hparams """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, len(self.dims))
+        feats = [points / np.maximum(self.dims - 1, 1)]
+        for d, hp in enumerate(self.space.hp_map.values()):
+            vals = hp.val_range
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in vals):
+                feats.append(np.asarray(vals, dtype=np.float64)[points[:, d].astype(np.int64)][:, None])
+        return np.concatenate(feats, axis=1)
+
+    def random_points(self, n):
+        return np.stack([self.np_random.randint(k, size=n) for k in self.dims], axis=1)
+
+    def anneal(self, n_keep):
+        """ top n_keep unvisited points by predicted score found by parallel simulated annealing """
+        n_chains = self.n_sa_chains
+        # start from the best measured points and random points
+        order = np.argsort(self.ys)[::-1][:n_chains // 2]
+        points = np.concatenate([np.asarray(self.xs)[order], self.random_points(n_chains - len(order))])
+        scores = self.model.predict(self.featurize(points))
+        scale = max(np.std(self.ys), 1e-8)
+        found = {}
+        for it in range(self.n_sa_iter):
+            new = points.copy()
+            dim = self.np_random.randint(len(self.dims), size=n_chains)
+            new[np.arange(n_chains), dim] = self.np_random.randint(self.dims[dim])
+            new_scores = self.model.predict(self.featurize(new))
+            temp = max(1. - it / self.n_sa_iter, 1e-3)
+            accept = self.np_random.random_sample(n_chains) < np.exp(np.minimum((new_scores - scores) / scale / temp, 0))
+            points[accept], scores[accept] = new[accept], new_scores[accept]
+            for p, s in zip(points[accept], scores[accept]):
+                key = self.point_key(p)
+                if not key in self.visited:
+                    found[key] = s
+        cands = sorted(found.items(), key=lambda kv: -kv[1])
+        return self.diverse(cands, n_keep)
+
+    def diverse(self, cands, n_keep):
+        """ greedily keep candidates at least self.diversity hparams apart """
+        keep = []
+        for key, _ in cands:
+            if all(sum(a != b for a, b in zip(key, k)) >= self.diversity for k in keep):
+                keep.append(key)
+                if len(keep) == n_keep: return keep
+        for key, _ in cands:
+            if not key in keep:
+                keep.append(key)
+                if len(keep) == n_keep: break
+        return keep
+
+    def propose(self, n):
+        if len(self.ys) >= self.plan_size:
+            self.model.fit(self.featurize(self.xs), np.asarray(self.ys))
+            plan = self.anneal(n)
+            logging.debug('xgb_tuner: planned {} candidates from {} trials'.format(len(plan), len(self.ys)))
+        else:
+            plan = []
+        # random points until the model is fit, or when annealing found too few
+        for _ in range(100 * n):
+            if len(plan) >= n or not self.has_next(): break
+            key = self.point_key(self.random_points(1)[0])
+            if not key in self.visited and not key in plan:
+                plan.append(key)
+        return plan
 
     def next(self):
-        if self.counter >= len(self.space): return None
-        index = self.counter
-        self.counter = self.counter + 1
-        return self.space.get(index)
+        if not self.has_next(): return None
+        if len(self.plan) == 0:
+            self.plan = self.propose(self.plan_size)
+        if len(self.plan) == 0: return None
+        key = self.plan.pop(0)
+        self.visited.add(key)
+        return self.get_hparams(key)
+
+    def next_batch(self, batch_size):
+        if len(self.plan) < batch_size:
+            self.plan = self.propose(max(batch_size, self.plan_size))
+        return super(XGBoostTuner, self).next_batch(batch_size)
 
     def has_next(self):
-        return self.counter < len(self.space)
-    
-    def update(self, inputs, result):
-        pass
+        return len(self.visited) < len(self.space)
 
-    def load_history(self, data_set):
-        pass
+    def update(self, inputs, result):
+        point = self.get_point(inputs)
+        self.visited.add(self.point_key(point))
+        if result.get('stopped', False): return
+        self.xs.append(point)
+        self.ys.append(result['score'] if result['error_no'] == 0 else 0.)
 
     def __getstate__(self):
-        return {"counter": self.counter}
+        return {
+            'xs': self.xs,
+            'ys': self.ys,
+            'visited': self.visited,
+        }
 
     def __setstate__(self, state):
-        self.counter = state['counter']
+        self.xs = state['xs']
+        self.ys = state['ys']
+        self.visited = state['visited']
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import os
 import time
+import random
 import logging
 import numpy as np
 import torch
@@ -57,13 +58,62 @@ def check_config(hp, name):
         'augment.data.dloader.cutout': 16,
         'search.data.dloader.jitter': True,
         'augment.data.dloader.jitter': True,
+        'search.data.dloader.prefetch': 0,
+        'augment.data.dloader.prefetch': 0,
+        'search.data.dloader.cache': '',
+        'augment.data.dloader.cache': '',
+        'search.data.dloader.cache_size': 0,
+        'augment.data.dloader.cache_size': 0,
+        'search.data.dloader.cache_dir': '',
+        'augment.data.dloader.cache_dir': '',
+        'search.data.dloader.batch_aug': False,
+        'augment.data.dloader.batch_aug': False,
+        'search.data.dloader.shuffle_buffer': 1000,
+        'augment.data.dloader.shuffle_buffer': 1000,
+        'search.data.dloader.folder_index': True,
+        'augment.data.dloader.folder_index': True,
+        'search.data.dloader.paired': False,
+        'search.data.dloader.pin_memory': True,
+        'augment.data.dloader.pin_memory': True,
+        'augment.data.dloader.paired': False,
+        'search.data.dloader.persistent_workers': False,
+        'augment.data.dloader.persistent_workers': False,
+        'search.data.shared': False,
+        'augment.data.shared': False,
+        'search.data.shared_size': 2,
+        'augment.data.shared_size': 2,
+        'search.data.proxy': None,
+        'search.data.stats': False,
+        'augment.data.stats': False,
+        'search.data.stats_samples': 0,
+        'augment.data.stats_samples': 0,
+        'augment.data.proxy': None,
         'search.plot': False,
         'search.aux_weight': 0.0,
         'augment.aux_weight': 0.0,
+        'search.chkpt_steps': 0,
+        'search.channels_last': False,
+        'augment.channels_last': False,
+        'augment.chkpt_steps': 0,
+        'augment.compile': False,
+        'augment.progressive': None,
+        'augment.export': '',
         'ops.ops_order': 'act_weight_bn',
         'ops.sepconv_stack': False,
         'ops.affine': False,
         'log.writer': False,
+        'tune.n_parallel': 1,
+        'tune.devices': None,
+        'tune.scheduler': None,
+        'tune.store': '',
+        'tune.history': '',
+        'tune.warm_start': True,
+        'tune.inherit': False,
+        'tune.queue': '',
+        'tune.precheck': False,
+        'tune.mem_budget': 0,
+        'tune.flops_budget': 0,
+        'tune.mem_policy': 'reject',
     }
 
     for i in defaults:
@@ -107,6 +157,25 @@ def init_device(config, ovr_gpus):
     return device, config.gpus
 
 
+def get_rng_state():
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if torch.cuda.is_available() and 'cuda' in state:
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
 def get_logger(log_dir, name):
     for handler in logging.root.handlers[:]:
         logging.root.removeHandler(handler)
@@ -204,6 +273,25 @@ def param_count(model):
     n_params = sum([p.data.nelement() for p in model.parameters()])
     return n_params / 1e6
 
+def check_memory_format(model, X, memory_format=torch.channels_last):
+    """ return names of modules whose 4D outputs are not in memory_format """
+    mismatch = []
+    def hook(name):
+        def check_output(module, inputs, output):
+            if isinstance(output, torch.Tensor) and output.dim() == 4 \
+                and not output.is_contiguous(memory_format=memory_format):
+                mismatch.append(name)
+        return check_output
+    handles = [m.register_forward_hook(hook(n)) for n, m in model.named_modules()]
+    training = model.training
+    model.eval()
+    with torch.no_grad():
+        model(X.contiguous(memory_format=memory_format))
+    model.train(training)
+    for h in handles:
+        h.remove()
+    return mismatch
+
 class AverageMeter():
     """ Computes and stores the average and current value """
     def __init__(self):
@@ -239,7 +327,7 @@ def accuracy(output, target, topk=(1,)):
 
     res = []
     for k in topk:
-        correct_k = correct[:k].view(-1).float().sum(0)
+        correct_k = correct[:k].reshape(-1).float().sum(0)
         res.append(correct_k.mul_(1.0 / batch_size))
 
     return res
@@ -255,8 +343,8 @@ class ETAMeter():
         self.epoch = epoch
         self.tot_step = tot_step
     
-    def start(self):
-        self.last_step = -1
+    def start(self, last_step=-1):
+        self.last_step = last_step
         self.last_time = time.time()
 
     def step(self, step):
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+import torch
+
+def compile_net(net, **kwargs):
+    """ compile net forward in-place, state_dict keys are unchanged """
+    if not hasattr(torch, 'compile'):
+        raise ValueError('torch.compile not supported in torch {}'.format(torch.__version__))
+    net.forward = torch.compile(net.forward, **kwargs)
+    logging.info('compiled net: {}'.format(kwargs))
+    return net
+
+def export_net(net, path, example_input, method='torchscript'):
+    """ export net in eval mode as frozen TorchScript or torch.export artifact """
+    # bypass torch.compile wrapper if present
+    compiled_forward = net.__dict__.pop('forward', None)
+    training = net.training
+    net.eval()
+    try:
+        with torch.no_grad():
+            if method == 'torchscript':
+                exported = torch.jit.freeze(torch.jit.trace(net, example_input))
+                torch.jit.save(exported, path)
+            elif method == 'export':
+                exported = torch.export.export(net, (example_input, ))
+                torch.export.save(exported, path)
+            else:
+                raise ValueError('unsupported export method: {}'.format(method))
+    finally:
+        net.train(training)
+        if not compiled_forward is None:
+            net.forward = compiled_forward
+    logging.info('exported net ({}) to: {}'.format(method, path))
+    return exported
+
+def benchmark_net(net, X, steps=20, warmup=3, train=True):
+    """ return throughput of net in images/sec """
+    net.train(train)
+    def run():
+        if train:
+            net.zero_grad()
+            out = net(X)
+            out = out[0] if isinstance(out, tuple) else out
+            out.sum().backward()
+        else:
+            with torch.no_grad():
+                net(X)
+    for _ in range(warmup):
+        run()
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        run()
+    if X.is_cuda: torch.cuda.synchronize()
+    return steps * X.size(0) / (time.perf_counter() - t0)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import logging
+import torch
+import torch.nn as nn
+from functools import partial
+from .. import utils
+from ..arch_space import build_arch_space
+from ..arch_space import genotypes as gt
+from ..arch_space.constructor import Slot, convert_from_predefined_net
+from ..core.ops import configure_ops
+from ..core.nas_modules import NASModule
+
+MB = 1024. * 1024.
+
+# input resolution of the supported datasets
+IMG_SIZES = {
+    'cifar10': 32,
+    'cifar100': 32,
+    'mnist': 28,
+    'fashionmnist': 28,
+    'imagenet': 224,
+    'image': 224,
+}
+
+# optimizer state tensors per weight
+OPTIM_STATES = {
+    'sgd': 1,
+    'adam': 2,
+    'adabound': 2,
+}
+
+# check_feasible status, the error_no of trials not run
+FEASIBLE = 0
+INFEASIBLE = 2
+ESTIMATE_FAILED = 3
+
+# fraction of device memory usable by tensors, the rest is left to the CUDA context and allocator
+MEM_HEADROOM = 0.9
+
+def input_size(config):
+    """ image size of batches of the search data config """
+    return config.data.dloader.get('cache_size', 0) or IMG_SIZES.get(config.data.type.lower(), 224)
+
+
+def optim_states(config):
+    if config.type == 'sgd' and not config.get('momentum', 0): return 0
+    return OPTIM_STATES.get(config.type, 2)
+
+
+def count_leaf(state, module, inputs, output):
+    """ forward hook adding output bytes and FLOPs of a leaf module """
+    if not isinstance(output, torch.Tensor): return
+    state['act'] += state['scale'] * output.numel() * output.element_size()
+    if isinstance(module, nn.Conv2d):
+        k = module.kernel_size[0] * module.kernel_size[1]
+        state['flops'] += state['scale'] * 2 * output.numel() * module.in_channels // module.groups * k
+    elif isinstance(module, nn.Linear):
+        state['flops'] += state['scale'] * 2 * output.numel() * module.in_features
+
+
+def mixed_op_forward(mop, state, x):
+    """ run each candidate op once, counting the paths active in a training step """
+    x = x[0] if isinstance(x, list) else x
+    n_ops = len(mop._ops)
+    n_active = min(n_ops, getattr(mop, 'n_samples', n_ops))
+    scale = state['scale']
+    state['scale'] = scale * n_active / n_ops
+    outs = [op(x) for op in mop._ops]
+    state['scale'] = scale
+    # weighted path outputs kept for backward
+    state['act'] += scale * n_active * outs[0].numel() * outs[0].element_size()
+    return outs[0]
+
+
+def estimate_search(config):
+    """ estimated peak memory (MB) and forward GFLOPs per sample of the search stage of config
+
+    The supernet is built on the meta device and shapes are propagated
+    through every candidate op, no memory is allocated and nothing is computed.
+    """
+    dloader = config.search.data.dloader
+    batch_size = max(dloader.trn_batch_size, dloader.val_batch_size)
+    size = input_size(config.search)
+    state = {'scale': 1., 'act': 0., 'flops': 0.}
+    gt.set_primitives(config.primitives)
+    NASModule.reset()
+    Slot.reset()
+    configure_ops(config.ops)
+    NASModule._dev_list = ['meta']
+    try:
+        with torch.device('meta'):
+            net = build_arch_space(config.model.type, config.model)
+            mixed_op_args = config.mixed_op.get('args', {})
+            net = convert_from_predefined_net(net, None, mixed_op_cls=config.mixed_op.type, **mixed_op_args)
+            for m in net.modules():
+                if len(list(m.children())) == 0:
+                    m.register_forward_hook(partial(count_leaf, state))
+                elif isinstance(m, NASModule) and hasattr(m, '_ops'):
+                    m.forward = partial(mixed_op_forward, m, state)
+            X = torch.empty(batch_size, config.model.channel_in, size, size)
+            with torch.no_grad():
+                net(X)
+        weights = sum(p.numel() * p.element_size() for p in net.parameters()) / MB
+    finally:
+        NASModule.reset()
+        Slot.reset()
+    # gradients and w_optim states
+    optim = weights * (1 + optim_states(config.search.w_optim))
+    # DARTSArchitect keeps a v_net copy of the supernet and its weight gradients
+    arch = 2 * weights if config.arch_optim.type == 'DARTS' else 0.
+    act = state['act'] / MB
+    return {
+        'weights': weights,
+        'optim': optim,
+        'arch': arch,
+        'act': act,
+        'total': weights + optim + arch + act,
+        'gflops': state['flops'] / batch_size / 1e9,
+        'batch_size': batch_size,
+    }
+
+
+def device_memory(device):
+    """ usable memory (MB) of the first gpu in device, None on cpu """
+    gpus = utils.parse_gpus(device)
+    if len(gpus) == 0 or not torch.cuda.is_available(): return None
+    return MEM_HEADROOM * torch.cuda.get_device_properties(gpus[0]).total_memory / MB
+
+
+def check_feasible(config, mem_budget=None, flops_budget=0, policy='reject'):
+    """ status of the search stage of config against the budgets
+
+    mem_budget is in MB, flops_budget in forward GFLOPs per sample. With the
+    'clamp' policy the batch sizes are reduced to fit mem_budget instead.
+    """
+    try:
+        est = estimate_search(config)
+    except Exception as e:
+        logging.error('feasibility: estimate failed: {}'.format(e))
+        return ESTIMATE_FAILED
+    logging.info('feasibility: mem: {:.1f} MB (weights: {:.1f} optim: {:.1f} arch: {:.1f} act: {:.1f}) '
+                 'GFLOPs: {:.3f}'.format(est['total'], est['weights'], est['optim'], est['arch'], est['act'],
+                                         est['gflops']))
+    if flops_budget and est['gflops'] > flops_budget:
+        logging.info('feasibility: rejected: GFLOPs {:.3f} > {:.3f}'.format(est['gflops'], flops_budget))
+        return INFEASIBLE
+    if not mem_budget or est['total'] <= mem_budget:
+        return FEASIBLE
+    if policy == 'clamp':
+        # activations scale with the batch size
+        act_per_sample = est['act'] / est['batch_size']
+        batch_size = int((mem_budget - est['total'] + est['act']) / act_per_sample)
+        if batch_size >= 1:
+            dloader = config.search.data.dloader
+            dloader.trn_batch_size = min(dloader.trn_batch_size, batch_size)
+            dloader.val_batch_size = min(dloader.val_batch_size, batch_size)
+            logging.info('feasibility: clamped batch size to {} for budget {:.1f} MB'.format(batch_size, mem_budget))
+            return FEASIBLE
+    logging.info('feasibility: rejected: mem {:.1f} MB > {:.1f} MB'.format(est['total'], mem_budget))
+    return INFEASIBLE
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import bisect
+import logging
+import itertools
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.data.sampler import BatchSampler
+
+def resize_batch(X, img_size):
+    """ resize images of batch so that the shorter side is img_size """
+    h, w = X.size(-2), X.size(-1)
+    if min(h, w) == img_size: return X
+    size = (h * img_size // min(h, w), w * img_size // min(h, w))
+    return F.interpolate(X, size=size, mode='bilinear', align_corners=False, antialias=True)
+
+
+def get_batch_size(loader):
+    batch_size = getattr(getattr(loader, 'batch_sampler', None), 'batch_size', None) or loader.batch_size
+    # datasets batching their own samples
+    return batch_size or getattr(loader.dataset, 'batch_size', None)
+
+
+def set_batch_size(loader, batch_size):
+    """ change the batch size of loader for the next iteration, return False if not supported """
+    batch_sampler = getattr(loader, 'batch_sampler', None)
+    if not isinstance(batch_sampler, BatchSampler):
+        return False
+    batch_sampler.batch_size = batch_size
+    return True
+
+
+def get_lrs(optim):
+    return [g['lr'] for g in optim.param_groups]
+
+
+def set_lrs(optim, lrs):
+    for g, lr in zip(optim.param_groups, lrs):
+        g['lr'] = lr
+
+
+def save_with_lrs(optim, lrs, save_fn, *args, **kwargs):
+    """ call save_fn with learning rates of optim temporarily set to lrs """
+    cur_lrs = get_lrs(optim)
+    set_lrs(optim, lrs)
+    try:
+        save_fn(*args, **kwargs)
+    finally:
+        set_lrs(optim, cur_lrs)
+
+
+def recalibrate_bn(model, loader, n_batches, device, memory_format, transform, max_batch_size=0):
+    """ re-estimate BN running statistics from n_batches of loader at the resolution it serves """
+    bns = [m for m in model.modules() if isinstance(m, nn.modules.batchnorm._BatchNorm) and m.track_running_stats]
+    if len(bns) == 0 or n_batches <= 0: return
+    momenta = [m.momentum for m in bns]
+    for m in bns:
+        m.reset_running_stats()
+        # cumulative average over all batches
+        m.momentum = None
+    training = model.training
+    model.train()
+    img_size = getattr(loader, 'img_size', None)
+    loader.img_size = None
+    try:
+        with torch.no_grad():
+            for X, _ in itertools.islice(loader, n_batches):
+                X = X.to(device, non_blocking=True, memory_format=memory_format)
+                X = transform(loader, X, memory_format)
+                for x in X.split(max_batch_size or X.size(0)):
+                    model(x)
+    finally:
+        loader.img_size = img_size
+        for m, mom in zip(bns, momenta):
+            m.momentum = mom
+        model.train(training)
+
+
+class ProgressiveResize():
+    """ Image size, batch size and learning rate scale of training epochs
+
+    Epochs are split into stages of increasing image size, the last size is
+    the full resolution served by the loader. Lower resolution stages use
+    larger batches at equal memory and linearly scaled learning rates.
+    """
+    def __init__(self, config, tot_epochs, batch_size):
+        self.sizes = list(config.sizes)
+        epochs = config.get('epochs', None)
+        if epochs is None:
+            epochs = [tot_epochs * i // len(self.sizes) for i in range(len(self.sizes))]
+        if len(epochs) != len(self.sizes) or list(epochs) != sorted(epochs):
+            raise ValueError('progressive: invalid stage epochs: {}'.format(epochs))
+        self.epochs = list(epochs)
+        self.full_size = self.sizes[-1]
+        self.batch_size = batch_size
+        self.scale_batch = config.get('scale_batch', True)
+        self.scale_lr = config.get('scale_lr', True)
+        self.bn_batches = config.get('bn_batches', 20)
+
+    def get_size(self, epoch):
+        return self.sizes[max(0, bisect.bisect_right(self.epochs, epoch) - 1)]
+
+    def get_batch_size(self, size):
+        if not self.scale_batch: return self.batch_size
+        return max(1, int(self.batch_size * (self.full_size / size) ** 2))
+
+    def recalibrate(self, epoch):
+        """ whether BN statistics mismatch the full resolution after training epoch """
+        return self.get_size(epoch) != self.full_size
+
+    def apply(self, loader, epoch):
+        """ set image size and batch size of loader for epoch, return learning rate scale """
+        size = self.get_size(epoch)
+        loader.img_size = None if size == self.full_size else size
+        batch_size = self.get_batch_size(size)
+        if batch_size != get_batch_size(loader) and not set_batch_size(loader, batch_size):
+            logging.warning('progressive: batch size of loader is fixed')
+            batch_size = get_batch_size(loader)
+        return batch_size / self.batch_size if self.scale_lr else 1.
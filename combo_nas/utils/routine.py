@@ -1,18 +1,56 @@
 # -*- coding: utf-8 -*-
 import os
+import signal
+import logging
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import itertools
+from functools import partial
 from .. import utils
 from .visualize import plot
 from .profiling import tprof
+from .export import export_net
+from .warm_start import load_matching, save_warmup_cache
+from .progressive import ProgressiveResize, resize_batch, recalibrate_bn, get_batch_size, get_lrs, set_lrs, save_with_lrs
+from ..data_provider.prefetcher import Prefetcher
+from ..data_provider.paired_loader import get_tr_ratio
 from ..arch_space import genotypes as gt
 from ..core.nas_modules import NASModule
 
-def save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, epoch, logger):
+_preempt_signal = None
+
+def _preempt_handler(signum, frame):
+    global _preempt_signal
+    if not _preempt_signal is None:
+        # second signal: exit immediately
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+        return
+    _preempt_signal = signum
+    logging.warning('received signal {}: saving checkpoint at next step'.format(signum))
+
+def install_preempt_handler():
+    try:
+        for sig in (signal.SIGTERM, signal.SIGUSR1):
+            signal.signal(sig, _preempt_handler)
+    except ValueError:
+        logging.warning('preempt handler not installed: not in main thread')
+
+def preempted():
+    return not _preempt_signal is None
+
+def exit_preempted(logger):
+    logger.info('exiting on signal {}'.format(_preempt_signal))
+    raise SystemExit('preempted by signal {}'.format(_preempt_signal))
+
+def save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, epoch, logger, step_state=None):
     try:
-        save_path = expman.join('chkpt', 'chkpt_{:03d}.pt'.format(epoch+1))
+        if step_state is None:
+            save_path = expman.join('chkpt', 'chkpt_{:03d}.pt'.format(epoch+1))
+        else:
+            save_path = expman.join('chkpt', 'chkpt_step.pt')
+        tmp_path = save_path + '.tmp'
         torch.save({
             'model': model.state_dict(),
             'arch': NASModule.nasmod_state_dict(),
@@ -20,11 +58,107 @@ def save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, epoch, logger
             'a_optim': None if a_optim is None else a_optim.state_dict(),
             'lr_scheduler': lr_scheduler.state_dict(),
             'epoch': epoch,
-        }, save_path)
+            'step_state': step_state,
+        }, tmp_path)
+        os.replace(tmp_path, save_path)
         logger.info("Saved checkpoint to: %s" % save_path)
+        return save_path
     except Exception as e:
         logger.error("Save checkpoint failed: "+str(e))
 
+def load_checkpoint(path):
+    """ load a checkpoint written by save_checkpoint, it holds python rng and sampler state besides tensors """
+    return torch.load(path, weights_only=False)
+
+def resume_lr_scheduler(lr_scheduler, epoch):
+    """ step the lr schedule of a checkpoint saved before the scheduler step of epoch """
+    while lr_scheduler.last_epoch < epoch + 1:
+        lr_scheduler.step()
+
+def exploit_checkpoint(chkpt_path, model, w_optim, a_optim, lr_scheduler, config, logger):
+    """ load the search state of chkpt_path, rescale the lr schedule to config.w_optim.lr """
+    checkpoint = load_checkpoint(chkpt_path)
+    model.load_state_dict(checkpoint['model'])
+    NASModule.nasmod_load_state_dict(checkpoint['arch'])
+    w_optim.load_state_dict(checkpoint['w_optim'])
+    lr_scheduler.load_state_dict(checkpoint['lr_scheduler'])
+    scale = config.w_optim.lr / lr_scheduler.base_lrs[0]
+    lr_scheduler.base_lrs = [lr * scale for lr in lr_scheduler.base_lrs]
+    set_lrs(w_optim, [lr * scale for lr in get_lrs(w_optim)])
+    if not a_optim is None:
+        a_optim.load_state_dict(checkpoint['a_optim'])
+        set_lrs(a_optim, [config.a_optim.lr] * len(a_optim.param_groups))
+    logger.info("Exploited checkpoint: {} w_lr: {} a_lr: {}".format(chkpt_path, config.w_optim.lr, config.a_optim.lr))
+
+def get_sampler_state(loader):
+    if loader is None or not hasattr(loader.sampler, 'state_dict'): return None
+    return loader.sampler.state_dict()
+
+def get_batch_aug(loader):
+    return None if loader is None else getattr(loader, 'batch_aug', None)
+
+def batch_transform(loader, X, memory_format):
+    """ apply batch-level augmentation and resizing of loader on device """
+    batch_aug = get_batch_aug(loader)
+    img_size = None if loader is None else getattr(loader, 'img_size', None)
+    if batch_aug is None and not img_size: return X
+    if not batch_aug is None:
+        X = batch_aug(X)
+    if img_size:
+        X = resize_batch(X, img_size)
+    if memory_format == torch.preserve_format: return X.contiguous()
+    return X.contiguous(memory_format=memory_format)
+
+def get_step_state(train_loader, valid_loader, step, val_step, val_state=None):
+    """ state required to resume an epoch at the given step """
+    trn_aug = get_batch_aug(train_loader)
+    val_aug = get_batch_aug(valid_loader)
+    return {
+        'step': step,
+        'val_step': val_step,
+        'rng': utils.get_rng_state(),
+        'trn_sampler': get_sampler_state(train_loader),
+        'val_sampler': get_sampler_state(valid_loader) if val_state is None else val_state,
+        'trn_aug': None if trn_aug is None else trn_aug.state_dict(),
+        'val_aug': None if val_aug is None else val_aug.state_dict(),
+    }
+
+def cycle_loader(loader, it, pos=0):
+    """ iterate loader endlessly, yielding (batches consumed in current pass, batch, sampler state of pass) """
+    while True:
+        state = None
+        for batch in it:
+            if state is None: state = get_sampler_state(loader)
+            pos += 1
+            yield pos, batch, state
+        it = iter(loader)
+        pos = 0
+
+def pair_batches(trn_iter, val_iter, tr_ratio, init_step):
+    """ yield (train batch, (val_step, valid batch, valid sampler state) or None) on the tr_ratio schedule """
+    for step, batch in enumerate(trn_iter, init_step):
+        yield batch, next(val_iter) if not val_iter is None and step % tr_ratio == 0 else None
+
+def close_prefetch(*iters):
+    for it in iters:
+        if isinstance(it, Prefetcher): it.close()
+
+def resume_sampler(loader, sampler_state, n_batches):
+    """ position sampler of loader after n_batches, return False if not resumable """
+    if sampler_state is None or not hasattr(loader.sampler, 'load_state_dict'): return False
+    loader.sampler.load_state_dict(sampler_state, start=n_batches*get_batch_size(loader))
+    return True
+
+def resume_loader(loader, sampler_state, n_batches):
+    """ return an iterator of loader positioned after n_batches """
+    if resume_sampler(loader, sampler_state, n_batches):
+        return iter(loader)
+    logging.warning('loader not resumable: replaying {} batches'.format(n_batches))
+    it = iter(loader)
+    for _ in range(n_batches):
+        next(it)
+    return it
+
 def save_genotype(expman, genotype, epoch, logger):
     try:
         logger.info("genotype = {}".format(genotype))
@@ -35,32 +169,58 @@ def save_genotype(expman, genotype, epoch, logger):
         logger.error("Save genotype failed")
 
 
-def search(config, chkpt_path, expman, train_loader, valid_loader, model, arch_optim, writer, logger, device):
+def search(config, chkpt_path, expman, train_loader, valid_loader, model, arch_optim, writer, logger, device,
+           epoch_callback=None, warmup_cache=None, inherit_chkpt=None):
+    """ epoch_callback(epoch, top1) is called after each validation, returning True stops the search,
+    returning a checkpoint path continues from that checkpoint with the lr of config
+
+    warmup_cache: checkpoint path of the supernet after warmup, loaded if present, saved otherwise
+    inherit_chkpt: checkpoint of an earlier run, its matching weights replace warmup training
+    """
+    install_preempt_handler()
     w_optim = utils.get_optim(model.weights(), config.w_optim)
     a_optim = utils.get_optim(model.alphas(), config.a_optim)
     lr_scheduler = utils.get_lr_scheduler(w_optim, config.lr_scheduler, config.epochs)
     
     if chkpt_path is not None:
         logger.info("Resuming from checkpoint: {}".format(chkpt_path))
-        checkpoint = torch.load(chkpt_path)
+        checkpoint = load_checkpoint(chkpt_path)
         model.load_state_dict(checkpoint['model'])
         NASModule.nasmod_load_state_dict(checkpoint['arch'])
         w_optim.load_state_dict(checkpoint['w_optim'])
         a_optim.load_state_dict(checkpoint['a_optim'])
         lr_scheduler.load_state_dict(checkpoint['lr_scheduler'])
         init_epoch = checkpoint['epoch']
+        step_state = checkpoint.get('step_state', None)
+        resume_lr_scheduler(lr_scheduler, init_epoch)
         resume = True
     else:
         logger.info("Starting new training run")
         init_epoch = -1
+        step_state = None
         resume = False
+
+    warm_started = False
+    if not resume and not inherit_chkpt is None:
+        checkpoint = load_checkpoint(inherit_chkpt)
+        n_params = load_matching(model, checkpoint['model'])
+        logger.info("Inherited {} weights from: {}".format(n_params, inherit_chkpt))
+        warm_started = True
+    elif not resume and not warmup_cache is None and os.path.exists(warmup_cache):
+        logger.info("Warm start from: {}".format(warmup_cache))
+        checkpoint = load_checkpoint(warmup_cache)
+        model.load_state_dict(checkpoint['model'])
+        NASModule.nasmod_load_state_dict(checkpoint['arch'])
+        # arch optimizer and lr schedule are not part of warmup
+        w_optim.load_state_dict(checkpoint['w_optim'])
+        warm_started = True
     
     logger.info("Model params count: {:.3f} M, size: {:.3f} MB".format(utils.param_count(model), utils.param_size(model)))
 
     # warmup training loop
     logger.info('begin warmup training')
     try:
-        if not resume and config.warmup_epochs > 0:
+        if not resume and not warm_started and config.warmup_epochs > 0:
             warmup_lr_scheduler = utils.get_lr_scheduler(w_optim, config.lr_scheduler, config.warmup_epochs)
             tot_epochs = config.warmup_epochs
             for epoch in itertools.count(init_epoch+1):
@@ -72,19 +232,33 @@ def search(config, chkpt_path, expman, train_loader, valid_loader, model, arch_o
                 train(train_loader, None, model, writer, logger, arch_optim, w_optim, a_optim, lr, epoch, tot_epochs, device, config)
 
                 # validation
-                cur_step = (epoch+1) * len(train_loader)
-                top1 = validate(valid_loader, model, writer, logger, epoch, tot_epochs, cur_step, device, config)
+                if not preempted():
+                    cur_step = (epoch+1) * len(train_loader)
+                    top1 = validate(valid_loader, model, writer, logger, epoch, tot_epochs, cur_step, device, config)
+
+                if preempted():
+                    # warmup is not resumable, a resumed run continues with w/a training
+                    save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, init_epoch, logger)
+                    exit_preempted(logger)
 
                 warmup_lr_scheduler.step()
+        else:
+            warmup_cache = None
     except KeyboardInterrupt:
         logger.info('skipped')
+        warmup_cache = None
     
-    save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, init_epoch, logger)
-    save_genotype(expman, model.to_genotype(), init_epoch, logger)
+    if not resume:
+        # a resumed run keeps the checkpoints of its completed epochs
+        warmup_chkpt = save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, init_epoch, logger)
+        if not warmup_cache is None and not warmup_chkpt is None:
+            save_warmup_cache(warmup_chkpt, warmup_cache)
+        save_genotype(expman, model.to_genotype(), init_epoch, logger)
 
     # training loop
     logger.info('begin w/a training')
     best_top1 = 0.
+    best_genotype = None
     tot_epochs = config.epochs
     genotypes = []
     for epoch in itertools.count(init_epoch+1):
@@ -92,10 +266,16 @@ def search(config, chkpt_path, expman, train_loader, valid_loader, model, arch_o
         lr = lr_scheduler.get_lr()[0]
         model.print_alphas(logger)
         # training
-        train(train_loader, valid_loader, model, writer, logger, arch_optim, w_optim, a_optim, lr, epoch, tot_epochs, device, config)
+        save_step = partial(save_checkpoint, expman, model, w_optim, a_optim, lr_scheduler, epoch-1, logger)
+        train(train_loader, valid_loader, model, writer, logger, arch_optim, w_optim, a_optim, lr, epoch, tot_epochs, device, config,
+                step_state, save_step)
+        step_state = None
         # validation
         cur_step = (epoch+1) * len(train_loader)
         top1 = validate(valid_loader, model, writer, logger, epoch, tot_epochs, cur_step, device, config) 
+        if preempted():
+            save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, epoch, logger)
+            exit_preempted(logger)
         # genotype
         genotype = model.to_genotype()
         genotypes.append(genotype)
@@ -107,12 +287,27 @@ def search(config, chkpt_path, expman, train_loader, valid_loader, model, arch_o
                 caption = "Epoch {} - DAG {}".format(epoch+1, i)
                 plot(genotype.dag[i], dag, plot_path + "-dag_{}".format(i), caption)
         
-        if best_top1 < top1:
+        if best_genotype is None or best_top1 < top1:
             best_top1 = top1
             best_genotype = genotype
 
-        if config.save_freq != 0 and epoch % config.save_freq == 0:
+        # saved before the callback so that other runs can exploit it
+        saved = config.save_freq != 0 and epoch % config.save_freq == 0
+        if saved:
+            save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, epoch, logger)
+
+        decision = None if epoch_callback is None else epoch_callback(epoch, top1)
+        if isinstance(decision, str):
+            exploit_checkpoint(decision, model, w_optim, a_optim, lr_scheduler, config, logger)
+        elif decision:
+            logger.info('search stopped at epoch {}'.format(epoch+1))
+            if not saved:
+                save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, epoch, logger)
+            break
+
+        if preempted():
             save_checkpoint(expman, model, w_optim, a_optim, lr_scheduler, epoch, logger)
+            exit_preempted(logger)
 
         lr_scheduler.step()
         
@@ -123,18 +318,22 @@ def search(config, chkpt_path, expman, train_loader, valid_loader, model, arch_o
 
 
 def augment(config, chkpt_path, expman, train_loader, valid_loader, model, writer, logger, device):
+    install_preempt_handler()
     w_optim = utils.get_optim(model.weights(), config.w_optim)
     lr_scheduler = utils.get_lr_scheduler(w_optim, config.lr_scheduler, config.epochs)
 
     init_epoch = -1
+    step_state = None
 
     if chkpt_path is not None:
         logger.info("Resuming from checkpoint: %s" % chkpt_path)
-        checkpoint = torch.load(chkpt_path)
+        checkpoint = load_checkpoint(chkpt_path)
         model.load_state_dict(checkpoint['model'])
         w_optim.load_state_dict(checkpoint['w_optim'])
         lr_scheduler.load_state_dict(checkpoint['lr_scheduler'])
         init_epoch = checkpoint['epoch']
+        step_state = checkpoint.get('step_state', None)
+        resume_lr_scheduler(lr_scheduler, init_epoch)
     else:
         logger.info("Starting new training run")
 
@@ -144,6 +343,9 @@ def augment(config, chkpt_path, expman, train_loader, valid_loader, model, write
     logger.info('begin training')
     best_top1 = 0.
     tot_epochs = config.epochs
+    progressive = None
+    if config.progressive:
+        progressive = ProgressiveResize(config.progressive, tot_epochs, get_batch_size(train_loader))
     for epoch in itertools.count(init_epoch+1):
         if epoch == tot_epochs: break
 
@@ -153,7 +355,28 @@ def augment(config, chkpt_path, expman, train_loader, valid_loader, model, write
         lr = lr_scheduler.get_lr()[0]
 
         # training
-        train(train_loader, None, model, writer, logger, None, w_optim, None, lr, epoch, tot_epochs, device, config)
+        save_step = partial(save_checkpoint, expman, model, w_optim, None, lr_scheduler, epoch-1, logger)
+        lr_scale = 1.
+        if not progressive is None:
+            lr_scale = progressive.apply(train_loader, epoch)
+            logger.info('progressive: epoch {} image size {} batch size {} lr scale {:.3f}'.format(
+                epoch+1, progressive.get_size(epoch), get_batch_size(train_loader), lr_scale))
+        if lr_scale != 1.:
+            base_lrs = get_lrs(w_optim)
+            set_lrs(w_optim, [l * lr_scale for l in base_lrs])
+            lr *= lr_scale
+            # checkpoints keep the unscaled learning rates of the scheduler
+            save_step = partial(save_with_lrs, w_optim, base_lrs, save_step)
+        train(train_loader, None, model, writer, logger, None, w_optim, None, lr, epoch, tot_epochs, device, config,
+                step_state, save_step)
+        step_state = None
+        if lr_scale != 1.:
+            set_lrs(w_optim, base_lrs)
+        if not progressive is None and progressive.recalibrate(epoch):
+            # running statistics of the low resolution epoch do not match the validation images
+            mem_fmt = torch.channels_last if config.channels_last else torch.preserve_format
+            recalibrate_bn(model, train_loader, progressive.bn_batches, device, mem_fmt, batch_transform,
+                           progressive.batch_size)
 
         # validation
         cur_step = (epoch+1) * len(train_loader)
@@ -169,75 +392,142 @@ def augment(config, chkpt_path, expman, train_loader, valid_loader, model, write
         if config.save_freq != 0 and epoch % config.save_freq == 0:
             save_checkpoint(expman, model, w_optim, None, lr_scheduler, epoch, logger)
 
+        if preempted():
+            save_checkpoint(expman, model, w_optim, None, lr_scheduler, epoch, logger)
+            exit_preempted(logger)
+
         lr_scheduler.step()
     logger.info("Final best Prec@1 = {:.4%}".format(best_top1))
+
+    if config.export:
+        X = next(iter(valid_loader))[0][:1].to(device=device)
+        X = batch_transform(valid_loader, X, torch.preserve_format)
+        export_path = expman.join('output', 'model.pt2' if config.export == 'export' else 'model.pt')
+        export_net(model.net, export_path, X, config.export)
     return best_top1
 
 
-def train(train_loader, valid_loader, model, writer, logger, arch_optim, w_optim, a_optim, lr, epoch, tot_epochs, device, config):
+def train(train_loader, valid_loader, model, writer, logger, arch_optim, w_optim, a_optim, lr, epoch, tot_epochs, device, config,
+            step_state=None, save_step=None):
     one_level = False
     top1 = utils.AverageMeter()
     top5 = utils.AverageMeter()
     losses = utils.AverageMeter()
 
-    cur_step = epoch*len(train_loader)
+    init_step = val_step = 0
+    if not step_state is None:
+        init_step = step_state['step']
+        val_step = step_state['val_step']
+
+    cur_step = epoch*len(train_loader) + init_step
     writer.add_scalar('train/lr', lr, cur_step)
 
     model.train()
 
-    if not valid_loader is None:
-        tr_ratio = len(train_loader) // len(valid_loader)
-        val_iter = iter(valid_loader)
+    paired = not valid_loader is None and hasattr(train_loader, 'iter_paired')
+    tr_ratio = val_iter = val_state = None
+    if paired:
+        tr_ratio = train_loader.tr_ratio
+    elif not valid_loader is None:
+        tr_ratio = get_tr_ratio(len(train_loader), len(valid_loader))
+    if paired:
+        if not step_state is None:
+            logger.info('resuming epoch {} from step {}'.format(epoch+1, init_step))
+            resume_sampler(train_loader, step_state['trn_sampler'], init_step)
+            resume_sampler(valid_loader, step_state['val_sampler'], val_step)
+        batch_iter = train_loader.iter_paired(init_step, val_step)
+    else:
+        if step_state is None:
+            trn_iter = iter(train_loader)
+        else:
+            logger.info('resuming epoch {} from step {}'.format(epoch+1, init_step))
+            trn_iter = resume_loader(train_loader, step_state['trn_sampler'], init_step)
+        if not valid_loader is None:
+            if step_state is None:
+                val_iter = iter(valid_loader)
+            else:
+                val_iter = resume_loader(valid_loader, step_state['val_sampler'], val_step)
+            val_iter = cycle_loader(valid_loader, val_iter, val_step)
+        batch_iter = pair_batches(trn_iter, val_iter, tr_ratio, init_step)
+
+    if not step_state is None:
+        utils.set_rng_state(step_state['rng'])
+        for loader, key in [(train_loader, 'trn_aug'), (valid_loader, 'val_aug')]:
+            batch_aug = get_batch_aug(loader)
+            if not batch_aug is None and not step_state.get(key, None) is None:
+                batch_aug.load_state_dict(step_state[key])
+
+    mem_fmt = torch.channels_last if config.channels_last else torch.preserve_format
+
+    prefetch = config.data.dloader.prefetch
+    if prefetch > 0:
+        batch_iter = Prefetcher(batch_iter, device, prefetch, mem_fmt)
 
     eta_m = utils.ETAMeter(tot_epochs, epoch, len(train_loader))
-    eta_m.start()
-    for step, (trn_X, trn_y) in enumerate(train_loader):
-        trn_X, trn_y = trn_X.to(device, non_blocking=True), trn_y.to(device, non_blocking=True)
-        N = trn_X.size(0)
-        w_optim.zero_grad()
-        if not a_optim is None: a_optim.zero_grad()
-        # phase 1. child network step (w)
-        tprof.timer_start('train')
-        loss, logits = model.loss_logits(trn_X, trn_y, config.aux_weight)
-        loss.backward()
-        # gradient clipping
-        if config.w_grad_clip > 0:
-            nn.utils.clip_grad_norm_(model.weights(), config.w_grad_clip)
-        w_optim.step()
-        tprof.timer_stop('train')
-        # phase 2. arch_optim step (alpha)
-        if not valid_loader is None and step % tr_ratio == 0:
-            tprof.timer_start('arch')
-            if one_level:
-                arch_optim.step(trn_X, trn_y, trn_X, trn_y, lr, w_optim, a_optim)
-            else:
-                try:
-                    val_X, val_y = next(val_iter)
-                except:
-                    val_iter = iter(valid_loader)
-                    val_X, val_y = next(val_iter)
-                val_X, val_y = val_X.to(device, non_blocking=True), val_y.to(device, non_blocking=True)
-                arch_optim.step(trn_X, trn_y, val_X, val_y, lr, w_optim, a_optim)
-            tprof.timer_stop('arch')
-
-        prec1, prec5 = utils.accuracy(logits, trn_y, topk=(1, 5))
-        losses.update(loss.item(), N)
-        top1.update(prec1.item(), N)
-        top5.update(prec5.item(), N)
-
-        if step !=0 and step % config.print_freq == 0 or step == len(train_loader)-1:
-            eta = eta_m.step(step)
-            logger.info(
-                "Train: [{:2d}/{}] Step {:03d}/{:03d} LR {:.3f} Loss {losses.avg:.3f} "
-                "Prec@(1,5) ({top1.avg:.1%}, {top5.avg:.1%}) | ETA: {eta}".format(
-                    epoch+1, tot_epochs, step, len(train_loader)-1, lr, losses=losses,
-                    top1=top1, top5=top5, eta=utils.format_time(eta)))
-
-        writer.add_scalar('train/loss', loss.item(), cur_step)
-        writer.add_scalar('train/top1', prec1.item(), cur_step)
-        writer.add_scalar('train/top5', prec5.item(), cur_step)
-        cur_step += 1
+    eta_m.start(init_step-1)
+    # the prefetch thread holds staged batches and the loader iterator until closed
+    try:
+        for step, ((trn_X, trn_y), val_item) in enumerate(batch_iter, init_step):
+            trn_X, trn_y = trn_X.to(device, non_blocking=True, memory_format=mem_fmt), trn_y.to(device, non_blocking=True)
+            trn_X = batch_transform(train_loader, trn_X, mem_fmt)
+            N = trn_X.size(0)
+            w_optim.zero_grad()
+            if not a_optim is None: a_optim.zero_grad()
+            # phase 1. child network step (w)
+            tprof.timer_start('train')
+            loss, logits = model.loss_logits(trn_X, trn_y, config.aux_weight)
+            loss.backward()
+            # gradient clipping
+            if config.w_grad_clip > 0:
+                nn.utils.clip_grad_norm_(model.weights(), config.w_grad_clip)
+            w_optim.step()
+            tprof.timer_stop('train')
+            # phase 2. arch_optim step (alpha)
+            if not valid_loader is None and step % tr_ratio == 0:
+                tprof.timer_start('arch')
+                if one_level:
+                    arch_optim.step(trn_X, trn_y, trn_X, trn_y, lr, w_optim, a_optim)
+                else:
+                    val_step, (val_X, val_y), val_state = val_item
+                    val_X, val_y = val_X.to(device, non_blocking=True, memory_format=mem_fmt), val_y.to(device, non_blocking=True)
+                    val_X = batch_transform(valid_loader, val_X, mem_fmt)
+                    arch_optim.step(trn_X, trn_y, val_X, val_y, lr, w_optim, a_optim)
+                tprof.timer_stop('arch')
+
+            prec1, prec5 = utils.accuracy(logits, trn_y, topk=(1, 5))
+            losses.update(loss.item(), N)
+            top1.update(prec1.item(), N)
+            top5.update(prec5.item(), N)
+
+            if step !=0 and step % config.print_freq == 0 or step == len(train_loader)-1:
+                eta = eta_m.step(step)
+                logger.info(
+                    "Train: [{:2d}/{}] Step {:03d}/{:03d} LR {:.3f} Loss {losses.avg:.3f} "
+                    "Prec@(1,5) ({top1.avg:.1%}, {top5.avg:.1%}) | ETA: {eta}".format(
+                        epoch+1, tot_epochs, step, len(train_loader)-1, lr, losses=losses,
+                        top1=top1, top5=top5, eta=utils.format_time(eta)))
+
+            writer.add_scalar('train/loss', loss.item(), cur_step)
+            writer.add_scalar('train/top1', prec1.item(), cur_step)
+            writer.add_scalar('train/top5', prec5.item(), cur_step)
+            cur_step += 1
+
+            # step checkpoint, the last step is covered by the epoch checkpoint
+            if step < len(train_loader)-1:
+                if not save_step is None and (preempted() or (config.chkpt_steps > 0 and (step+1) % config.chkpt_steps == 0)):
+                    save_step(get_step_state(train_loader, valid_loader, step+1, val_step, val_state))
+                if preempted():
+                    # without step checkpoints the caller saves an epoch checkpoint
+                    if save_step is None: break
+                    exit_preempted(logger)
+    finally:
+        close_prefetch(batch_iter)
     logger.info("Train: [{:2d}/{}] Final Prec@1 {:.4%}".format(epoch+1, tot_epochs, top1.avg))
+    # a resumed valid sampler position not reached in this epoch must not leak into the next pass
+    if not valid_loader is None and hasattr(valid_loader.sampler, 'resume'):
+        valid_loader.sampler.resume = False
+    if prefetch > 0:
+        logger.info("Train: [{:2d}/{}] Data {}".format(epoch+1, tot_epochs, batch_iter.stat()))
     tprof.print_stat('train')
     tprof.print_stat('arch')
 
@@ -248,10 +538,15 @@ def validate(valid_loader, model, writer, logger, epoch, tot_epochs, cur_step, d
     losses = utils.AverageMeter()
 
     model.eval()
+    mem_fmt = torch.channels_last if config.channels_last else torch.preserve_format
 
     with torch.no_grad():
         for step, (val_X, val_y) in enumerate(valid_loader):
-            val_X, val_y = val_X.to(device, non_blocking=True), val_y.to(device, non_blocking=True)
+            if preempted():
+                logger.info("Valid: [{:2d}/{}] interrupted at step {}".format(epoch+1, tot_epochs, step))
+                break
+            val_X, val_y = val_X.to(device, non_blocking=True, memory_format=mem_fmt), val_y.to(device, non_blocking=True)
+            val_X = batch_transform(valid_loader, val_X, mem_fmt)
             N = val_X.size(0)
 
             tprof.timer_start('validate')
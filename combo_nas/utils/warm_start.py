@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+from .config import Config
+
+# config subtrees that determine the state of the supernet after warmup
+WARMUP_KEYS = [
+    'model',
+    'mixed_op',
+    'primitives',
+    'ops',
+    'criterion',
+    'device.seed',
+    'arch_optim.type',
+    'search.data',
+    'search.w_optim',
+    'search.lr_scheduler',
+    'search.warmup_epochs',
+    'search.w_grad_clip',
+    'search.aux_weight',
+    'search.channels_last',
+]
+
+def warmup_key(config):
+    """ hash of the config subtrees that determine warmup training """
+    sub = {}
+    for k in WARMUP_KEYS:
+        try:
+            sub[k] = Config.get_value(config, k)
+        except (KeyError, ValueError):
+            sub[k] = None
+    conf = json.dumps(sub, sort_keys=True, default=str)
+    return hashlib.sha1(conf.encode()).hexdigest()[:16]
+
+
+def warmup_cache_path(cache_dir, config):
+    return os.path.join(cache_dir, 'warmup-{}.pt'.format(warmup_key(config)))
+
+
+def save_warmup_cache(chkpt_path, cache_path):
+    """ atomically copy the post-warmup checkpoint into the cache """
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        shutil.copyfile(chkpt_path, tmp_path)
+        os.replace(tmp_path, cache_path)
+        logging.info('warm_start: cached warmup checkpoint: {}'.format(cache_path))
+    except OSError as e:
+        logging.warning('warm_start: failed to cache warmup checkpoint: {}'.format(e))
+
+
+def find_checkpoint(chkpt_dir):
+    """ path of the latest epoch checkpoint in chkpt_dir, None if there is none """
+    if not os.path.isdir(chkpt_dir): return None
+    chkpts = [f for f in os.listdir(chkpt_dir) if re.match(r'chkpt_\d+\.pt$', f)]
+    if len(chkpts) == 0: return None
+    return os.path.join(chkpt_dir, max(chkpts, key=lambda f: int(f[6:-3])))
+
+
+def load_matching(model, state_dict):
+    """ load entries of state_dict matching model parameters in name and shape, return count """
+    own = model.state_dict()
+    matched = {k: v for k, v in state_dict.items() if k in own and own[k].shape == v.shape}
+    model.load_state_dict(matched, strict=False)
+    return len(matched)
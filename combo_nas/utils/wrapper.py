@@ -1,3 +1,4 @@
+import torch
 from ..utils.exp_manager import ExpManager
 from ..data_provider.dataloader import load_data
 from ..arch_space.constructor import convert_from_predefined_net
@@ -6,6 +7,7 @@ from ..core.ops import configure_ops
 from ..arch_space import build_arch_space
 from ..arch_space.constructor import Slot
 from ..core.nas_modules import NASModule, build_nas_controller
+from .export import compile_net
 from ..arch_optim import build_arch_optim
 from .. import utils as utils
 from ..arch_space import genotypes as gt
@@ -35,6 +37,8 @@ def init_all_search(config, name, exp_root_dir, device, genotype=None, convert_f
     # model
     crit = utils.get_net_crit(config.criterion)
     model = build_nas_controller(supernet, crit, dev, dev_list)
+    if config.search.channels_last:
+        model.to(memory_format=torch.channels_last)
     arch = build_arch_optim(config.arch_optim.type, config.arch_optim, model)
     return {
         'expman': expman,
@@ -74,6 +78,10 @@ def init_all_augment(config, name, exp_root_dir, device, genotype, convert_fn=No
     # model
     crit = utils.get_net_crit(config.criterion)
     model = build_nas_controller(supernet, crit, dev, dev_list)
+    if config.augment.channels_last:
+        model.to(memory_format=torch.channels_last)
+    if config.augment.compile:
+        compile_net(model.net)
     return {
         'expman': expman,
         'train_loader': trn_loader,
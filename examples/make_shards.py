@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+from combo_nas.data_provider.shard_dataloader import convert_image_folder
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert ImageFolder dataset to tar shards')
+    parser.add_argument('root', help='ImageFolder root directory')
+    parser.add_argument('out_dir', help='output shard directory')
+    parser.add_argument('-n', '--shard_size', type=int, default=1000, help='samples per shard')
+    parser.add_argument('--no_shuffle', action='store_true', help='keep directory order')
+    parser.add_argument('--seed', type=int, default=0, help='sample shuffle seed')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    shards = convert_image_folder(args.root, args.out_dir, args.shard_size, not args.no_shuffle, args.seed)
+    print('wrote {} shards to {}'.format(len(shards), args.out_dir))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+import torch
+
+import combo_nas.utils as utils
+from combo_nas.utils.config import Config
+from combo_nas.utils.export import compile_net, benchmark_net
+from combo_nas.arch_space import build_arch_space
+from combo_nas.arch_space import genotypes as gt
+from combo_nas.arch_space.constructor import Slot, convert_from_predefined_net, convert_from_genotype
+from combo_nas.core.ops import configure_ops
+from combo_nas.core.nas_modules import NASModule, build_nas_controller
+
+def build_derived_net(config, model_type):
+    config.model.type = model_type
+    gt.set_primitives(config.primitives)
+    NASModule.reset()
+    Slot.reset()
+    configure_ops(config.ops)
+    net = build_arch_space(model_type, config.model)
+    if hasattr(net, 'get_default_converter'):
+        return convert_from_predefined_net(net, net.get_default_converter())
+    # derive from a supernet with random alphas
+    supernet = convert_from_predefined_net(net, None, mixed_op_cls='DARTS')
+    model = build_nas_controller(supernet, None, 'cpu', [])
+    genotype = model.to_genotype()
+    NASModule.reset()
+    Slot.reset()
+    net = build_arch_space(model_type, config.model)
+    return convert_from_genotype(net, genotype)
+
+def main():
+    parser = argparse.ArgumentParser(description='throughput of derived nets on CPU')
+    parser.add_argument('-c','--config',type=str, default='./config/default.yaml',
+                        help="yaml config file")
+    parser.add_argument('-m','--models',type=str, nargs='+',
+                        default=['DARTS', 'ProxylessNAS', 'PyramidNet', 'ResNet-18', 'MobileNetV2'],
+                        help="model types to benchmark")
+    parser.add_argument('-b','--batch_size',type=int, default=32)
+    parser.add_argument('-s','--size',type=int, default=32,
+                        help="input image size")
+    parser.add_argument('--steps',type=int, default=20)
+    parser.add_argument('--eval', action='store_true',
+                        help="benchmark inference instead of training steps")
+    parser.add_argument('--compare',type=str, default='compile', choices=['compile', 'channels_last'],
+                        help="compare eager against torch.compile or channels_last memory format")
+    args = parser.parse_args()
+
+    config = Config(args.config)
+    if utils.check_config(config, 'bench'):
+        raise Exception("config error.")
+    X = torch.randn(args.batch_size, config.model.channel_in, args.size, args.size)
+    results = []
+    for model_type in args.models:
+        net = build_derived_net(config, model_type)
+        base = benchmark_net(net, X, args.steps, train=not args.eval)
+        if args.compare == 'compile':
+            compile_net(net)
+            opt = benchmark_net(net, X, args.steps, train=not args.eval)
+        else:
+            net.to(memory_format=torch.channels_last)
+            mismatch = utils.check_memory_format(net, X)
+            if len(mismatch) > 0:
+                print('{}: layout not preserved in: {}'.format(model_type, mismatch))
+            opt = benchmark_net(net, X.contiguous(memory_format=torch.channels_last), args.steps, train=not args.eval)
+        results.append((model_type, base, opt))
+        print('{}: eager {:.1f} img/s {} {:.1f} img/s speedup {:.2f}x'.format(
+            model_type, base, args.compare, opt, opt / base))
+    print('{:<16}{:>12}{:>16}{:>10}'.format('model', 'eager', args.compare, 'speedup'))
+    for model_type, base, opt in results:
+        print('{:<16}{:>12.1f}{:>16.1f}{:>10.2f}'.format(model_type, base, opt, opt / base))
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,14 @@ import combo_nas.utils as utils
 from combo_nas.utils.config import Config
 from combo_nas.utils.routine import search
 from combo_nas.utils.wrapper import init_all_search
-from combo_nas.hparam import build_hparam_tuner, build_hparam_space
-
-trial_index = 0
+from combo_nas.data_provider.dataloader import load_data
+from combo_nas.data_provider.data_registry import clear_shared_data
+from combo_nas.hparam import build_hparam_tuner, build_hparam_space, build_hparam_scheduler
+from combo_nas.hparam.scheduler import PBT
+from combo_nas.hparam.trial_store import TrialStore
+from combo_nas.hparam.work_queue import WorkQueue
+from combo_nas.utils.warm_start import warmup_cache_path, find_checkpoint
+from combo_nas.utils.feasibility import check_feasible, device_memory, FEASIBLE
 
 def main():
     parser = argparse.ArgumentParser()
@@ -23,40 +28,125 @@ def main():
                         help="path of checkpoint pt file")
     parser.add_argument('-d','--device',type=str,default="all",
                         help="override device ids")
+    parser.add_argument('--no_shared_data', action='store_true',
+                        help="reload datasets and loaders in every trial")
+    parser.add_argument('--queue', type=str, default=None,
+                        help="path of the work queue database shared with workers")
+    parser.add_argument('--worker', action='store_true',
+                        help="run trials from the work queue instead of tuning")
     args = parser.parse_args()
 
     config = Config(args.config)
     if utils.check_config(config, args.name):
         raise Exception("config error.")
+    # trials with unchanged data config reuse datasets and worker pools
+    if not args.no_shared_data:
+        config.search.data.shared = True
 
     hp_space = build_hparam_space('hparams.json')
-    tuner = build_hparam_tuner(config.tune.tuner, hp_space)
-
+    tuner_args = {}
+    if config.tune.history:
+        # warm start the TPE tuner from a trial store database or a json history
+        tuner_args['history'] = config.tune.history
+    tuner = build_hparam_tuner(config.tune.tuner, hp_space, **tuner_args)
+    scheduler = None
+    if config.tune.scheduler:
+        sched_args = dict(config.tune.scheduler.get('args', {}))
+        sched_args.setdefault('max_epochs', config.search.epochs)
+        scheduler = build_hparam_scheduler(config.tune.scheduler.type, **sched_args)
+    n_trial = 2000
+    n_parallel = config.tune.n_parallel
+    if isinstance(scheduler, PBT):
+        # the population trains concurrently, members exploit checkpoints saved at ready epochs
+        n_trial = n_parallel = scheduler.population
+        config.search.save_freq = scheduler.interval
+        scheduler.base = {k: Config.get_value(config, k) for k in scheduler.perturb}
+    # results of previous sessions are reused, trial indices continue after them
+    os.makedirs('exp', exist_ok=True)
+    store = TrialStore(config.tune.store or os.path.join('exp', '{}_trials.db'.format(args.name)), config)
+    queue_path = args.queue or config.tune.queue
+    queue = WorkQueue(queue_path) if queue_path else None
+    if args.worker and queue is None:
+        raise Exception("worker requires a work queue.")
+    if config.search.data.shared and (n_parallel > 1 or args.worker):
+        # forked trial processes inherit the loaded data
+        load_data(config.search.data, validation=False)
+    dloader = config.search.data.dloader
+    batch_sizes = {
+        'search.data.dloader.trn_batch_size': dloader.trn_batch_size,
+        'search.data.dloader.val_batch_size': dloader.val_batch_size,
+    }
 
     def measure(hp):
-        global trial_index
+        # in parallel tuning this runs in a forked trial process
+        trial_index = tuner.trial_index
+        # undo batch sizes clamped for an earlier trial
+        Config.apply(config, batch_sizes)
         Config.apply(config, hp)
         trial_name = '{}_{}'.format(args.name, trial_index)
         exp_root_dir = os.path.join('exp', trial_name)
-        trial_index += 1
+        device = tuner.trial_device or args.device
+        overrides = {}
+        if config.tune.precheck:
+            requested = {k: Config.get_value(config, k) for k in batch_sizes}
+            mem_budget = config.tune.mem_budget or device_memory(device)
+            status = check_feasible(config, mem_budget, config.tune.flops_budget, config.tune.mem_policy)
+            if status != FEASIBLE:
+                # rejected before any data or model is set up
+                return {'score': 0, 'error_no': status, 'genotype': None}
+            # clamped batch sizes are stored with the result
+            overrides = {k: Config.get_value(config, k) for k in batch_sizes
+                         if Config.get_value(config, k) != requested[k]}
+        warmup_cache = None
+        if config.tune.warm_start:
+            # trials sharing the warmup config skip warmup training
+            warmup_cache = warmup_cache_path(os.path.join('exp', '{}_warmup'.format(args.name)), config)
+        inherit_chkpt = None
+        # own connection, the store of the tuner process is not fork safe
+        best = TrialStore(store.path, config).best() if config.tune.inherit else None
+        if not best is None:
+            inherit_chkpt = find_checkpoint(os.path.join('exp', '{}_{}'.format(args.name, best[0]), 'chkpt'))
+        # truncated scores of stopped trials are kept out of the tuner model fits
+        stopped = []
+        def epoch_callback(epoch, top1):
+            decision = tuner.report(epoch, top1)
+            if not isinstance(decision, dict):
+                if decision: stopped.append(epoch)
+                return decision
+            # continue from the donor checkpoint with the explored hparams
+            Config.apply(config, decision['hparams'])
+            donor_dir = os.path.join('exp', '{}_{}'.format(args.name, decision['exploit']), 'chkpt')
+            return os.path.join(donor_dir, 'chkpt_{:03d}.pt'.format(decision['epoch']+1))
         try:
-            search_kwargs = init_all_search(config, trial_name, exp_root_dir, args.device, convert_fn=None)
-            best_top1, best_gt, gts = search(config.search, args.chkpt, **search_kwargs)
+            search_kwargs = init_all_search(config, trial_name, exp_root_dir, device, convert_fn=None)
+            best_top1, best_gt, gts = search(config.search, args.chkpt, epoch_callback=epoch_callback,
+                                             warmup_cache=warmup_cache, inherit_chkpt=inherit_chkpt, **search_kwargs)
             score = best_top1
+            genotype = str(best_gt)
             error_no = 0
         except Exception as e:
             traceback.print_exc()
             score = 0
+            genotype = None
             error_no = 1
             logging.debug('trial {} failed with exit code: {}'.format(trial_index, error_no))
             
         result = {
             'score': score,
             'error_no': error_no,
+            'genotype': genotype,
+            'overrides': overrides,
+            'stopped': len(stopped) > 0,
         }
         return result
 
-    tuner.tune(measure, n_trial=2000, early_stopping=100)
+    if args.worker:
+        # trials are proposed and recorded by the tuner process
+        tuner.work(queue, measure, n_parallel=n_parallel, devices=config.tune.devices)
+    else:
+        tuner.tune(measure, n_trial=n_trial, early_stopping=100, n_parallel=n_parallel,
+                   devices=config.tune.devices, scheduler=scheduler, store=store, queue=queue)
+    clear_shared_data()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+import torch
+
+import combo_nas.utils as utils
+from combo_nas.utils.config import Config
+from combo_nas.data_provider.dataloader import load_data
+from combo_nas.data_provider.loader_bench import profile_stages, autotune_loader, write_config_snippet
+
+def main():
+    parser = argparse.ArgumentParser(description='throughput of the configured data pipeline without a model')
+    parser.add_argument('-c','--config',type=str, default='./config/default.yaml',
+                        help="yaml config file")
+    parser.add_argument('--section',type=str, default='search', choices=['search', 'augment'],
+                        help="config section of the data pipeline")
+    parser.add_argument('--valid', action='store_true',
+                        help="benchmark the validation loader")
+    parser.add_argument('-d','--device',type=str, default='cuda' if torch.cuda.is_available() else 'cpu')
+    parser.add_argument('-w','--workers',type=int, nargs='+', default=[0, 2, 4, 8])
+    parser.add_argument('-p','--prefetch',type=int, nargs='+', default=[0, 2])
+    parser.add_argument('--pin_memory',type=int, nargs='+', default=[1, 0])
+    parser.add_argument('-b','--batch_size',type=int, nargs='+', default=None,
+                        help="batch sizes of the benchmarked loader to sweep, default: configured")
+    parser.add_argument('--steps',type=int, default=50)
+    parser.add_argument('--warmup',type=int, default=5)
+    parser.add_argument('-o','--output',type=str, default='loader.yaml',
+                        help="output config snippet of the best settings")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    config = Config(args.config)
+    if utils.check_config(config, 'bench'):
+        raise Exception("config error.")
+    data_config = config[args.section].data
+    device = torch.device(args.device)
+
+    loader = load_data(data_config, args.valid)
+    loader = loader[0] if isinstance(loader, tuple) else loader
+    stages = profile_stages(loader, device)
+    if not stages is None:
+        print('per-batch stage time (main process): ' + ' '.join(
+            '{}: {:.4f}s'.format(k, v) for k, v in stages.items()))
+
+    results = autotune_loader(data_config, device, args.workers, args.prefetch,
+                              [bool(p) for p in args.pin_memory], args.batch_size or [None],
+                              args.steps, args.warmup, args.valid)
+    print('{:>8}{:>10}{:>6}{:>8}{:>14}{:>12}{:>12}{:>8}'.format(
+        'workers', 'prefetch', 'pin', 'batch', 'samples/s', 'wait/b', 'xfer/b', 'cpu'))
+    for r in results:
+        print('{:>8}{:>10}{:>6}{:>8}{:>14.1f}{:>12.4f}{:>12.4f}{:>8.1%}'.format(
+            r['workers'], r['prefetch'], int(r['pin_memory']), r.get('trn_batch_size', r.get('val_batch_size')),
+            r['samples_per_sec'], r['wait_per_batch'], r['transfer_per_batch'], r['cpu_util']))
+    write_config_snippet(args.output, args.section, results[0])
+    print('best settings written to {}'.format(args.output))
+
+if __name__ == '__main__':
+    main()
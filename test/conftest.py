@@ -0,0 +1,65 @@
+import os
+import logging
+import pytest
+import torch
+from torch.utils.data import TensorDataset, DataLoader
+import combo_nas.utils as utils
+from combo_nas.utils.config import Config
+from combo_nas.arch_space import genotypes as gt
+from combo_nas.arch_space import build_arch_space
+from combo_nas.arch_space.constructor import Slot, convert_from_predefined_net
+from combo_nas.core.ops import configure_ops
+from combo_nas.core.nas_modules import NASModule, build_nas_controller
+from combo_nas.arch_optim import build_arch_optim
+from combo_nas.data_provider.torch_dataloader import ResumableSampler
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'examples', 'config', 'darts.yaml')
+
+
+@pytest.fixture
+def config():
+    """ tiny DARTS search config running on cpu """
+    config = Config(CONFIG_PATH)
+    utils.check_config(config, 'test')
+    config.model.layers = 3
+    config.model.channel_init = 4
+    config.model.nodes = 2
+    config.model.auxiliary = False
+    config.search.epochs = 2
+    config.search.warmup_epochs = 0
+    config.search.save_freq = 1
+    config.search.print_freq = 100
+    return config
+
+
+def build_search(config):
+    gt.set_primitives(config.primitives)
+    NASModule.reset()
+    Slot.reset()
+    configure_ops(config.ops)
+    net = build_arch_space(config.model.type, config.model)
+    net = convert_from_predefined_net(net, None, mixed_op_cls=config.mixed_op.type, **config.mixed_op.get('args', {}))
+    model = build_nas_controller(net, utils.get_net_crit(config.criterion), torch.device('cpu'), [])
+    arch = build_arch_optim(config.arch_optim.type, config.arch_optim, model)
+    return model, arch
+
+
+def build_loaders(n=16, batch_size=8):
+    g = torch.Generator().manual_seed(0)
+    ds = TensorDataset(torch.randn(n, 3, 32, 32, generator=g), torch.randint(0, 10, (n, ), generator=g))
+    return (DataLoader(ds, batch_size=batch_size, sampler=ResumableSampler(list(range(n)))),
+            DataLoader(ds, batch_size=batch_size, sampler=ResumableSampler(list(range(n)), shuffle=False)))
+
+
+@pytest.fixture
+def run_search():
+    """ run search on random data, return the result of search """
+    from combo_nas.utils.routine import search
+    from combo_nas.utils.exp_manager import ExpManager
+    def run(config, exp_dir, chkpt_path=None, **kwargs):
+        torch.manual_seed(0)
+        model, arch = build_search(config)
+        trn_loader, val_loader = build_loaders()
+        return search(config.search, chkpt_path, ExpManager(exp_dir), trn_loader, val_loader, model, arch,
+                      utils.DummyWriter(), logging.getLogger('test'), torch.device('cpu'), **kwargs)
+    return run
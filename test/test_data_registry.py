@@ -0,0 +1,35 @@
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+from combo_nas.utils.config import Config
+from combo_nas.data_provider import data_registry
+from combo_nas.data_provider.data_registry import get_shared_data, clear_shared_data
+
+
+def load_fn(config, validation):
+    data = TensorDataset(torch.arange(8.))
+    return DataLoader(data, batch_size=4, num_workers=1, persistent_workers=config.dloader.persistent_workers)
+
+
+def get_config(split_ratio):
+    return Config(None, {'shared': True, 'shared_size': 2, 'dloader': {'split_ratio': split_ratio}})
+
+
+def test_reuse_and_evict_least_recently_used():
+    clear_shared_data()
+    loaders = [get_shared_data(get_config(r), False, load_fn) for r in [0.5, 0.6]]
+    for loader in loaders:
+        list(loader)
+    assert get_shared_data(get_config(0.5), False, load_fn) is loaders[0]
+    workers = loaders[1]._iterator._workers
+    assert all(w.is_alive() for w in workers)
+    # 0.6 is the least recently used
+    get_shared_data(get_config(0.7), False, load_fn)
+    assert len(data_registry._registry) == 2
+    assert loaders[1]._iterator is None
+    for w in workers:
+        w.join(10)
+    assert not any(w.is_alive() for w in workers)
+    assert not get_shared_data(get_config(0.6), False, load_fn) is loaders[1]
+    clear_shared_data()
+    assert len(data_registry._registry) == 0
+    assert loaders[0]._iterator is None
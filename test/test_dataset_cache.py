@@ -0,0 +1,83 @@
+import os
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from combo_nas.data_provider import dataset_cache
+from combo_nas.data_provider.dataset_cache import build_cache, CachedDataset
+from combo_nas.data_provider.torch_dataloader import build_loaders
+from combo_nas.utils.config import Config
+
+
+class ImageList():
+    def __init__(self, n, transform, fail_at=None):
+        self.n = n
+        self.transform = transform
+        self.fail_at = fail_at
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if i == self.fail_at: raise IOError('corrupt image')
+        return self.transform(Image.fromarray(np.full((4, 4, 3), i, dtype=np.uint8))), i
+
+
+def test_build_cache_uses_private_temp_files(tmp_path, monkeypatch):
+    path = str(tmp_path / 'data')
+    # a concurrent builder writing its own temp file
+    monkeypatch.setattr(os, 'getpid', lambda: 1)
+    other = dataset_cache.temp_path(path + '.u8')
+    open(other, 'wb').write(b'partial')
+    monkeypatch.setattr(os, 'getpid', lambda: 2)
+    build_cache(lambda t: ImageList(5, t), path, batch_size=2)
+    assert open(other, 'rb').read() == b'partial'
+    assert sorted(os.listdir(str(tmp_path))) == sorted([os.path.basename(other), 'data.json', 'data.labels.npy',
+                                                        'data.u8'])
+    data = CachedDataset(path)
+    assert len(data) == 5
+    assert data[3][1] == 3 and int(data[3][0].max()) == 3
+
+
+def test_failed_build_removes_temp_files(tmp_path):
+    path = str(tmp_path / 'data')
+    with pytest.raises(IOError):
+        build_cache(lambda t: ImageList(5, t, fail_at=3), path, batch_size=2)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def loader_config(paired=False):
+    return Config(None, {'trn_batch_size': 2, 'val_batch_size': 3, 'pin_memory': False, 'persistent_workers': False,
+                         'paired': paired})
+
+
+@pytest.mark.parametrize('paired', [False, True])
+def test_batches_served_by_get_batch(tmp_path, monkeypatch, paired):
+    path = str(tmp_path / 'data')
+    build_cache(lambda t: ImageList(8, t), path, batch_size=4)
+    data = CachedDataset(path)
+    calls = []
+    get_batch = data.get_batch
+    monkeypatch.setattr(data, 'get_batch', lambda idx: calls.append(idx) or get_batch(idx))
+    X, y = next(iter(build_loaders(loader_config(), data, True, None, 0)))
+    assert X.dtype == torch.uint8 and X.shape == (3, 3, 4, 4)
+    assert y.tolist() == [0, 1, 2] and X[:, :, 0, 0].tolist() == [[0] * 3, [1] * 3, [2] * 3]
+    # consecutive indices are served as a slice of the memmap
+    assert calls == [slice(0, 3)]
+    trn_loader, val_loader = build_loaders(loader_config(paired), data, False, None, 0, list(range(5)), [5, 6, 7])
+    assert sorted(next(iter(val_loader))[1].tolist()) == [5, 6, 7]
+    seen = []
+    for X, y in trn_loader:
+        assert X.shape == (len(y), 3, 4, 4)
+        assert (X[:, 0, 0, 0] == y.to(torch.uint8)).all()
+        seen.extend(y.tolist())
+    assert sorted(seen) == list(range(5))
+
+
+def test_transformed_samples_are_collated(tmp_path):
+    path = str(tmp_path / 'data')
+    build_cache(lambda t: ImageList(4, t), path, batch_size=4)
+    data = CachedDataset(path, transform=lambda img: torch.zeros(1))
+    trn_loader, _ = build_loaders(loader_config(), data, False, None, 0, [0, 1], [2, 3])
+    X, y = next(iter(trn_loader))
+    assert X.shape == (2, 1)
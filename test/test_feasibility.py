@@ -0,0 +1,37 @@
+from combo_nas.utils.feasibility import estimate_search, check_feasible, FEASIBLE, INFEASIBLE, ESTIMATE_FAILED
+from combo_nas.hparam.trial_store import TrialStore
+from conftest import build_search
+
+
+def test_estimate_matches_model_params(config):
+    est = estimate_search(config)
+    model, _ = build_search(config)
+    weights = sum(p.numel() * p.element_size() for p in model.net.parameters()) / 1024. / 1024.
+    assert abs(est['weights'] - weights) < 1e-6
+    # DARTSArchitect v_net copy and its gradients
+    assert est['arch'] == 2 * est['weights']
+    assert est['act'] > 0 and est['gflops'] > 0
+
+
+def test_check_feasible_status(config):
+    est = estimate_search(config)
+    assert check_feasible(config, est['total'] * 2) == FEASIBLE
+    assert check_feasible(config, est['total'] / 2) == INFEASIBLE
+    assert check_feasible(config, flops_budget=est['gflops'] / 2) == INFEASIBLE
+    batch_size = config.search.data.dloader.trn_batch_size
+    assert check_feasible(config, est['total'] / 2, policy='clamp') == FEASIBLE
+    assert config.search.data.dloader.trn_batch_size < batch_size
+    assert estimate_search(config)['total'] <= est['total'] / 2
+
+
+def test_estimate_failure_is_reported(config):
+    config.model.type = 'missing'
+    assert check_feasible(config, 1e9) == ESTIMATE_FAILED
+
+
+def test_store_records_overrides(config, tmp_path):
+    store = TrialStore(str(tmp_path / 'trials.db'), config)
+    overrides = {'search.data.dloader.trn_batch_size': 16}
+    store.add(0, {'search.w_optim.lr': 0.1}, {'score': 1., 'error_no': 0, 'overrides': overrides})
+    assert store.get({'search.w_optim.lr': 0.1})['overrides'] == overrides
+    assert store.history()[0][1]['overrides'] == overrides
@@ -0,0 +1,47 @@
+import os
+import time
+from combo_nas.data_provider.folder_index import load_index
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+
+
+def test_index_sees_files_added_in_subdirectories(tmp_path):
+    root = str(tmp_path / 'data')
+    index_path = str(tmp_path / 'index' / 'data.npz')
+    touch(os.path.join(root, 'a', 'sub', '0.jpg'))
+    touch(os.path.join(root, 'b', '0.jpg'))
+    classes, _, _, labels = load_index(root, index_path)
+    assert classes == ['a', 'b'] and len(labels) == 2
+    assert os.listdir(str(tmp_path / 'index')) == ['data.npz']
+    time.sleep(0.01)
+    touch(os.path.join(root, 'a', 'sub', '1.jpg'))
+    _, _, _, labels = load_index(root, index_path)
+    assert labels.tolist() == [0, 0, 1]
+
+
+def test_fresh_index_loads_without_walking(tmp_path, monkeypatch):
+    root = str(tmp_path / 'data')
+    index_path = str(tmp_path / 'index' / 'data.npz')
+    touch(os.path.join(root, 'a', 'sub', '0.jpg'))
+    touch(os.path.join(root, 'b', '0.jpg'))
+    load_index(root, index_path)
+    def no_walk(*args, **kwargs):
+        raise AssertionError('directory tree walked')
+    monkeypatch.setattr(os, 'walk', no_walk)
+    monkeypatch.setattr(os, 'scandir', no_walk)
+    classes, _, _, labels = load_index(root, index_path)
+    assert classes == ['a', 'b'] and len(labels) == 2
+
+
+def test_index_sees_new_subdirectories(tmp_path):
+    root = str(tmp_path / 'data')
+    index_path = str(tmp_path / 'index' / 'data.npz')
+    touch(os.path.join(root, 'a', '0.jpg'))
+    load_index(root, index_path)
+    time.sleep(0.01)
+    touch(os.path.join(root, 'a', 'new', 'sub', '1.jpg'))
+    _, _, _, labels = load_index(root, index_path)
+    assert len(labels) == 2
@@ -0,0 +1,59 @@
+import torch
+import torch._dynamo
+from combo_nas.arch_space import build_arch_space
+from combo_nas.arch_space.constructor import Slot, convert_from_genotype
+from combo_nas.core.ops import configure_ops
+from combo_nas.core.layers import DAGLayer
+from combo_nas.core.nas_modules import NASModule, build_nas_controller
+from conftest import build_search
+
+
+def build_augment(config):
+    model, _ = build_search(config)
+    genotype = model.to_genotype()
+    NASModule.reset()
+    Slot.reset()
+    configure_ops(config.ops)
+    net = build_arch_space(config.model.type, config.model)
+    net = convert_from_genotype(net, genotype)
+    return build_nas_controller(net, torch.nn.CrossEntropyLoss(), torch.device('cpu'), [])
+
+
+def test_plan_matches_dynamic_forward(config):
+    torch.manual_seed(0)
+    model = build_augment(config)
+    model.eval()
+    layers = [m for m in model.modules() if isinstance(m, DAGLayer)]
+    assert any(not m.plan is None for m in layers)
+    X = torch.randn(2, 3, 32, 32)
+    with torch.no_grad():
+        out_plan = model(X)
+        for m in layers:
+            m.plan = None
+        out_dynamic = model(X)
+    assert torch.equal(out_plan, out_dynamic)
+
+
+def test_drop_path_prob_does_not_recompile(config):
+    model = build_augment(config)
+    state_keys = set(model.state_dict().keys())
+    model.train()
+    forward = torch.compile(model.net.forward, backend='eager')
+    X = torch.randn(2, 3, 32, 32)
+    torch._dynamo.reset()
+    model.drop_path_prob(0.1)
+    forward(X)
+    with torch._dynamo.config.patch(error_on_recompile=True):
+        model.drop_path_prob(0.2)
+        forward(X)
+    assert set(model.state_dict().keys()) == state_keys
+
+
+def test_drop_path_zero_keeps_rng_stream(config):
+    model = build_augment(config)
+    model.train()
+    model.drop_path_prob(0.)
+    X = torch.randn(2, 3, 32, 32)
+    state = torch.get_rng_state()
+    model.net(X)
+    assert torch.equal(torch.get_rng_state(), state)
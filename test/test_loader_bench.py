@@ -0,0 +1,11 @@
+import yaml
+from combo_nas.data_provider.loader_bench import write_config_snippet
+
+
+def test_snippet_keeps_valid_batch_size_key(tmp_path):
+    path = str(tmp_path / 'loader.yaml')
+    result = {'workers': 2, 'prefetch': 2, 'pin_memory': True, 'val_batch_size': 128, 'samples_per_sec': 1.}
+    write_config_snippet(path, 'search', result)
+    with open(path, 'r') as f:
+        dloader = yaml.safe_load(f)['search']['data']['dloader']
+    assert dloader == {'workers': 2, 'prefetch': 2, 'pin_memory': True, 'val_batch_size': 128}
@@ -0,0 +1,39 @@
+import pytest
+import torch
+from torch.utils.data import TensorDataset
+from combo_nas.data_provider.paired_loader import PairedLoader, get_tr_ratio
+from combo_nas.data_provider.torch_dataloader import ResumableSampler
+
+
+def get_loader(n_trn, n_val, batch_size=2):
+    data = TensorDataset(torch.arange(n_trn + n_val))
+    trn_sampler = ResumableSampler(list(range(n_trn)))
+    val_sampler = ResumableSampler(list(range(n_trn, n_trn + n_val)))
+    return PairedLoader(data, trn_sampler, val_sampler, batch_size, batch_size, pin_memory=False)
+
+
+@pytest.mark.parametrize('n_trn,n_val', [(12, 4), (4, 12), (10, 3)])
+def test_paired_schedule(n_trn, n_val):
+    loader = get_loader(n_trn, n_val)
+    assert loader.tr_ratio == get_tr_ratio(len(loader), loader.n_val_batches)
+    items = list(loader.iter_paired())
+    assert len(items) == len(loader)
+    for step, (trn_batch, val_item) in enumerate(items):
+        assert (step % loader.tr_ratio == 0) == (not val_item is None)
+        assert all(int(i) < n_trn for i in trn_batch[0])
+        if not val_item is None:
+            assert all(int(i) >= n_trn for i in val_item[1][0])
+
+
+def test_tr_ratio_at_least_one():
+    assert get_tr_ratio(2, 6) == 1
+    assert get_tr_ratio(7, 2) == 3
+    with pytest.raises(ValueError):
+        get_tr_ratio(4, 0)
+
+
+def test_empty_valid_sampler_raises():
+    loader = get_loader(4, 2)
+    loader.val_sampler.indices = []
+    with pytest.raises(ValueError):
+        list(loader.iter_paired())
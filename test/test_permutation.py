@@ -0,0 +1,47 @@
+import pickle
+import pytest
+from combo_nas.hparam.permutation import FeistelPermutation
+from combo_nas.hparam.space import HParamSpace, HParam
+from combo_nas.hparam.gridsearch_tuner import RandomTuner
+
+
+@pytest.mark.parametrize('n', [1, 2, 7, 64, 1000])
+def test_visits_every_index_once(n):
+    perm = FeistelPermutation(n, seed=3)
+    order = []
+    while perm.has_next():
+        order.append(perm.next())
+    assert sorted(order) == list(range(n))
+    assert perm.next() is None
+
+
+def test_seeded_order():
+    order = [FeistelPermutation(100, seed=1).get(i) for i in range(100)]
+    assert order == [FeistelPermutation(100, seed=1).get(i) for i in range(100)]
+    assert order != [FeistelPermutation(100, seed=2).get(i) for i in range(100)]
+    with pytest.raises(IndexError):
+        FeistelPermutation(100).get(100)
+
+
+def test_resume_from_state_dict():
+    perm = FeistelPermutation(50, seed=5)
+    head = [perm.next() for _ in range(20)]
+    resumed = FeistelPermutation(1)
+    resumed.load_state_dict(perm.state_dict())
+    tail = [resumed.next() for _ in range(30)]
+    assert sorted(head + tail) == list(range(50))
+    assert tail == [perm.next() for _ in range(30)]
+
+
+def test_random_tuner_resumes_order():
+    space = HParamSpace({'a': HParam(range=[1, 2, 3]), 'b': HParam(range=['x', 'y'])})
+    tuner = RandomTuner(space, seed=0)
+    first = [tuner.next() for _ in range(2)]
+    resumed = pickle.loads(pickle.dumps(tuner))
+    resumed.space = space
+    rest = []
+    while resumed.has_next():
+        rest.append(resumed.next())
+    configs = first + rest
+    assert len(configs) == 6
+    assert len(set((c['a'], c['b']) for c in configs)) == 6
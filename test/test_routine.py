@@ -0,0 +1,92 @@
+import os
+import signal
+import logging
+import pytest
+import torch
+import combo_nas.utils as utils
+from combo_nas.utils import routine
+from combo_nas.utils.routine import resume_lr_scheduler
+from conftest import build_search, build_loaders
+
+
+def test_resume_does_not_overwrite_epoch_checkpoint(config, run_search, tmp_path):
+    run_search(config, str(tmp_path))
+    chkpt = tmp_path / 'chkpt' / 'chkpt_001.pt'
+    mtime = os.stat(chkpt).st_mtime_ns
+    config.search.epochs = 3
+    run_search(config, str(tmp_path), str(chkpt))
+    assert os.stat(chkpt).st_mtime_ns == mtime
+    assert (tmp_path / 'chkpt' / 'chkpt_003.pt').exists()
+
+
+def get_scheduler():
+    optim = torch.optim.SGD([torch.nn.Parameter(torch.zeros(1))], lr=1.)
+    return optim, torch.optim.lr_scheduler.StepLR(optim, step_size=1, gamma=0.5)
+
+
+@pytest.mark.filterwarnings('ignore::UserWarning')
+def test_resume_lr_scheduler_steps_once():
+    # epoch checkpoints are saved before the step of their epoch
+    optim, sched = get_scheduler()
+    resume_lr_scheduler(sched, 0)
+    assert sched.last_epoch == 1
+    assert optim.param_groups[0]['lr'] == 0.5
+    # step checkpoints of the next epoch are saved after it
+    optim, sched = get_scheduler()
+    sched.step()
+    resume_lr_scheduler(sched, 0)
+    assert sched.last_epoch == 1
+    assert optim.param_groups[0]['lr'] == 0.5
+
+
+def test_resume_mid_epoch_matches_uninterrupted_run(config, run_search, tmp_path):
+    config.search.epochs = 1
+    config.search.chkpt_steps = 1
+    run_search(config, str(tmp_path / 'a'))
+    chkpt = torch.load(str(tmp_path / 'a' / 'chkpt' / 'chkpt_step.pt'), weights_only=False)
+    assert chkpt['step_state']['step'] == 1
+    run_search(config, str(tmp_path / 'b'), str(tmp_path / 'a' / 'chkpt' / 'chkpt_step.pt'))
+    full = torch.load(str(tmp_path / 'a' / 'chkpt' / 'chkpt_001.pt'), weights_only=False)['model']
+    resumed = torch.load(str(tmp_path / 'b' / 'chkpt' / 'chkpt_001.pt'), weights_only=False)['model']
+    for k in full:
+        assert torch.equal(full[k], resumed[k]), k
+
+
+@pytest.fixture
+def preempt(monkeypatch):
+    monkeypatch.setattr(routine, '_preempt_signal', signal.SIGTERM)
+
+
+def test_preempt_during_warmup_saves_checkpoint(config, run_search, tmp_path, preempt):
+    config.search.warmup_epochs = 1
+    with pytest.raises(SystemExit):
+        run_search(config, str(tmp_path))
+    assert os.listdir(str(tmp_path / 'chkpt')) == ['chkpt_000.pt']
+
+
+def test_preempt_interrupts_validation(config, tmp_path, preempt, monkeypatch):
+    steps = []
+    monkeypatch.setattr(routine.utils, 'accuracy', lambda *a, **k: steps.append(1) or (torch.zeros(()), ) * 2)
+    model, _ = build_search(config)
+    _, val_loader = build_loaders()
+    routine.validate(val_loader, model, utils.DummyWriter(), logging.getLogger('test'), 0, 1, 0, torch.device('cpu'),
+                     config.search)
+    assert len(steps) == 0
+
+
+def test_prefetch_closed_when_train_fails(config, monkeypatch):
+    prefetchers = []
+    class Recorder(routine.Prefetcher):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            prefetchers.append(self)
+    monkeypatch.setattr(routine, 'Prefetcher', Recorder)
+    model, arch = build_search(config)
+    monkeypatch.setattr(model, 'loss_logits', lambda *a: 1 / 0)
+    trn_loader, _ = build_loaders()
+    config.search.data.dloader.prefetch = 2
+    with pytest.raises(ZeroDivisionError):
+        w_optim = torch.optim.SGD(model.weights(), lr=0.1)
+        routine.train(trn_loader, None, model, utils.DummyWriter(), logging.getLogger('test'), arch, w_optim, None,
+                      0.1, 0, 1, torch.device('cpu'), config.search)
+    assert len(prefetchers) == 1 and not prefetchers[0].thread.is_alive()
@@ -0,0 +1,23 @@
+import torch
+from combo_nas.data_provider.torch_dataloader import ResumableSampler
+
+
+def test_resume_within_epoch():
+    torch.manual_seed(0)
+    indices = list(range(100, 120))
+    sampler = ResumableSampler(indices)
+    it = iter(sampler)
+    head = [next(it) for _ in range(7)]
+    tail = list(it)
+    resumed = ResumableSampler(indices)
+    resumed.load_state_dict(sampler.state_dict(), start=7)
+    assert list(resumed) == tail
+    assert sorted(head + tail) == indices
+    # the next epoch draws a new full permutation
+    assert sorted(resumed) == indices
+
+
+def test_resume_without_state_starts_new_epoch():
+    sampler = ResumableSampler(list(range(5)), shuffle=False)
+    sampler.load_state_dict({'perm': None}, start=3)
+    assert list(sampler) == list(range(5))
@@ -0,0 +1,43 @@
+from combo_nas.hparam.scheduler import SuccessiveHalving, Hyperband, PBT
+
+
+def test_successive_halving_stops_below_cutoff():
+    sched = SuccessiveHalving(max_epochs=9, min_epochs=1, eta=3)
+    assert sched.rungs == [1, 3]
+    # fewer than eta scores at the rung
+    assert sched.report(0, 0, 0.1) is False
+    assert sched.report(1, 0, 0.5) is False
+    # top 1/eta is promoted, the bottom is stopped
+    assert not sched.report(2, 0, 0.9)
+    assert sched.report(3, 0, 0.2)
+    # epochs off the rungs never stop
+    assert sched.report(3, 1, 0.) is False
+
+
+def test_hyperband_brackets():
+    sched = Hyperband(max_epochs=9, min_epochs=1, eta=3)
+    assert [b.rungs for b in sched.brackets] == [[1, 3], [3], []]
+    for trial in range(0, 12, 3):
+        sched.report(trial, 0, trial / 10.)
+    assert sched.report(12, 0, 0.) is True
+    # the last bracket runs every trial to max_epochs
+    for trial in range(2, 14, 3):
+        assert sched.report(trial, 0, 0.) is False
+
+
+def test_pbt_exploits_top_quantile():
+    sched = PBT(population=2, interval=2, quantile=0.5, max_epochs=10, perturb=('lr', 'wd'), factors=(2., ),
+                seed=0)
+    sched.base = {'wd': 0.1}
+    sched.on_start(0, {'lr': 1.})
+    sched.on_start(1, {'lr': 3.})
+    assert sched.report(1, 1, 0.) is False
+    assert sched.report(0, 2, 0.9) is False
+    decision = sched.report(1, 2, 0.1)
+    assert decision == {'exploit': 0, 'epoch': 2, 'hparams': {'lr': 2., 'wd': 0.2}}
+    assert sched.schedules[1] == [(0, {'lr': 1.}), (3, {'lr': 2., 'wd': 0.2})]
+    # the top trial keeps its hparams
+    assert sched.hparams[0] == {'lr': 1.}
+    # no exploit in the last interval
+    sched.report(0, 8, 0.9)
+    assert sched.report(1, 9, 0.1) is False
@@ -0,0 +1,58 @@
+import pytest
+import numpy as np
+from PIL import Image
+from combo_nas.data_provider.shard_dataloader import write_shards, get_shard_dataloader
+
+
+class Cfg(dict):
+    __getattr__ = dict.get
+
+
+@pytest.fixture
+def shards(tmp_path):
+    samples = []
+    for i in range(23):
+        path = str(tmp_path / '{}.png'.format(i))
+        Image.fromarray(np.full((8, 8, 3), i, dtype=np.uint8)).save(path)
+        samples.append((path, i % 3))
+    out_dir = str(tmp_path / 'shards')
+    write_shards(samples, ['a', 'b', 'c'], out_dir, shard_size=5)
+    return out_dir
+
+
+def get_config(**kwargs):
+    config = Cfg(jitter=False, cutout=0, split_ratio=0, trn_batch_size=4, val_batch_size=4, workers=0,
+                 shuffle_buffer=4, batch_aug=False, pin_memory=False, persistent_workers=False)
+    config.update(kwargs)
+    return config
+
+
+@pytest.mark.parametrize('workers', [0, 2, 3])
+@pytest.mark.parametrize('validation', [False, True])
+def test_len_matches_batches(shards, workers, validation):
+    config = get_config(workers=workers)
+    loader = get_shard_dataloader(config, ('image', shards, [.5]*3, [.5]*3, validation))
+    sizes = [len(y) for _, y in loader]
+    assert len(sizes) == len(loader)
+    if validation:
+        assert sum(sizes) == 23
+    else:
+        assert all(n == 4 for n in sizes)
+
+
+@pytest.mark.parametrize('split_ratio', [0.1, 0.5, 0.99])
+def test_split_keeps_valid_shards(shards, split_ratio):
+    config = get_config(workers=2, split_ratio=split_ratio)
+    trn_loader, val_loader = get_shard_dataloader(config, ('image', shards, [.5]*3, [.5]*3, False))
+    n_trn = sum(len(y) for _, y in trn_loader)
+    n_val = sum(len(y) for _, y in val_loader)
+    assert len(val_loader) > 0 and len(trn_loader) > 0
+    assert n_trn + n_val == 23
+
+
+def test_split_requires_two_shards(tmp_path):
+    path = str(tmp_path / '0.png')
+    Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(path)
+    write_shards([(path, 0)], ['a'], str(tmp_path / 'shards'))
+    with pytest.raises(ValueError):
+        get_shard_dataloader(get_config(split_ratio=0.5), ('image', str(tmp_path / 'shards'), [.5]*3, [.5]*3, False))
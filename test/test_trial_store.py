@@ -0,0 +1,64 @@
+from combo_nas.hparam.trial_store import TrialStore
+from combo_nas.utils.feasibility import INFEASIBLE
+from combo_nas.hparam.tpe_tuner import TPETuner
+from combo_nas.hparam.xgb_tuner import XGBoostTuner
+from combo_nas.hparam.space import HParamSpace, HParam
+
+
+def test_hash_ignores_settings_outside_the_result(config, tmp_path):
+    store = TrialStore(str(tmp_path / 'trials.db'), config)
+    h = store.config_hash({'search.w_optim.lr': 0.1})
+    assert store.config_hash({'search.w_optim.lr': 0.1, 'search.data.shared': True}) == h
+    assert store.config_hash({'search.w_optim.lr': 0.1, 'tune.n_parallel': 4}) == h
+    assert store.config_hash({'search.w_optim.lr': 0.1, 'device.gpus': '1'}) == h
+    assert store.config_hash({'search.w_optim.lr': 0.2}) != h
+
+
+def test_store_roundtrip(config, tmp_path):
+    store = TrialStore(str(tmp_path / 'trials.db'), config)
+    hparams = {'search.w_optim.lr': 0.1}
+    assert store.get(hparams) is None
+    store.add(0, hparams, {'score': 0.5, 'error_no': 0, 'overrides': {'search.data.dloader.trn_batch_size': 8}})
+    store.add(1, {'search.w_optim.lr': 0.2}, {'score': 0.7, 'error_no': 0})
+    result = store.get(hparams)
+    assert result['score'] == 0.5
+    assert result['overrides'] == {'search.data.dloader.trn_batch_size': 8}
+    assert store.best() == (1, {'search.w_optim.lr': 0.2}, 0.7)
+    assert store.next_trial_index() == 2
+    assert [h for h, _ in store.history()] == [hparams, {'search.w_optim.lr': 0.2}]
+
+
+def test_tpe_reads_store_history(config, tmp_path):
+    path = str(tmp_path / 'trials.db')
+    store = TrialStore(path, config)
+    store.add(0, {'search.w_optim.lr': 0.1}, {'score': 0.5, 'error_no': 0})
+    store.close()
+    history = TPETuner.read_history(path)
+    assert len(history) == 1
+    assert history[0][0] == {'search.w_optim.lr': 0.1}
+    assert history[0][1]['score'] == 0.5
+
+
+def test_failed_trials_are_retried(config, tmp_path):
+    store = TrialStore(str(tmp_path / 'trials.db'), config)
+    store.add(0, {'search.w_optim.lr': 0.1}, {'score': 0, 'error_no': 1})
+    store.add(1, {'search.w_optim.lr': 0.2}, {'score': 0, 'error_no': INFEASIBLE})
+    assert store.get({'search.w_optim.lr': 0.1}) is None
+    assert store.get({'search.w_optim.lr': 0.2})['error_no'] == INFEASIBLE
+    assert store.get({'search.w_optim.lr': 0.1}, error_nos=(1, ))['error_no'] == 1
+
+
+def test_stopped_trials_stay_out_of_model_fits(config, tmp_path):
+    store = TrialStore(str(tmp_path / 'trials.db'), config)
+    store.add(0, {'a': 1}, {'score': 0.9, 'error_no': 0})
+    store.add(1, {'a': 2}, {'score': 0.2, 'error_no': 0, 'stopped': True})
+    history = store.history()
+    assert [r['stopped'] for _, r in history] == [False, True]
+    space = HParamSpace({'a': HParam(range=[1, 2, 3])})
+    tpe = TPETuner(space, seed=0)
+    tpe.load_history(history)
+    assert tpe.ys == [0.9] and tpe.stopped == [(1, )]
+    assert len(tpe.visited) == 2
+    xgb = XGBoostTuner(space, seed=0)
+    xgb.load_history(history)
+    assert xgb.ys == [0.9] and len(xgb.visited) == 2
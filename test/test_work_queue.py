@@ -0,0 +1,109 @@
+import time
+import threading
+from combo_nas.hparam.tuner import Tuner
+from combo_nas.hparam.scheduler import SuccessiveHalving
+from combo_nas.hparam.work_queue import WorkQueue
+from combo_nas.utils.routine import install_preempt_handler
+
+
+def test_sweep_requeues_then_fails(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'), max_attempts=2)
+    queue.open()
+    queue.put(0, {'lr': 0.1})
+    for attempt in range(2):
+        assert queue.acquire('w', lease=-1.)[0] == 0
+        queue.sweep()
+    assert queue.collect() == [(0, {'score': 0, 'error_no': 1})]
+
+
+def test_sweep_fails_trials_without_workers(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    queue.open()
+    queue.put(0, {'lr': 0.1})
+    queue.sweep(idle_timeout=60.)
+    assert queue.collect() == []
+    queue.sweep(idle_timeout=0.)
+    assert queue.collect() == [(0, {'score': 0, 'error_no': 1})]
+
+
+def test_report_does_not_block(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    queue.post_report(0, 1, 0.5)
+    assert queue.decision(0, 1) is None
+    assert queue.pending_reports() == [(0, 1, 0.5)]
+    queue.decide(0, 1, True)
+    assert queue.decision(0, 1) is True
+
+
+def test_queue_carries_halving_decisions(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.db'))
+    sched = SuccessiveHalving(max_epochs=9, eta=2)
+    for trial, score in enumerate([0.9, 0.1]):
+        queue.post_report(trial, 0, score)
+    for idx, epoch, score in queue.pending_reports():
+        queue.decide(idx, epoch, sched.report(idx, epoch, score))
+    assert queue.decision(0, 0) is False
+    assert queue.decision(1, 0) is True
+
+
+def test_worker_keeps_lease_while_waiting_for_decision(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    queue = WorkQueue(path)
+    queue.open()
+    queue.put(0, {'report': True})
+    queue.put(1, {'report': False})
+    tuner = Tuner(None)
+    tuner.reset()
+
+    def measure(inputs):
+        if inputs['report']:
+            return {'score': 1, 'error_no': 0, 'stop': tuner.report(0, 0.5)}
+        time.sleep(3.)
+        return {'score': 1, 'error_no': 0}
+
+    def decide():
+        # the tuner process sweeps leases and answers after the lease length
+        tq = WorkQueue(path)
+        deadline = time.time() + 4.
+        while time.time() < deadline or len(tq.pending_reports()) == 0:
+            tq.sweep()
+            time.sleep(0.2)
+        for idx, epoch, score in tq.pending_reports():
+            tq.decide(idx, epoch, True)
+        tq.close()
+
+    thread = threading.Thread(target=decide)
+    thread.start()
+    tuner.work(queue, measure, n_parallel=2, lease=1.5, poll=0.2, worker='w')
+    thread.join()
+    results = dict(queue.collect())
+    assert results[0]['error_no'] == 0 and results[0]['stop'] is True
+    assert results[1]['error_no'] == 0
+
+
+def test_worker_kills_trial_with_lost_lease(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    queue = WorkQueue(path)
+    queue.open()
+    queue.put(0, {})
+    tuner = Tuner(None)
+    tuner.reset()
+
+    def measure(inputs):
+        # trials install the preempt handler, SIGTERM only sets a flag
+        install_preempt_handler()
+        time.sleep(60.)
+        return {'score': 1, 'error_no': 0}
+
+    def revoke():
+        tq = WorkQueue(path)
+        time.sleep(1.)
+        tq.conn.execute("UPDATE queue SET worker = 'other'")
+        tq.close()
+
+    thread = threading.Thread(target=revoke)
+    thread.start()
+    t0 = time.time()
+    tuner.work(queue, measure, lease=0.6, poll=0.1, worker='w')
+    thread.join()
+    assert time.time() - t0 < 10.